@@ -0,0 +1,88 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.database import DATABASE_URL, ApiSession, PoolMetricsMixin, pool_options
+from typing import Dict, Tuple
+import logging
+import os
+import shlex
+
+# Async (asyncpg) engine for the API read path. The sync engine in app/database.py
+# stays in use for the pipeline and other batch writers.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")  # defaults to DATABASE_URL with the asyncpg driver
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"  # transaction pooling: no prepared statement cache
+
+logger = logging.getLogger(__name__)
+
+# libpq connection parameters asyncpg.connect() doesn't accept (they'd raise TypeError on connect)
+LIBPQ_ONLY_PARAMS = ("channel_binding", "gssencmode", "gsslib", "krbsrvname", "keepalives", "keepalives_idle",
+                     "keepalives_interval", "keepalives_count", "sslcompression", "sslcert", "sslkey",
+                     "sslrootcert", "sslcrl", "sslpassword", "requirepeer", "replication")
+
+
+class InstrumentedAsyncQueuePool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def asyncpg_url(url: str) -> Tuple[str, Dict]:
+    """
+    Convert a libpq-style DATABASE_URL (e.g. a hosted Postgres connection string) to an asyncpg one.
+    sslmode becomes the `ssl` argument, connect_timeout `timeout`, and application_name and
+    `options=-c name=value` become server_settings; other libpq-only parameters are dropped.
+
+    Returns:
+        (url, connect_args)
+    """
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    connect_args = {}
+    server_settings = {}
+
+    sslmode = query.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = sslmode
+    if "connect_timeout" in query:
+        connect_args["timeout"] = float(query.pop("connect_timeout"))
+    if "application_name" in query:
+        server_settings["application_name"] = query.pop("application_name")
+    words = shlex.split(query.pop("options", ""))
+    for flag, setting in zip(words, words[1:]):
+        if flag == "-c" and "=" in setting:
+            name, _, value = setting.partition("=")
+            server_settings[name] = value
+    if server_settings:
+        connect_args["server_settings"] = server_settings
+
+    dropped = [name for name in LIBPQ_ONLY_PARAMS if query.pop(name, None) is not None]
+    if dropped:
+        logger.info(f"Ignoring libpq-only connection parameters for asyncpg: {', '.join(dropped)}")
+    if DB_PGBOUNCER:
+        connect_args["statement_cache_size"] = 0
+        query["prepared_statement_cache_size"] = "0"
+
+    parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+    return parsed.render_as_string(hide_password=False), connect_args
+
+
+_url, _connect_args = asyncpg_url(ASYNC_DATABASE_URL or DATABASE_URL)
+
+async_engine = create_async_engine(
+    _url,
+    connect_args=_connect_args,
+    poolclass=InstrumentedAsyncQueuePool,
+    **pool_options(),
+)
+
+
+# ApiSession applies DB_STATEMENT_TIMEOUT_MS to each transaction
+AsyncSessionLocal = async_sessionmaker(async_engine, sync_session_class=ApiSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    """FastAPI dependency: one AsyncSession per request, closed when the request ends."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def async_pool_stats() -> Dict:
+    return async_engine.sync_engine.pool.stats()
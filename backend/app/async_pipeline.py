@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.database import SessionLocal
+from app.browser import AsyncBrowserPool
+from app.async_scraper import HostLimiter, scrape_module_async
+from app.pipeline import prepare_module, persist_scrape_result
+from app.metadata import ingest_metadata
+from app.scraper import ScrapeResult, parse_comments
+from app.sentiment import analyze_module_sentiment
+
+logger = logging.getLogger(__name__)
+
+# Concurrency configuration (override via environment variables)
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "4"))        # browser fetch workers
+PARSE_WORKERS = int(os.getenv("PIPELINE_PARSE_WORKERS", "2"))             # processes parsing Disqus HTML
+PERSIST_WORKERS = int(os.getenv("PIPELINE_PERSIST_WORKERS", "2"))         # threads writing to the DB
+ANALYSE_WORKERS = int(os.getenv("PIPELINE_ANALYSE_WORKERS", "2"))         # threads calling Gemini
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))                   # max modules waiting between stages
+MODULE_TIMEOUT = float(os.getenv("PIPELINE_MODULE_TIMEOUT", "600"))       # seconds per module, per stage
+
+_DONE = object()  # End-of-stream marker passed between stages
+
+ProgressCallback = Callable[[str, str], None]  # (module code, stage name | "success" | "failed" | "skipped")
+
+
+@dataclass
+class ModuleJob:
+    """One module travelling through the stages."""
+    code: str
+    snapshot: Optional[Dict] = None
+    result: Optional[ScrapeResult] = None
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    max_queue_depth: int = 0  # deepest the stage's input queue got
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    def report(self) -> Dict:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "max_queue_depth": self.max_queue_depth,
+            "throughput_per_min": round(self.processed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "utilisation": round(self.busy_seconds / (elapsed * self.workers), 2) if elapsed > 0 else 0.0,
+        }
+
+
+# ============================================================================
+# DATABASE / LLM STEPS (run in worker threads, one session each)
+# ============================================================================
+
+def _ingest(module_codes: List[str]) -> Set[str]:
+    """Bulk metadata for the whole run; returns the codes it covered (others are fetched one by one)."""
+    db = SessionLocal()
+    try:
+        return ingest_metadata(db, module_codes)["found"]
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Bulk metadata ingestion failed, fetching per module: {e}")
+        return set()
+    finally:
+        db.close()
+
+
+def _prepare(module_code: str, metadata_ingested: bool) -> Optional[Dict]:
+    db = SessionLocal()
+    try:
+        return prepare_module(db, module_code, metadata_ingested)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _persist(job: ModuleJob) -> Tuple[bool, bool]:
+    db = SessionLocal()
+    try:
+        return persist_scrape_result(db, job.code, job.snapshot, job.result)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _analyse(job: ModuleJob) -> bool:
+    db = SessionLocal()
+    try:
+        logger.info(f"Running sentiment analysis for {job.code}...")
+        if not analyze_module_sentiment(db, job.snapshot["id"]):
+            return False
+        logger.info(f"✅ {job.code} complete ({len(job.result.comments)} comments)")
+        return True
+    finally:
+        db.close()
+
+
+def _make_parse_executor(workers: int) -> Executor:
+    # Some serverless runtimes have no /dev/shm for multiprocessing; parse in threads there
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError) as e:
+        logger.warning(f"Process pool unavailable ({e}), parsing in threads")
+        return ThreadPoolExecutor(max_workers=workers)
+
+
+# ============================================================================
+# ORCHESTRATION
+# ============================================================================
+
+async def _run_stage(stats: StageStats, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue], next_workers: int,
+                     handler: Callable[[ModuleJob], Awaitable[Optional[ModuleJob]]],
+                     record: Callable[[str, str], None], out_stats: Optional[StageStats], timeout: float,
+                     progress: Optional[ProgressCallback]):
+    """
+    Run `stats.workers` workers over `inbox`. A handler returns the job to pass downstream,
+    or None once the module is finished (its outcome already recorded).
+    """
+    async def worker():
+        while True:
+            job = await inbox.get()
+            if job is _DONE:
+                return
+
+            if progress:
+                progress(job.code, stats.name)
+            started = time.monotonic()
+            next_job = None
+            try:
+                next_job = await asyncio.wait_for(handler(job), timeout)
+            except asyncio.TimeoutError:
+                # NOTE: a DB/Gemini step already running in a worker thread finishes in the background
+                logger.error(f"❌ {job.code} timed out in {stats.name} after {timeout:.0f}s")
+                stats.failed += 1
+                record(job.code, "failed")
+            except Exception as e:
+                logger.error(f"❌ Error processing {job.code} ({stats.name}): {e}")
+                stats.failed += 1
+                record(job.code, "failed")
+            stats.busy_seconds += time.monotonic() - started
+            stats.processed += 1
+
+            if next_job is not None:
+                await outbox.put(next_job)
+                out_stats.max_queue_depth = max(out_stats.max_queue_depth, outbox.qsize())
+
+    await asyncio.gather(*(worker() for _ in range(stats.workers)))
+    stats.finished = time.monotonic()
+    if outbox is not None:
+        for _ in range(next_workers):
+            await outbox.put(_DONE)
+
+
+async def run_modules(module_codes: List[str], concurrency: int = PIPELINE_CONCURRENCY,
+                      module_timeout: float = MODULE_TIMEOUT,
+                      progress: Optional[ProgressCallback] = None,
+                      deadline: Optional[float] = None,
+                      limiter: Optional[HostLimiter] = None) -> Dict[str, List[str]]:
+    """
+    Process modules through four stages connected by bounded queues, so browser,
+    CPU and API work overlap:
+
+        fetch (async browser) -> parse (process pool) -> persist (DB threads) -> analyse (Gemini threads)
+
+    progress(code, event) is called on the event loop as a module enters each stage
+    (event = stage name) and when it finishes (event = "success" or "failed").
+
+    With a deadline (time.monotonic() value), no new modules are fetched after it;
+    modules already past the fetch stage still finish. Modules dropped this way get
+    event "skipped" and are in neither list.
+
+    `limiter` overrides the per-host politeness limits (e.g. a worker's share of a
+    fleet-wide budget, see app/work_queue.py).
+
+    Returns:
+        {"success": [codes], "failed": [codes], "stages": {stage: stats}}
+    """
+    outcomes = {"success": [], "failed": []}
+    if not module_codes:
+        return {**outcomes, "stages": {}}
+
+    def record(code: str, outcome: str):
+        outcomes[outcome].append(code)
+        if progress:
+            progress(code, outcome)
+
+    loop = asyncio.get_running_loop()
+    pool = AsyncBrowserPool(size=concurrency)
+    limiter = limiter or HostLimiter()
+    parse_executor = _make_parse_executor(PARSE_WORKERS)
+
+    stages = {
+        "fetch": StageStats("fetch", concurrency),
+        "parse": StageStats("parse", PARSE_WORKERS),
+        "persist": StageStats("persist", PERSIST_WORKERS),
+        "analyse": StageStats("analyse", ANALYSE_WORKERS),
+    }
+    fetch_q, parse_q, persist_q, analyse_q = (asyncio.Queue(maxsize=QUEUE_SIZE) for _ in range(4))
+
+    # Steps 1-2 for every module at once: one conditional moduleInfo.json request, batched upsert
+    ingested = await asyncio.to_thread(_ingest, module_codes)
+
+    async def fetch(job: ModuleJob) -> Optional[ModuleJob]:
+        if deadline is not None and time.monotonic() >= deadline:
+            if progress:
+                progress(job.code, "skipped")
+            return None
+        logger.info(f"\n{'='*60}\nProcessing {job.code}\n{'='*60}")
+        # Steps 1-2: Fetch metadata and upsert module
+        job.snapshot = await asyncio.to_thread(_prepare, job.code, job.code in ingested)
+        if not job.snapshot:
+            record(job.code, "failed")
+            return None
+        # Step 3: Open the module once; comments are only paginated if the count changed
+        job.result = await scrape_module_async(
+            pool, limiter, job.code,
+            known_count=job.snapshot["known_count"],
+            disqus_url=job.snapshot["disqus_url"],
+            defer_parse=True,
+        )
+        return job
+
+    async def parse(job: ModuleJob) -> Optional[ModuleJob]:
+        result = job.result
+        if result.html is not None:
+            comments = await loop.run_in_executor(parse_executor, parse_comments, result.html)
+            result.html = None
+            result.comments = comments
+            if not comments:
+                logger.info(f"No reviews found for {job.code}")
+                result.error = "no_reviews"
+        return job
+
+    async def persist(job: ModuleJob) -> Optional[ModuleJob]:
+        # Steps 4-5: Store comments
+        success, needs_analysis = await asyncio.to_thread(_persist, job)
+        if needs_analysis:
+            return job
+        record(job.code, "success" if success else "failed")
+        return None
+
+    async def analyse(job: ModuleJob) -> Optional[ModuleJob]:
+        # Step 6: Run sentiment analysis
+        success = await asyncio.to_thread(_analyse, job)
+        record(job.code, "success" if success else "failed")
+        return None
+
+    async def feed():
+        for i, code in enumerate(module_codes):
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info(f"⏱️  Time budget reached, not starting the remaining {len(module_codes) - i} modules")
+                if progress:
+                    for skipped in module_codes[i:]:
+                        progress(skipped, "skipped")
+                break
+            await fetch_q.put(ModuleJob(code))
+            stages["fetch"].max_queue_depth = max(stages["fetch"].max_queue_depth, fetch_q.qsize())
+        for _ in range(concurrency):
+            await fetch_q.put(_DONE)
+
+    try:
+        await asyncio.gather(
+            feed(),
+            _run_stage(stages["fetch"], fetch_q, parse_q, PARSE_WORKERS, fetch, record, stages["parse"], module_timeout, progress),
+            _run_stage(stages["parse"], parse_q, persist_q, PERSIST_WORKERS, parse, record, stages["persist"], module_timeout, progress),
+            _run_stage(stages["persist"], persist_q, analyse_q, ANALYSE_WORKERS, persist, record, stages["analyse"], module_timeout, progress),
+            _run_stage(stages["analyse"], analyse_q, None, 0, analyse, record, None, module_timeout, progress),
+        )
+    finally:
+        await pool.close()
+        parse_executor.shutdown(wait=False)
+
+    outcomes["stages"] = {name: s.report() for name, s in stages.items()}
+    log_stage_report(outcomes["stages"])
+    return outcomes
+
+
+def log_stage_report(report: Dict[str, Dict]):
+    logger.info(f"\n{'='*60}")
+    logger.info("STAGE REPORT")
+    logger.info(f"{'='*60}")
+    for name, s in report.items():
+        logger.info(
+            f"{name:8} workers={s['workers']} processed={s['processed']} failed={s['failed']} "
+            f"max_queue={s['max_queue_depth']} throughput={s['throughput_per_min']}/min "
+            f"utilisation={s['utilisation']:.0%}"
+        )
+    logger.info(f"{'='*60}\n")
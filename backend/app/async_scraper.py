@@ -0,0 +1,251 @@
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeout
+from app.browser import AsyncBrowserPool
+from app import scraper
+from app.scraper import ScrapeResult
+from contextlib import asynccontextmanager
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Politeness limits, applied per host (nusmods.com, disqus.com, ...)
+HOST_CONCURRENCY = int(os.getenv("SCRAPER_HOST_CONCURRENCY", "2"))       # max in-flight requests per host
+HOST_MIN_INTERVAL = float(os.getenv("SCRAPER_HOST_MIN_INTERVAL", "0.5"))  # seconds between request starts per host
+
+
+class HostLimiter:
+    """
+    Per-host politeness limiter: at most `concurrency` requests in flight per host,
+    and request starts spaced at least `min_interval` seconds apart.
+    Both are read on every request, so they can be changed while the limiter is in use
+    (e.g. a worker's fleet share, see app/work_queue.py).
+    """
+
+    def __init__(self, concurrency: int = HOST_CONCURRENCY, min_interval: float = HOST_MIN_INTERVAL):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._waiters: Dict[str, Deque[asyncio.Future]] = defaultdict(deque)
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._last_start: Dict[str, float] = {}
+
+    async def _acquire_slot(self, host: str):
+        while self._in_flight[host] >= self.concurrency:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[host].append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter.done():
+                    self._wake(host)  # Woken but cancelled: pass the free slot on
+                else:
+                    self._waiters[host].remove(waiter)
+                raise
+        self._in_flight[host] += 1
+
+    def _wake(self, host: str):
+        waiters = self._waiters[host]
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        host = urlparse(url).netloc
+        await self._acquire_slot(host)
+        try:
+            async with self._locks[host]:
+                wait = self._last_start.get(host, 0) + self.min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last_start[host] = time.monotonic()
+            yield
+        finally:
+            self._in_flight[host] -= 1
+            self._wake(host)
+
+
+# ============================================================================
+# PAGE STEPS (async driver; the logic is shared with app/scraper.py)
+# ============================================================================
+
+async def _open_module_page(page: Page, module_code: str, limiter: HostLimiter) -> Tuple[Optional[str], Optional[str]]:
+    url = scraper.module_page_url(module_code)
+    async with limiter.limit(url):
+        response = await page.goto(url, wait_until="networkidle", timeout=15000)
+
+    if response.status == 404:
+        logger.warning(f"Module {module_code} not found (404)")
+        return None, "not_found"
+
+    try:
+        await page.wait_for_selector(scraper.DISQUS_THREAD_SELECTOR, timeout=10000)
+    except PlaywrightTimeout:
+        logger.error(f"Disqus iframe didn't load for {module_code}")
+        return None, "scrape_failed"
+
+    return await page.content(), None
+
+
+async def _open_disqus_page(page: Page, disqus_url: str, limiter: HostLimiter) -> Optional[str]:
+    async with limiter.limit(disqus_url):
+        response = await page.goto(disqus_url, wait_until="networkidle", timeout=15000)
+    if not response.ok:
+        logger.error(f"Failed to load Disqus URL: {disqus_url} with status {response.status}")
+        return "scrape_failed"
+    return None
+
+
+async def _open_cached_disqus_page(page: Page, disqus_url: str, module_code: str, limiter: HostLimiter) -> bool:
+    try:
+        if await _open_disqus_page(page, disqus_url, limiter):
+            return False
+        await page.wait_for_selector(scraper.COMMENT_COUNT_SELECTOR, timeout=5000)
+        return True
+    except Exception as e:
+        logger.warning(f"Cached Disqus URL failed for {module_code}, falling back to NUSMods: {e}")
+        return False
+
+
+async def _resolve_disqus_url(page: Page, module_code: str, limiter: HostLimiter) -> Tuple[Optional[str], Optional[str]]:
+    html, error = await _open_module_page(page, module_code, limiter)
+    if error:
+        return None, error
+    return scraper.disqus_url_from_html(html, module_code)
+
+
+async def _read_comment_count(page: Page, module_code: str) -> int:
+    try:
+        return scraper.parse_comment_count(await page.locator(scraper.COMMENT_COUNT_SELECTOR).first.inner_text(timeout=5000), module_code)
+    except Exception as e:
+        return scraper.parse_comment_count(None, module_code, error=e)
+
+
+async def _load_all_comments(page: Page, limiter: HostLimiter) -> int:
+    try:
+        await page.wait_for_selector(scraper.POST_LIST_SELECTOR, timeout=10000)
+    except PlaywrightTimeout:
+        logger.warning("No comments found (post-list didn't load)")
+        return 0
+
+    tracker = scraper.LoadMoreTracker()
+    while tracker.wants_more():
+        try:
+            load_more = page.locator(scraper.LOAD_MORE_SELECTOR)
+            if not await load_more.is_visible():
+                break
+            before_count = await page.locator(scraper.POST_SELECTOR).count()
+            async with limiter.limit(page.url):
+                await load_more.click()
+
+            try:
+                await page.wait_for_function(scraper.MORE_POSTS_RENDERED, arg=before_count, timeout=scraper.LOAD_MORE_TIMEOUT)
+                rendered = True
+            except PlaywrightTimeout:
+                rendered = False
+            if not tracker.clicked(rendered):
+                break
+        except Exception:
+            break
+    return tracker.finish()
+
+
+async def _capture_all_comments(page: Page, limiter: HostLimiter) -> Optional[List[Dict]]:
+    try:
+        collector = scraper.DisqusPostCollector(await page.locator(scraper.THREAD_DATA_SELECTOR).text_content(timeout=5000))
+    except Exception as e:
+        logger.warning(f"Disqus thread data unavailable, falling back to DOM parsing: {e}")
+        return None
+
+    while collector.wants_more():
+        try:
+            async with limiter.limit(page.url):
+                async with page.expect_response(scraper.is_posts_response, timeout=scraper.LOAD_MORE_TIMEOUT) as response_info:
+                    await page.locator(scraper.LOAD_MORE_SELECTOR).click(timeout=scraper.LOAD_MORE_TIMEOUT)
+                response = await response_info.value
+            payload = await response.json()
+        except Exception as e:
+            if not collector.failed(e):
+                break
+            continue
+        collector.add_response(payload)
+
+    return collector.finish()
+
+
+async def _collect_comments(page: Page, limiter: HostLimiter, defer_parse: bool) -> Tuple[Optional[List[Dict]], Optional[str]]:
+    """
+    Returns (comments, None), or (None, html) when the DOM path is used and parsing is deferred
+    to the caller (so it can run off the event loop, e.g. in a process pool).
+    """
+    if scraper.DISQUS_SCRAPE_MODE == "network":
+        comments = await _capture_all_comments(page, limiter)
+        if comments is not None:
+            return comments, None
+
+    batches = await _load_all_comments(page, limiter)
+    html = await page.content()
+    if defer_parse:
+        return None, html
+    return scraper.parse_dom_comments(html, batches), None
+
+
+# ============================================================================
+# SCRAPE SESSION
+# ============================================================================
+
+async def _scrape_module_once(pool: AsyncBrowserPool, limiter: HostLimiter, module_code: str,
+                              known_count: Optional[int], disqus_url: Optional[str], defer_parse: bool) -> ScrapeResult:
+    async with pool.page() as page:
+        if not (disqus_url and await _open_cached_disqus_page(page, disqus_url, module_code, limiter)):
+            disqus_url, error = await _resolve_disqus_url(page, module_code, limiter)
+            if error:
+                return ScrapeResult(error=error)
+
+            error = await _open_disqus_page(page, disqus_url, limiter)
+            if error:
+                return ScrapeResult(error=error)
+
+        count = await _read_comment_count(page, module_code)
+        if known_count is not None and count == known_count:
+            return ScrapeResult(count=count, disqus_url=disqus_url)
+
+        comments, html = await _collect_comments(page, limiter, defer_parse)
+        if html is not None:
+            return ScrapeResult(count=count, disqus_url=disqus_url, html=html)
+        return scraper.comments_result(module_code, count, comments, disqus_url)
+
+
+async def scrape_module_async(pool: AsyncBrowserPool, limiter: HostLimiter, module_code: str,
+                              known_count: Optional[int] = None, retry_count: int = 3,
+                              disqus_url: Optional[str] = None, defer_parse: bool = False) -> ScrapeResult:
+    """
+    Async version of app.scraper.scrape_module(), leasing pages from a shared
+    AsyncBrowserPool and throttled by a shared HostLimiter.
+    With defer_parse=True, DOM-mode results carry the raw html instead of parsed comments.
+    """
+    for attempt in range(retry_count):
+        try:
+            result = await _scrape_module_once(pool, limiter, module_code, known_count, disqus_url, defer_parse)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error scraping {module_code}: {e}")
+            result = ScrapeResult(error="scrape_failed")
+
+        if result.error != "scrape_failed":
+            return result
+
+        disqus_url = None
+        if attempt < retry_count - 1:
+            logger.info(f"Retry {attempt + 1}/{retry_count} for {module_code}")
+            await asyncio.sleep(2)
+
+    return ScrapeResult(error="scrape_failed")
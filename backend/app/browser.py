@@ -0,0 +1,309 @@
+from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page, Error as PlaywrightError
+from playwright import async_api
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Iterator, List, Optional
+import asyncio
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (override via environment variables)
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))                 # pages leased at once (and kept warm between leases)
+LEASE_TIMEOUT = float(os.getenv("BROWSER_LEASE_TIMEOUT", "60"))      # seconds to wait for a free page
+MAX_PAGE_USES = int(os.getenv("BROWSER_MAX_PAGE_USES", "25"))        # recycle a page's context after this many leases
+HEALTH_CHECK_TIMEOUT = int(os.getenv("BROWSER_HEALTH_CHECK_TIMEOUT", "2000"))  # ms
+
+
+class _PooledPage:
+    """A page together with its own browser context, so cookies/storage never leak between leases."""
+
+    def __init__(self, context: BrowserContext, page: Page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+
+    def close(self):
+        try:
+            self.context.close()
+        except Exception:
+            pass  # Context already gone (e.g. browser crashed)
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium instance with a small pool of reusable pages.
+
+    - Chromium is launched lazily on the first lease and reused afterwards.
+    - Pages are recycled (fresh context) after MAX_PAGE_USES leases.
+    - A page is health-checked before every lease; unhealthy pages are discarded.
+    - If the browser disconnects (crash, OOM), it is relaunched on the next lease.
+    - At most `size` pages are leased at once; a further lease waits up to LEASE_TIMEOUT
+      for one to be returned, then raises RuntimeError.
+
+    Playwright's sync API is bound to the thread that started it, so each thread
+    should use its own pool (see get_browser_pool()).
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_page_uses: int = MAX_PAGE_USES, headless: bool = True):
+        self.size = size
+        self.max_page_uses = max_page_uses
+        self.headless = headless
+
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._idle: List[_PooledPage] = []
+        self._leases = threading.BoundedSemaphore(size)
+        self.launches = 0
+
+    # ------------------------------------------------------------------
+    # Browser lifecycle
+    # ------------------------------------------------------------------
+
+    def _ensure_browser(self) -> Browser:
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+
+        if self._browser is not None:
+            logger.warning("Browser disconnected, relaunching Chromium")
+            self._discard_idle()
+
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+
+        self._browser = self._playwright.chromium.launch(headless=self.headless)
+        self.launches += 1
+        logger.info(f"Launched Chromium (launch #{self.launches})")
+        return self._browser
+
+    def _new_page(self) -> _PooledPage:
+        browser = self._ensure_browser()
+        context = browser.new_context()
+        return _PooledPage(context, context.new_page())
+
+    def _discard_idle(self):
+        for pooled in self._idle:
+            pooled.close()
+        self._idle = []
+
+    def _is_healthy(self, pooled: _PooledPage) -> bool:
+        if self._browser is None or not self._browser.is_connected():
+            return False
+        if pooled.page.is_closed():
+            return False
+        try:
+            pooled.page.evaluate("1", timeout=HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    # ------------------------------------------------------------------
+    # Leasing
+    # ------------------------------------------------------------------
+
+    def _acquire(self) -> _PooledPage:
+        while self._idle:
+            pooled = self._idle.pop()
+            if pooled.uses >= self.max_page_uses:
+                logger.debug("Recycling page after max uses")
+                pooled.close()
+                continue
+            if not self._is_healthy(pooled):
+                logger.warning("Discarding unhealthy page")
+                pooled.close()
+                continue
+            return pooled
+        return self._new_page()
+
+    def _release(self, pooled: _PooledPage, failed: bool):
+        pooled.uses += 1
+        if failed or len(self._idle) >= self.size or pooled.uses >= self.max_page_uses:
+            pooled.close()
+            return
+
+        try:
+            # Drop the previous document so the next lease starts from a blank page
+            pooled.page.goto("about:blank")
+        except Exception:
+            pooled.close()
+            return
+        self._idle.append(pooled)
+
+    @contextmanager
+    def page(self) -> Iterator[Page]:
+        """
+        Lease a page from the pool.
+
+        Usage:
+            with pool.page() as page:
+                page.goto(url)
+
+        If the body raises a Playwright error, the page is discarded rather than returned.
+        """
+        if not self._leases.acquire(timeout=LEASE_TIMEOUT):
+            raise RuntimeError(f"No free page in the browser pool after {LEASE_TIMEOUT}s (size {self.size})")
+        try:
+            pooled = self._acquire()
+            failed = False
+            try:
+                yield pooled.page
+            except PlaywrightError:
+                failed = True
+                raise
+            finally:
+                self._release(pooled, failed)
+        finally:
+            self._leases.release()
+
+    def close(self):
+        """Close all pages, the browser and the Playwright driver."""
+        self._discard_idle()
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+
+_local = threading.local()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Return the calling thread's shared browser pool, creating it on first use."""
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = BrowserPool()
+        _local.pool = pool
+    return pool
+
+
+def close_browser_pool():
+    """Shut down the calling thread's browser pool (call at the end of a pipeline run)."""
+    pool = getattr(_local, "pool", None)
+    if pool is not None:
+        pool.close()
+        _local.pool = None
+
+
+class AsyncBrowserPool:
+    """
+    asyncio counterpart of BrowserPool for playwright.async_api.
+    Same recycling, health-check and crash-recovery rules; up to `size` pages can be
+    leased at once from concurrent tasks, and further leases wait for one to be
+    returned. Bound to the event loop that created it.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_page_uses: int = MAX_PAGE_USES, headless: bool = True):
+        self.size = size
+        self.max_page_uses = max_page_uses
+        self.headless = headless
+
+        self._playwright = None
+        self._browser: Optional[async_api.Browser] = None
+        self._idle: List[_PooledPage] = []
+        self._leases = asyncio.Semaphore(size)
+        self._launch_lock = asyncio.Lock()
+        self.launches = 0
+
+    async def _ensure_browser(self) -> async_api.Browser:
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+
+            if self._browser is not None:
+                logger.warning("Browser disconnected, relaunching Chromium")
+                await self._discard_idle()
+
+            if self._playwright is None:
+                self._playwright = await async_api.async_playwright().start()
+
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self.launches += 1
+            logger.info(f"Launched Chromium (launch #{self.launches})")
+            return self._browser
+
+    async def _new_page(self) -> _PooledPage:
+        browser = await self._ensure_browser()
+        context = await browser.new_context()
+        return _PooledPage(context, await context.new_page())
+
+    async def _close_page(self, pooled: _PooledPage):
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass
+
+    async def _discard_idle(self):
+        idle, self._idle = self._idle, []
+        for pooled in idle:
+            await self._close_page(pooled)
+
+    async def _is_healthy(self, pooled: _PooledPage) -> bool:
+        if self._browser is None or not self._browser.is_connected():
+            return False
+        if pooled.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(pooled.page.evaluate("1"), HEALTH_CHECK_TIMEOUT / 1000)
+            return True
+        except Exception:
+            return False
+
+    async def _acquire(self) -> _PooledPage:
+        while self._idle:
+            pooled = self._idle.pop()
+            if pooled.uses >= self.max_page_uses or not await self._is_healthy(pooled):
+                await self._close_page(pooled)
+                continue
+            return pooled
+        return await self._new_page()
+
+    async def _release(self, pooled: _PooledPage, failed: bool):
+        pooled.uses += 1
+        if failed or len(self._idle) >= self.size or pooled.uses >= self.max_page_uses:
+            await self._close_page(pooled)
+            return
+
+        try:
+            await pooled.page.goto("about:blank")
+        except Exception:
+            await self._close_page(pooled)
+            return
+        self._idle.append(pooled)
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[async_api.Page]:
+        """Lease a page from the pool (async with pool.page() as page: ...). Waits while `size` pages are out."""
+        async with self._leases:
+            pooled = await self._acquire()
+            failed = False
+            try:
+                yield pooled.page
+            except (async_api.Error, asyncio.CancelledError, asyncio.TimeoutError):
+                failed = True
+                raise
+            finally:
+                await self._release(pooled, failed)
+
+    async def close(self):
+        await self._discard_idle()
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
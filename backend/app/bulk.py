@@ -0,0 +1,90 @@
+import csv
+import io
+import logging
+import os
+from typing import Dict, List
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models import Comment
+
+logger = logging.getLogger(__name__)
+
+# Bulk write tuning (override via environment variables)
+BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))         # rows per executemany call
+COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "5000"))  # use COPY FROM STDIN at or above this many rows
+
+COMMENT_COLUMNS = ["module_id", "external_id", "text", "posted_date", "upvotes", "scraped_at"]
+NULLABLE_COLUMNS = ["external_id", "posted_date", "upvotes", "scraped_at"]
+
+
+def insert_comment_rows_core(db: Session, rows: List[Dict], upsert: bool = True):
+    """
+    Write comment rows with SQLAlchemy Core executemany, BATCH_SIZE rows per call.
+    The statement is compiled once; psycopg2 batches the rows into multi-VALUES INSERTs.
+    """
+    stmt = insert(Comment)
+    if upsert:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["module_id", "external_id"],
+            set_={"upvotes": stmt.excluded.upvotes, "text": stmt.excluded.text},
+        )
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.execute(stmt, rows[start:start + BATCH_SIZE])
+
+
+def copy_comment_rows(db: Session, rows: List[Dict], upsert: bool = True):
+    """
+    Write comment rows with COPY FROM STDIN (psycopg2) into a temp table, then
+    merge into comments in one INSERT ... SELECT. Runs inside the session's transaction.
+    """
+    buffer = io.StringIO()
+    # Every value is written quoted; "" means NULL only in the nullable columns (FORCE_NULL),
+    # so an empty comment text stays an empty string
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([row.get(column) for column in COMMENT_COLUMNS])
+    buffer.seek(0)
+
+    columns = ", ".join(COMMENT_COLUMNS)
+    db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS comments_staging "
+        "(LIKE comments INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY comments_staging ({columns}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NULL ({', '.join(NULLABLE_COLUMNS)}))",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+    conflict = (
+        "ON CONFLICT (module_id, external_id) DO UPDATE SET upvotes = EXCLUDED.upvotes, text = EXCLUDED.text"
+        if upsert else ""
+    )
+    db.execute(text(f"INSERT INTO comments ({columns}) SELECT {columns} FROM comments_staging {conflict}"))
+    db.execute(text("DROP TABLE comments_staging"))
+
+
+def write_comment_rows(db: Session, rows: List[Dict], upsert: bool = True) -> str:
+    """
+    Write comment rows using the fastest path for the batch size.
+    COPY is only used on PostgreSQL/psycopg2. Caller commits.
+    Returns the method used ("core" or "copy").
+    """
+    if not rows:
+        return "core"
+
+    bind = db.get_bind()
+    if len(rows) >= COPY_THRESHOLD and bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+        copy_comment_rows(db, rows, upsert=upsert)
+        method = "copy"
+    else:
+        insert_comment_rows_core(db, rows, upsert=upsert)
+        method = "core"
+
+    logger.info(f"Wrote {len(rows)} comment rows via {method}")
+    return method
@@ -0,0 +1,289 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Optional dependency: the shared tier is skipped without it
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Response cache configuration (override via environment variables)
+LOCAL_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+LOCAL_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))          # seconds; bounds staleness without a shared tier
+SHARED_TTL = int(os.getenv("RESPONSE_CACHE_SHARED_TTL", "86400"))  # seconds
+REDIS_URL = os.getenv("REDIS_URL")                                 # shared tier, e.g. redis://localhost:6379/0
+SHARED_BACKEND = os.getenv("RESPONSE_CACHE_SHARED", "redis" if REDIS_URL else "none")  # "redis" | "memory" | "none"
+GENERATION_TTL = float(os.getenv("RESPONSE_CACHE_GENERATION_TTL", "1.0"))  # seconds a worker reuses the shared generation before re-reading it
+
+KEY_PREFIX = "ratemynus:response:"
+GENERATION_KEY = "ratemynus:response-generation"
+
+
+class LocalTier:
+    """In-process LRU with per-entry TTL. Thread-safe (sync handlers run in a threadpool)."""
+
+    def __init__(self, max_entries: int = LOCAL_MAX_ENTRIES, ttl: float = LOCAL_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, body, etag = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def set(self, key: str, body: bytes, etag: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InMemorySharedStore:
+    """
+    Redis-compatible stand-in (get/set with ex/incr) for local development and tests.
+    Only shared between threads of one process, so it doesn't replace Redis across workers.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ex: Optional[int] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._data.get(key, (None, 0))
+            value = int(value) + 1
+            self._data[key] = (None, str(value).encode())
+            return value
+
+
+def _make_shared_store():
+    if SHARED_BACKEND == "memory":
+        return InMemorySharedStore()
+    if SHARED_BACKEND == "redis":
+        if redis is None or not REDIS_URL:
+            logger.warning("Shared response cache needs redis and REDIS_URL, using local tier only")
+            return None
+        return redis.Redis.from_url(REDIS_URL, socket_timeout=0.5)
+    return None
+
+
+class ResponseCache:
+    """
+    Two-tier cache for JSON read endpoints with strong ETags.
+
+    Keys are namespaced by a generation number. invalidate() bumps the generation,
+    so every cached response is dropped at once. With a shared tier, the generation
+    lives there, so a pipeline run in another process invalidates every API worker.
+    Without one, other processes pick up changes when LOCAL_TTL expires.
+
+    Each worker re-reads the shared generation at most every GENERATION_TTL seconds,
+    so a hit costs no round trip and other workers see an invalidation within that interval.
+    """
+
+    def __init__(self, local: Optional[LocalTier] = None, shared=None):
+        self.local = local or LocalTier()
+        self.shared = shared
+        self._local_generation = 0
+        self._shared_generation: Optional[Tuple[float, int]] = None  # (read at, value)
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "not_modified": 0,
+                       "invalidations": 0, "shared_errors": 0, "lookup_seconds": 0.0, "lookups": 0}
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def generation(self) -> int:
+        if self.shared is not None:
+            cached = self._shared_generation
+            if cached is not None and time.monotonic() - cached[0] < GENERATION_TTL:
+                return cached[1]
+            try:
+                value = self.shared.get(GENERATION_KEY)
+                generation = int(value) if value is not None else 0
+                self._shared_generation = (time.monotonic(), generation)
+                return generation
+            except Exception as e:
+                self._count("shared_errors")
+                logger.warning(f"Shared cache unavailable: {e}")
+        return self._local_generation
+
+    def get(self, key: str, generation: Optional[int] = None) -> Optional[Tuple[bytes, str]]:
+        started = time.perf_counter()
+        try:
+            full_key = f"{self.generation() if generation is None else generation}:{key}"
+            entry = self.local.get(full_key)
+            if entry is not None:
+                self._count("local_hits")
+                return entry
+
+            if self.shared is not None:
+                try:
+                    raw = self.shared.get(KEY_PREFIX + full_key)
+                except Exception as e:
+                    self._count("shared_errors")
+                    logger.warning(f"Shared cache unavailable: {e}")
+                    raw = None
+                if raw is not None:
+                    etag, _, body = bytes(raw).partition(b"\n")
+                    entry = (body, etag.decode())
+                    self.local.set(full_key, *entry)
+                    self._count("shared_hits")
+                    return entry
+
+            self._count("misses")
+            return None
+        finally:
+            self._count("lookups")
+            self._count("lookup_seconds", time.perf_counter() - started)
+
+    def set(self, key: str, body: bytes, etag: str, generation: Optional[int] = None):
+        """
+        Store under `generation`: pass the one read before producing the body, so a response
+        built from data older than a concurrent invalidate() isn't filed under the new generation.
+        """
+        full_key = f"{self.generation() if generation is None else generation}:{key}"
+        self.local.set(full_key, body, etag)
+        if self.shared is not None:
+            try:
+                self.shared.set(KEY_PREFIX + full_key, etag.encode() + b"\n" + body, ex=SHARED_TTL)
+            except Exception as e:
+                self._count("shared_errors")
+                logger.warning(f"Shared cache unavailable: {e}")
+
+    def invalidate(self):
+        """Drop every cached response (call after committing module/comment/sentiment changes)."""
+        with self._lock:
+            self._local_generation += 1
+        self.local.clear()
+        if self.shared is not None:
+            try:
+                self._shared_generation = (time.monotonic(), int(self.shared.incr(GENERATION_KEY)))
+            except Exception as e:
+                self._count("shared_errors")
+                logger.warning(f"Shared cache invalidation failed: {e}")
+        self._count("invalidations")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["local_hits"] + stats["shared_hits"]
+        lookups = stats.pop("lookups")
+        lookup_seconds = stats.pop("lookup_seconds")
+        return {
+            **stats,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "avg_lookup_ms": round(lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "local_entries": len(self.local),
+            "shared_backend": SHARED_BACKEND if self.shared is not None else "none",
+            "generation": self.generation(),
+        }
+
+
+response_cache = ResponseCache(shared=_make_shared_store())
+
+
+def invalidate_response_cache():
+    response_cache.invalidate()
+
+
+def _lookup(key: str) -> Tuple[int, Optional[Tuple[bytes, str]]]:
+    """
+    Returns:
+        The current generation and the entry cached under it (None on a miss).
+    """
+    generation = response_cache.generation()
+    return generation, response_cache.get(key, generation)
+
+
+def _render(key: str, data: Any, generation: int) -> Tuple[bytes, str]:
+    body = json.dumps(jsonable_encoder(data), separators=(",", ":")).encode("utf-8")
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    response_cache.set(key, body, etag, generation)
+    return body, etag
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison (RFC 9110 13.1.2): a W/ prefix on either
+    side is ignored. The header is "*" or a comma-separated list of entity tags.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def _respond(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # Clients may store it but must revalidate
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        response_cache._count("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached_json_response(request: Request, key: str, produce: Callable[[], Any]) -> Response:
+    """
+    Serve `produce()` as JSON through the response cache, with a strong ETag.
+    Answers 304 Not Modified when If-None-Match matches. Exceptions from produce()
+    (e.g. HTTPException 404) propagate and are not cached.
+    """
+    generation, entry = _lookup(key)
+    body, etag = entry if entry is not None else _render(key, produce(), generation)
+    return _respond(request, body, etag)
+
+
+async def cached_json_response_async(request: Request, key: str, produce: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    cached_json_response() for async handlers: `produce()` is awaited on a miss.
+    Cache lookups and stores may block on the shared tier, so they run in the threadpool.
+    """
+    generation, entry = await run_in_threadpool(_lookup, key)
+    if entry is None:
+        data = await produce()
+        entry = await run_in_threadpool(_render, key, data, generation)
+    return _respond(request, *entry)
@@ -1,20 +1,134 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from typing import Dict
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Connection pool configuration (override via environment variables)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))                       # connections kept open
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))                # extra connections under load
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))              # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))              # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # API request transactions only; 0 disables
+DB_SLOW_CHECKOUT_MS = float(os.getenv("DB_SLOW_CHECKOUT_MS", "250"))     # log checkouts slower than this
+
+
+class PoolMetricsMixin:
+    """Records checkout counts, timeouts and how long callers waited. Mixed into a QueuePool class."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self._timeouts += 1
+            logger.warning(f"⚠️  DB pool checkout failed after {time.perf_counter() - started:.2f}s ({self.status()})")
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self._checkouts += 1
+                self._wait_seconds += waited
+                self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            if waited * 1000 > DB_SLOW_CHECKOUT_MS:
+                logger.warning(f"⚠️  Waited {waited * 1000:.0f}ms for a DB connection ({self.status()})")
+
+    def recreate(self):
+        # Keep counters when the pool is recreated (e.g. engine.dispose())
+        pool = super().recreate()
+        pool._checkouts, pool._timeouts = self._checkouts, self._timeouts
+        pool._wait_seconds, pool._max_wait_seconds = self._wait_seconds, self._max_wait_seconds
+        return pool
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            checkouts, timeouts = self._checkouts, self._timeouts
+            wait_seconds, max_wait = self._wait_seconds, self._max_wait_seconds
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "avg_wait_ms": round(wait_seconds / checkouts * 1000, 3) if checkouts else 0.0,
+            "max_wait_ms": round(max_wait * 1000, 3),
+        }
+
+
+class InstrumentedQueuePool(PoolMetricsMixin, QueuePool):
+    pass
+
+
+def pool_options() -> Dict:
+    """Pool settings shared by the sync engine and the async read engine (app/async_database.py)."""
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    **pool_options(),
+)
+
+
+class ApiSession(Session):
+    """
+    Session for API requests: every transaction runs under DB_STATEMENT_TIMEOUT_MS.
+    Batch work (pipeline, migrations, COPY, scorer training, work queue) uses plain
+    sessions from SessionLocal, with no timeout.
+    """
+
+
+@event.listens_for(ApiSession, "after_begin")
+def _set_statement_timeout(session, transaction, connection):
+    # SET LOCAL ends with the transaction, so it never leaks to the next user of the
+    # connection, including through a transaction-pooling PgBouncer
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ApiSessionLocal = sessionmaker(class_=ApiSession, autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
 def get_db():
-    db = SessionLocal()
+    """FastAPI dependency: one session per request, closed (connection returned) when the request ends."""
+    db = ApiSessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def pool_stats() -> Dict:
+    return engine.pool.stats()
@@ -0,0 +1,180 @@
+from sqlalchemy import case, func, literal_column, select, text
+from sqlalchemy.orm import Session
+from app.models import Module, Comment
+from typing import Dict, List
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Index names created by migrate_db.py (SEARCH_INDEX_MIGRATIONS)
+TRIGRAM_INDEXES = ("ix_modules_code_trgm", "ix_modules_name_trgm")
+FULLTEXT_INDEX = "ix_comments_text_fts"
+
+# Must match the index expression exactly, so it is inlined rather than bound as a parameter
+FTS_CONFIG = literal_column("'english'::regconfig")
+
+SNIPPETS_PER_MODULE = int(os.getenv("REVIEW_SEARCH_SNIPPETS", "3"))
+HEADLINE_OPTIONS = "MaxWords=35, MinWords=15, MaxFragments=1, StartSel=**, StopSel=**"
+INDEX_CHECK_INTERVAL = float(os.getenv("SEARCH_INDEX_CHECK_INTERVAL", "300"))  # seconds
+
+_available: Dict[str, bool] = {}
+_checked_at = 0.0
+
+
+def search_indexes(db: Session) -> Dict[str, bool]:
+    """
+    Which search indexes exist: {"trigram": bool, "fulltext": bool}.
+    Cached for INDEX_CHECK_INTERVAL so a later migrate_db.py run is picked up without a restart.
+    """
+    global _checked_at
+    if not _available or time.monotonic() - _checked_at > INDEX_CHECK_INTERVAL:
+        names = set(db.execute(
+            text("SELECT indexname FROM pg_indexes WHERE indexname = ANY(:names)"),
+            {"names": list(TRIGRAM_INDEXES) + [FULLTEXT_INDEX]},
+        ).scalars())
+        _available["trigram"] = all(name in names for name in TRIGRAM_INDEXES)
+        _available["fulltext"] = FULLTEXT_INDEX in names
+        _checked_at = time.monotonic()
+    return dict(_available)
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def comment_document():
+    """The tsvector expression indexed by ix_comments_text_fts."""
+    return func.to_tsvector(FTS_CONFIG, Comment.text)
+
+
+# ============================================================================
+# MODULE SEARCH (pg_trgm)
+# ============================================================================
+
+def module_search_query(q: str, limit: int):
+    """
+    Same ranking as app.search_index.search_priority, done in SQL so only `limit`
+    rows leave the database. The ILIKE filters are served by the trigram GIN indexes.
+    """
+    q_upper = _like_escape(q.upper().strip())
+    code, name = func.upper(Module.code), func.upper(Module.name)
+    priority = case(
+        (code == q.upper().strip(), 0),
+        (code.like(f"{q_upper}%", escape="\\"), 1),
+        (code.like(f"%{q_upper}%", escape="\\"), 2),
+        (name.like(f"{q_upper}%", escape="\\"), 3),
+        else_=4,
+    )
+    pattern = f"%{q_upper}%"
+    return (
+        select(Module.code, Module.name, Module.last_comment_count, Module.units, Module.semesters_available)
+        .where(Module.code.ilike(pattern, escape="\\") | Module.name.ilike(pattern, escape="\\"))
+        .order_by(priority, Module.code.collate("C"))  # Byte order, like the Python sort
+        .limit(limit)
+    )
+
+
+def search_modules_indexed(db: Session, q: str, limit: int = 10) -> List[Dict]:
+    rows = db.execute(module_search_query(q, limit)).all()
+    return [
+        {
+            "code": row.code,
+            "name": row.name,
+            "comment_count": row.last_comment_count,
+            "units": row.units,
+            "semesters": row.semesters_available,
+        }
+        for row in rows
+    ]
+
+
+# ============================================================================
+# REVIEW SEARCH (full-text)
+# ============================================================================
+
+def review_search_query(q: str, limit: int):
+    """Modules ranked by the summed ts_rank of their matching reviews."""
+    document = comment_document()
+    query = func.websearch_to_tsquery(FTS_CONFIG, q)
+    matches = (
+        select(
+            Comment.module_id,
+            func.sum(func.ts_rank(document, query)).label("score"),
+            func.count().label("matches"),
+        )
+        .where(document.op("@@")(query))
+        .group_by(Comment.module_id)
+        .subquery()
+    )
+    return (
+        select(Module.id, Module.code, Module.name, matches.c.score, matches.c.matches)
+        .join(matches, matches.c.module_id == Module.id)
+        .order_by(matches.c.score.desc(), Module.code)
+        .limit(limit)
+    )
+
+
+def snippet_query(q: str, module_ids: List[int], per_module: int = SNIPPETS_PER_MODULE):
+    """Best `per_module` matching reviews per module, highlighted with ts_headline."""
+    document = comment_document()
+    query = func.websearch_to_tsquery(FTS_CONFIG, q)
+    rank = func.ts_rank(document, query)
+    ranked = (
+        select(
+            Comment.module_id,
+            Comment.text,
+            Comment.upvotes,
+            Comment.posted_date,
+            rank.label("rank"),
+            func.row_number().over(
+                partition_by=Comment.module_id,
+                order_by=(rank.desc(), Comment.upvotes.desc(), Comment.id),
+            ).label("position"),
+        )
+        .where(document.op("@@")(query), Comment.module_id.in_(module_ids))
+        .subquery()
+    )
+    # ts_headline is expensive, so it only runs on the rows that are returned
+    return (
+        select(
+            ranked.c.module_id,
+            func.ts_headline(FTS_CONFIG, ranked.c.text, query, HEADLINE_OPTIONS).label("snippet"),
+            ranked.c.upvotes,
+            ranked.c.posted_date,
+            ranked.c.rank,
+        )
+        .where(ranked.c.position <= per_module)
+        .order_by(ranked.c.module_id, ranked.c.position)
+    )
+
+
+def search_reviews(db: Session, q: str, limit: int = 10) -> List[Dict]:
+    """
+    Modules whose reviews mention `q` (web search syntax: "bell curve", -project, a OR b),
+    best match first, each with its top highlighted snippets.
+    """
+    modules = db.execute(review_search_query(q, limit)).all()
+    if not modules:
+        return []
+
+    snippets: Dict[int, List[Dict]] = {m.id: [] for m in modules}
+    for row in db.execute(snippet_query(q, list(snippets))):
+        snippets[row.module_id].append({
+            "snippet": row.snippet,
+            "upvotes": row.upvotes,
+            "posted_date": row.posted_date,
+            "rank": round(row.rank, 4),
+        })
+
+    return [
+        {
+            "code": m.code,
+            "name": m.name,
+            "matches": m.matches,
+            "score": round(m.score, 4),
+            "snippets": snippets[m.id],
+        }
+        for m in modules
+    ]
@@ -0,0 +1,420 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import PipelineRun, now_sgt
+from app.pipeline import plan_pipeline_run, populate_scope
+from app.async_pipeline import run_modules
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Job configuration (override via environment variables)
+FLUSH_INTERVAL = float(os.getenv("PIPELINE_JOB_FLUSH_INTERVAL", "2"))        # min seconds between progress writes
+HEARTBEAT_INTERVAL = float(os.getenv("PIPELINE_JOB_HEARTBEAT", "30"))        # seconds between heartbeats
+STALE_AFTER = float(os.getenv("PIPELINE_JOB_STALE_SECONDS", "900"))          # no heartbeat for this long = dead run
+JOB_WORKERS = int(os.getenv("PIPELINE_JOB_WORKERS", "2"))                     # jobs executing at once in this process (on disjoint modules)
+
+ACTIVE_STATUSES = ("queued", "running")
+STAGE_ORDER = ("fetch", "parse", "persist", "analyse")
+
+
+def _plan_populate(db: Session, run: PipelineRun) -> Tuple[List[str], int]:
+    """
+    Every module in the run's scope, minus those already completed by earlier
+    unfinished runs of the same scope (the checkpoint), unless params["restart"].
+    """
+    codes = populate_scope(**(run.params or {}).get("scope", {}))
+    done = set() if (run.params or {}).get("restart") else _checkpoint(db, run)
+    remaining = [code for code in codes if code not in done]
+    if done:
+        logger.info(f"↩️  Resuming {run.kind} run {run.id}: {len(codes) - len(remaining)} of {len(codes)} modules already done")
+    return remaining, len(codes) - len(remaining)
+
+
+# Job kind -> planner returning (module codes to process, number skipped)
+PLANNERS: Dict[str, Callable[[Session, PipelineRun], Tuple[List[str], int]]] = {
+    "pipeline": lambda db, run: plan_pipeline_run(db),
+    "populate": _plan_populate,
+}
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="pipeline-job")
+_live: Dict[int, "JobProgress"] = {}  # runs executing in this process
+_claimed: Dict[str, int] = {}        # module code -> id of the run processing it in this process
+_live_lock = threading.Lock()
+
+
+def _naive_now():
+    # DateTime columns are stored without a timezone (SGT wall clock)
+    return now_sgt().replace(tzinfo=None)
+
+
+def _progress(total: int, done: int, elapsed: Optional[float]) -> Dict:
+    eta = None
+    if done and elapsed is not None and total > done:
+        eta = round(elapsed / done * (total - done), 1)
+    return {
+        "done": done,
+        "total": total,
+        "percent": round(done / total * 100, 1) if total else 0.0,
+        "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+        "eta_seconds": eta,
+    }
+
+
+class JobProgress:
+    """
+    Live progress of one run, fed by run_modules()' progress callback.
+
+    The callback runs on the pipeline's event loop, so it only records the event;
+    a writer thread copies snapshots to the pipeline_runs row at most every
+    FLUSH_INTERVAL while modules are progressing, and every HEARTBEAT_INTERVAL
+    otherwise (the heartbeat). stop() writes the final snapshot.
+    """
+
+    def __init__(self, run_id: int, total: int, skipped: int):
+        self.run_id = run_id
+        self.total = total
+        self.skipped = skipped
+        self.started = time.monotonic()
+        self._stage_of: Dict[str, str] = {}
+        self._entered_at: Dict[str, float] = {}
+        self._results: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def __call__(self, code: str, event: str):
+        now = time.monotonic()
+        with self._lock:
+            if event == "skipped":
+                self._stage_of.pop(code, None)
+                self._entered_at.pop(code, None)
+            elif event in ("success", "failed"):
+                self._results[code] = {
+                    "outcome": event,
+                    "stage": self._stage_of.pop(code, None),
+                    "seconds": round(now - self._entered_at.pop(code, now), 2),
+                }
+            else:
+                self._entered_at.setdefault(code, now)
+                self._stage_of[code] = event
+        self._changed.set()
+
+    def start(self):
+        self._writer = threading.Thread(target=self._write_loop, name=f"pipeline-job-{self.run_id}-progress", daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        """Stop the writer thread once it has written the final snapshot."""
+        self._stopped.set()
+        self._changed.set()
+        if self._writer is not None:
+            self._writer.join()
+        else:
+            self.flush()
+
+    def _write_loop(self):
+        while not self._stopped.is_set():
+            self._changed.wait(HEARTBEAT_INTERVAL)
+            self._changed.clear()
+            self.flush()
+            self._stopped.wait(FLUSH_INTERVAL)
+        self.flush()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            results = dict(self._results)
+            in_flight = Counter(self._stage_of.values())
+        failed = sum(1 for r in results.values() if r["outcome"] == "failed")
+        return {
+            "completed_modules": len(results) - failed,
+            "failed_modules": failed,
+            "current_stage": next((stage for stage in STAGE_ORDER if in_flight[stage]), None),
+            "in_flight": {stage: in_flight[stage] for stage in STAGE_ORDER},
+            "module_results": results,
+            "progress": _progress(self.total, len(results), time.monotonic() - self.started),
+        }
+
+    def flush(self):
+        with self._flush_lock:
+            snapshot = self.snapshot()
+            db = SessionLocal()
+            try:
+                db.query(PipelineRun).filter(PipelineRun.id == self.run_id).update({
+                    "completed_modules": snapshot["completed_modules"],
+                    "failed_modules": snapshot["failed_modules"],
+                    "current_stage": snapshot["current_stage"],
+                    "module_results": snapshot["module_results"],
+                    "heartbeat_at": _naive_now(),
+                })
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Could not record progress for run {self.run_id}: {e}")
+            finally:
+                db.close()
+
+
+# ============================================================================
+# RUN RECORDS
+# ============================================================================
+
+def scope_key(params: Optional[Dict]) -> str:
+    """Identifies the set of modules a run covers; runs with the same key resume each other."""
+    scope = (params or {}).get("scope")
+    if not scope:
+        return ""
+    return hashlib.sha1(json.dumps(scope, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _checkpoint(db: Session, run: PipelineRun) -> set:
+    """
+    Modules completed by the unfinished (failed/partial) runs of this scope since its
+    last fully successful run. Module results are flushed as each module finishes.
+    """
+    done = set()
+    previous = db.query(PipelineRun).filter(
+        PipelineRun.kind == run.kind,
+        PipelineRun.scope_key == run.scope_key,
+        PipelineRun.id < run.id,
+    ).order_by(PipelineRun.id.desc()).limit(100)
+    for earlier in previous:
+        if earlier.status == "succeeded":
+            break
+        done.update(code for code, result in (earlier.module_results or {}).items() if result["outcome"] == "success")
+    return done
+
+
+def _expire_stale_runs(db: Session, kind: str):
+    """Fail active runs whose process stopped heartbeating (crash, serverless timeout)."""
+    cutoff = _naive_now() - timedelta(seconds=STALE_AFTER)
+    stale = db.query(PipelineRun).filter(
+        PipelineRun.kind == kind,
+        PipelineRun.status.in_(ACTIVE_STATUSES),
+        func.coalesce(PipelineRun.heartbeat_at, PipelineRun.created_at) < cutoff,
+    ).all()
+    for run in stale:
+        logger.warning(f"⚠️  Marking pipeline run {run.id} as failed (no heartbeat since {run.heartbeat_at or run.created_at})")
+        run.status = "failed"
+        run.error = "stale: no heartbeat"
+        run.finished_at = _naive_now()
+    db.commit()
+
+
+def _create_run(kind: str, trigger: str, params: Optional[Dict] = None) -> Tuple[int, bool]:
+    """
+    Insert a queued run, or coalesce into the active one.
+
+    Returns:
+        (run id, created) - created is False if an active run absorbed this trigger
+    """
+    db = SessionLocal()
+    try:
+        _expire_stale_runs(db, kind)
+        for _ in range(3):
+            run = PipelineRun(kind=kind, status="queued", trigger=trigger, params=params,
+                              scope_key=scope_key(params), created_at=_naive_now())
+            db.add(run)
+            try:
+                db.commit()
+                return run.id, True
+            except IntegrityError:
+                # uq_pipeline_runs_active_scope: another run of this kind and scope is queued/running
+                db.rollback()
+
+            active_id = db.query(PipelineRun.id).filter(
+                PipelineRun.kind == kind,
+                PipelineRun.scope_key == scope_key(params),
+                PipelineRun.status.in_(ACTIVE_STATUSES),
+            ).scalar()
+            if active_id is not None:
+                db.query(PipelineRun).filter(PipelineRun.id == active_id).update(
+                    {"coalesced_triggers": func.coalesce(PipelineRun.coalesced_triggers, 0) + 1},
+                    synchronize_session=False,
+                )
+                db.commit()
+                logger.info(f"⏭️  {kind} run {active_id} already active, coalesced {trigger} trigger")
+                return active_id, False
+            # The active run finished in between; try inserting again
+        raise RuntimeError(f"Could not create or find an active {kind} run")
+    finally:
+        db.close()
+
+
+def _update_run(run_id: int, **values):
+    db = SessionLocal()
+    try:
+        db.query(PipelineRun).filter(PipelineRun.id == run_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _claim(run_id: int, codes: List[str]) -> List[str]:
+    """
+    Reserve modules for a run, so two runs executing in this process (e.g. the scheduled
+    pipeline and a populate) never scrape and write the same module at once.
+
+    Returns:
+        The codes now held by this run; codes held by another live run are left out.
+    """
+    with _live_lock:
+        return [code for code in codes if _claimed.setdefault(code, run_id) == run_id]
+
+
+def _release(run_id: int):
+    with _live_lock:
+        for code in [code for code, owner in _claimed.items() if owner == run_id]:
+            del _claimed[code]
+
+
+def _execute(run_id: int, kind: str):
+    """Plan and run one job to completion, recording the outcome. Never raises."""
+    progress = None
+    try:
+        db = SessionLocal()
+        try:
+            run = db.query(PipelineRun).filter(PipelineRun.id == run_id).one()
+            if run.status != "queued":
+                # e.g. _expire_stale_runs failed it while it waited for the executor
+                logger.warning(f"⏭️  {kind} run {run_id} is {run.status}, not starting it")
+                return
+            params = run.params or {}
+            planned, skipped = PLANNERS[kind](db, run)
+        finally:
+            db.close()
+
+        codes = _claim(run_id, planned)
+        if len(codes) < len(planned):
+            logger.info(f"⏭️  {kind} run {run_id}: {len(planned) - len(codes)} modules left to the run already processing them")
+            skipped += len(planned) - len(codes)
+
+        # Time budget (e.g. a serverless invocation limit): stop starting modules after it
+        deadline = time.monotonic() + params["max_seconds"] if params.get("max_seconds") else None
+
+        _update_run(run_id, status="running", started_at=_naive_now(), heartbeat_at=_naive_now(),
+                    total_modules=len(codes), skipped_modules=skipped)
+        logger.info(f"🚀 {kind} run {run_id} started: {len(codes)} modules ({skipped} skipped)")
+
+        progress = JobProgress(run_id, len(codes), skipped)
+        with _live_lock:
+            _live[run_id] = progress
+        progress.start()
+
+        outcomes = asyncio.run(run_modules(codes, progress=progress, deadline=deadline))
+
+        progress.stop()
+        finished = len(outcomes["success"]) + len(outcomes["failed"])
+        status = "succeeded" if finished >= len(codes) else "partial"
+        _update_run(run_id, status=status, current_stage=None, stage_stats=outcomes.get("stages"),
+                    finished_at=_naive_now())
+        logger.info(f"✅ {kind} run {run_id} {status}: {len(outcomes['success'])} ok, {len(outcomes['failed'])} failed, "
+                    f"{len(codes) - finished} not started")
+    except Exception as e:
+        logger.error(f"❌ {kind} run {run_id} failed: {e}")
+        if progress is not None:
+            progress.stop()
+        try:
+            _update_run(run_id, status="failed", current_stage=None, error=str(e), finished_at=_naive_now())
+        except Exception as update_error:
+            logger.error(f"Could not record failure of run {run_id}: {update_error}")
+    finally:
+        _release(run_id)
+        with _live_lock:
+            _live.pop(run_id, None)
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def run_to_dict(run: PipelineRun, include_modules: bool = True) -> Dict:
+    with _live_lock:
+        live = _live.get(run.id)
+
+    data = {
+        "id": run.id,
+        "kind": run.kind,
+        "status": run.status,
+        "trigger": run.trigger,
+        "params": run.params,
+        "coalesced_triggers": run.coalesced_triggers or 0,
+        "total_modules": run.total_modules or 0,
+        "completed_modules": run.completed_modules or 0,
+        "failed_modules": run.failed_modules or 0,
+        "skipped_modules": run.skipped_modules or 0,
+        "current_stage": run.current_stage,
+        "module_results": run.module_results or {},
+        "stage_stats": run.stage_stats,
+        "error": run.error,
+        "created_at": run.created_at,
+        "started_at": run.started_at,
+        "heartbeat_at": run.heartbeat_at,
+        "finished_at": run.finished_at,
+    }
+
+    if live is not None:
+        # Running in this process: fresher than the last flush
+        data.update(live.snapshot())
+    else:
+        end = run.finished_at or _naive_now()
+        elapsed = (end - run.started_at).total_seconds() if run.started_at else None
+        data["progress"] = _progress(data["total_modules"], data["completed_modules"] + data["failed_modules"], elapsed)
+
+    if run.status not in ACTIVE_STATUSES:
+        data["progress"]["eta_seconds"] = None
+    if not include_modules:
+        data.pop("module_results")
+    return data
+
+
+def get_job(run_id: int) -> Optional[Dict]:
+    db = SessionLocal()
+    try:
+        run = db.query(PipelineRun).filter(PipelineRun.id == run_id).first()
+        return run_to_dict(run) if run else None
+    finally:
+        db.close()
+
+
+def list_jobs(limit: int = 20) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        runs = db.query(PipelineRun).order_by(PipelineRun.id.desc()).limit(limit).all()
+        return [run_to_dict(run, include_modules=False) for run in runs]
+    finally:
+        db.close()
+
+
+def start_job(kind: str, trigger: str, params: Optional[Dict] = None) -> Tuple[Dict, bool]:
+    """
+    Start a run in the background, unless one of this kind and scope is already active.
+
+    Returns:
+        (run dict, started) - started is False when the trigger was coalesced into an active run
+    """
+    run_id, created = _create_run(kind, trigger, params)
+    if created:
+        _executor.submit(_execute, run_id, kind)
+    return get_job(run_id), created
+
+
+def run_job(kind: str, trigger: str, params: Optional[Dict] = None) -> Dict:
+    """Run a job in the calling thread (CLI / GitHub Actions). Returns the final run, or the active one."""
+    run_id, created = _create_run(kind, trigger, params)
+    if created:
+        _execute(run_id, kind)
+    return get_job(run_id)
@@ -0,0 +1,220 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import json
+import time
+
+
+class Field(NamedTuple):
+    """Expected top-level field of a streamed JSON object."""
+    types: Tuple[str, ...]            # JSON types allowed: "object", "array", "string", "number", "boolean", "null"
+    required: bool = True
+    minimum: Optional[float] = None   # for numbers
+    maximum: Optional[float] = None
+
+
+Schema = Dict[str, Field]
+
+
+class InvalidJson(ValueError):
+    """The model's output isn't (or can't become) an object matching the schema."""
+
+
+class IncompleteJson(InvalidJson):
+    """The output ended before the object did (e.g. cut off at max_output_tokens)."""
+
+
+_WHITESPACE = " \t\r\n"
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _json_type(first_char: str) -> str:
+    if first_char == "{":
+        return "object"
+    if first_char == "[":
+        return "array"
+    if first_char == '"':
+        return "string"
+    if first_char in "-0123456789":
+        return "number"
+    if first_char in "tf":
+        return "boolean"
+    if first_char == "n":
+        return "null"
+    raise InvalidJson(f"unexpected {first_char!r} where a value should start")
+
+
+class JsonStreamParser:
+    """
+    Parses a JSON object as it streams in, one chunk of model output at a time.
+
+    Each top-level field is decoded and checked against the schema the moment it
+    completes, and its type as soon as its first character arrives, so output that
+    goes wrong (prose instead of JSON, a score written as a word, a score out of
+    range) raises InvalidJson mid-stream instead of after the whole generation.
+    Fields that completed before a failure or a cut-off stay in `fields`.
+
+    Tolerates a ```json fence around the object, which Gemini sometimes adds.
+    """
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+        self.fields: Dict = {}
+        self.complete = False
+        self.parse_seconds = 0.0
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []   # open containers, outermost first
+        self._in_string = False
+        self._escaped = False
+        self._state = "start"         # start / key / colon / before_value / value / after_value / done
+        self._key_start = 0
+        self._key: Optional[str] = None
+        self._value_start = 0
+
+    def feed(self, chunk: str):
+        """Consume the next chunk of output. Raises InvalidJson as soon as the output can't be valid."""
+        started = time.perf_counter()
+        try:
+            self._buffer += chunk
+            self._scan()
+        finally:
+            self.parse_seconds += time.perf_counter() - started
+
+    def close(self) -> Dict:
+        """
+        Call once the stream has ended.
+
+        Returns:
+            The parsed object. Raises IncompleteJson if it never closed, InvalidJson if required fields are missing.
+        """
+        if not self.complete:
+            raise IncompleteJson(f"output ended mid-object after {len(self.fields)} complete fields")
+        missing = self.missing()
+        if missing:
+            raise InvalidJson(f"missing required fields: {', '.join(missing)}")
+        return self.fields
+
+    def missing(self, fields: Optional[Dict] = None) -> List[str]:
+        """Required fields not (yet) in `fields` (default: the ones parsed so far)."""
+        fields = self.fields if fields is None else fields
+        return [name for name, field in self.schema.items() if field.required and name not in fields]
+
+    # ------------------------------------------------------------------------
+
+    def _scan(self):
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+
+            if self._state == "done":
+                return  # anything after the object (a closing fence) is ignored
+            if self._state == "start":
+                if char == "`":
+                    # Skip a ```json fence line; wait for the rest of it if it hasn't arrived
+                    newline = buffer.find("\n", self._pos)
+                    if newline == -1:
+                        return
+                    self._pos = newline + 1
+                    continue
+                if char == "{":
+                    self._stack.append("{")
+                    self._state = "key"
+                elif char not in _WHITESPACE:
+                    raise InvalidJson(f"output starts with {buffer[self._pos:self._pos + 30]!r}, not a JSON object")
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._state == "key" and len(self._stack) == 1:
+                        self._key = json.loads(buffer[self._key_start:self._pos + 1])
+                        self._state = "colon"
+                self._pos += 1
+                continue
+
+            depth = len(self._stack)
+            if depth == 1 and self._state != "value":
+                self._top_level(char)
+                continue
+            if depth == 1 and char in ",}" + _WHITESPACE:
+                # A string or bare value (number, true, null) ends here
+                self._end_value(self._pos)
+                self._state = "after_value"
+                continue  # re-read the delimiter at the top level
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(char)
+            elif char in "]}":
+                if _CLOSERS[self._stack[-1]] != char:
+                    raise InvalidJson(f"mismatched {char!r} in {self._key!r}")
+                self._stack.pop()
+                if len(self._stack) == 1:
+                    # A nested value just closed; it ends the field
+                    self._pos += 1
+                    self._end_value(self._pos)
+                    self._state = "after_value"
+                    continue
+            self._pos += 1
+
+    def _top_level(self, char: str):
+        """One character directly inside the outer object, outside any string."""
+        if char in _WHITESPACE:
+            pass
+        elif self._state == "key":
+            if char == '"':
+                self._in_string = True
+                self._key_start = self._pos
+            elif char == "}" and not self.fields:
+                self._close()
+            else:
+                raise InvalidJson(f"expected a field name, got {char!r}")
+        elif self._state == "colon":
+            if char != ":":
+                raise InvalidJson(f"expected ':' after {self._key!r}, got {char!r}")
+            self._state = "before_value"
+        elif self._state == "before_value":
+            self._start_value(char)
+            return  # _start_value() consumed the character
+        elif self._state == "after_value":
+            if char == ",":
+                self._state = "key"
+            elif char == "}":
+                self._close()
+            else:
+                raise InvalidJson(f"expected ',' or '}}' after {self._key!r}, got {char!r}")
+        self._pos += 1
+
+    def _start_value(self, char: str):
+        kind = _json_type(char)
+        field = self.schema.get(self._key)
+        if field is not None and kind not in field.types:
+            raise InvalidJson(f"{self._key!r} should be {' or '.join(field.types)}, got {kind}")
+        self._value_start = self._pos
+        self._state = "value"
+        if char == '"':
+            self._in_string = True
+        elif char in _CLOSERS:
+            self._stack.append(char)
+        self._pos += 1
+
+    def _end_value(self, end: int):
+        raw = self._buffer[self._value_start:end]
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise InvalidJson(f"{self._key!r} isn't valid JSON ({raw[:30]!r}): {e}") from e
+        field = self.schema.get(self._key)
+        if field is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+            if (field.minimum is not None and value < field.minimum) or (field.maximum is not None and value > field.maximum):
+                raise InvalidJson(f"{self._key!r} is {value}, outside {field.minimum}-{field.maximum}")
+        self.fields[self._key] = value
+
+    def _close(self):
+        self._stack.pop()
+        self._state = "done"
+        self.complete = True
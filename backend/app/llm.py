@@ -0,0 +1,297 @@
+from collections import deque
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from google import genai
+from google.genai import errors, types
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import httpx
+import logging
+import math
+import os
+import random
+import threading
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Gemini quota and dispatch configuration (override via environment variables; match the project's quota tier)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")                      # e.g. a local mock (fixtures/gemini_mock_server.py)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))                      # requests per minute
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "250000"))                  # input tokens per minute
+MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))          # concurrent requests
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))              # retries on 429 / 5xx / timeouts
+BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1"))          # seconds; doubles per retry, full jitter
+BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "60"))
+CHARS_PER_TOKEN = 4  # estimate for budgeting before the response reports actual usage
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+WINDOW_SECONDS = 61  # the quota's minute, plus a margin for requests reaching the server later than we send them
+
+
+class MinuteWindow:
+    """
+    Admits at most `limit` units in any minute, the way the API counts its quota.
+    (A bucket refilled per minute lets up to twice the quota through in the minute
+    after an idle spell, which the API answers with 429s.)
+
+    After a 429 the window pauses and halves its limit, then recovers by 1% of the
+    configured limit per success, so a limit set above the real quota converges on it.
+    """
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.current = limit
+        self.used = 0.0
+        self.paused_until = 0.0
+        self._window = deque()  # (time, amount)
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            self.used -= self._window.popleft()[1]
+
+    async def acquire(self, amount: float) -> float:
+        """Wait until `amount` fits in the window, then take it. Returns seconds waited."""
+        waited = 0.0
+        async with self._lock:  # FIFO: a large request isn't starved by small ones
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                amount = min(amount, self.current)  # larger requests would never fit
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.used + amount <= self.current:
+                    self._window.append((now, amount))
+                    self.used += amount
+                    return waited
+                else:
+                    delay = self._window[0][0] + WINDOW_SECONDS - now
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) the difference between estimated and actual cost."""
+        self._window.append((time.monotonic(), amount))
+        self.used += amount
+
+    def back_off(self, seconds: float):
+        """The server said we're over quota."""
+        self.current = max(1.0, self.current / 2)
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def recover(self):
+        self.current = min(self.limit, self.current + self.limit / 100)
+
+
+class StreamInterrupted(Exception):
+    """A streamed response failed after part of it had been consumed, so it can't simply be retried."""
+
+
+def _retry_delay(error: errors.APIError) -> Optional[float]:
+    """The server's RetryInfo delay ("30s") from a 429, if given."""
+    try:
+        for detail in error.details.get("error", {}).get("details", []):
+            if detail.get("@type", "").endswith("RetryInfo"):
+                return float(detail["retryDelay"].rstrip("s"))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+
+class GeminiDispatcher:
+    """
+    Async Gemini client shared by every thread in the process: requests pass an RPM and
+    a TPM window and a bound on in-flight requests, and are retried with jittered
+    exponential backoff on 429 / 5xx / timeouts.
+
+    Runs its own event loop in a background thread; sync code calls generate() or
+    stream(), async code on any loop awaits agenerate().
+    """
+
+    def __init__(self, rpm: int = GEMINI_RPM, tpm: int = GEMINI_TPM, max_in_flight: int = MAX_IN_FLIGHT,
+                 max_retries: int = MAX_RETRIES, base_url: Optional[str] = GEMINI_BASE_URL):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_url = base_url
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock = threading.Lock()
+        self._stats = {"requests": 0, "succeeded": 0, "failed": 0, "retries": 0, "rate_limited": 0,
+                       "server_errors": 0, "timeouts": 0, "in_flight": 0, "peak_in_flight": 0,
+                       "prompt_tokens": 0, "output_tokens": 0, "throttled_seconds": 0.0,
+                       # Streams: time to first chunk and time spent generating, vs time in the consumer (parsing)
+                       "streams": 0, "aborted_streams": 0, "first_chunk_seconds": 0.0,
+                       "model_seconds": 0.0, "parse_seconds": 0.0}
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gemini-dispatcher", daemon=True).start()
+                http_options = types.HttpOptions(
+                    retry_options=types.HttpRetryOptions(attempts=1),  # retries are ours
+                    **({"base_url": self.base_url} if self.base_url else {}),
+                )
+                self._client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=http_options)
+                # Created here, used only on the dispatcher loop
+                self._requests = MinuteWindow(self.rpm)
+                self._tokens = MinuteWindow(self.tpm)
+                self._in_flight = asyncio.Semaphore(self.max_in_flight)
+                self._loop = loop
+            return self._loop
+
+    async def _stream(self, model: str, prompt: str, config: types.GenerateContentConfig,
+                      consume: Callable[[str], None]) -> Tuple[str, types.GenerateContentResponse, Dict]:
+        """
+        Feed each chunk of output text to consume() as it arrives. If consume() raises, the
+        stream is closed there, so the model stops generating, and the exception propagates.
+
+        Returns:
+            (full text, last chunk (finish reason, usage), {"first_chunk_seconds", "model_seconds", "parse_seconds"})
+        """
+        started = time.monotonic()
+        first_chunk, parse, text, last = None, 0.0, [], None
+        stream = await self._client.aio.models.generate_content_stream(model=model, contents=prompt, config=config)
+        try:
+            async for chunk in stream:
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - started
+                last = chunk
+                piece = chunk.text
+                if piece:
+                    text.append(piece)
+                    parse_started = time.perf_counter()
+                    try:
+                        consume(piece)
+                    finally:
+                        parse += time.perf_counter() - parse_started
+        except BaseException as e:
+            if text:
+                self._stats["aborted_streams"] += 1
+                if isinstance(e, (errors.APIError, httpx.HTTPError, asyncio.TimeoutError)):
+                    raise StreamInterrupted(f"stream failed after {len(text)} chunks: {e}") from e
+            raise
+        finally:
+            await stream.aclose()
+            timing = {"first_chunk_seconds": first_chunk or 0.0,
+                      "model_seconds": time.monotonic() - started - parse, "parse_seconds": parse}
+            if first_chunk is not None:  # not a request refused outright (429 etc.)
+                self._stats["streams"] += 1
+                for key, value in timing.items():
+                    self._stats[key] += value
+        return "".join(text), last, timing
+
+    async def _generate(self, model: str, prompt: str, config: Dict, timeout: float,
+                        consume: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict]:
+        estimate = math.ceil(len(prompt) / CHARS_PER_TOKEN)  # TPM quotas count input tokens
+        for attempt in range(self.max_retries + 1):
+            waited = await self._requests.acquire(1)
+            waited += await self._tokens.acquire(estimate)
+            self._stats["throttled_seconds"] += waited
+            self._stats["requests"] += 1
+
+            delay = None
+            async with self._in_flight:
+                self._stats["in_flight"] += 1
+                self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+                generation_config = types.GenerateContentConfig(
+                    **config, http_options=types.HttpOptions(timeout=int(timeout * 1000)),
+                )
+                try:
+                    if consume is None:
+                        response = await self._client.aio.models.generate_content(
+                            model=model, contents=prompt, config=generation_config,
+                        )
+                        text, timing = response.text, {}
+                    else:
+                        text, response, timing = await self._stream(model, prompt, generation_config, consume)
+                except errors.APIError as e:
+                    if e.code not in RETRYABLE_CODES or attempt == self.max_retries:
+                        self._stats["failed"] += 1
+                        raise
+                    if e.code == 429:
+                        self._stats["rate_limited"] += 1
+                        delay = _retry_delay(e) or BACKOFF_BASE
+                        self._requests.back_off(delay)
+                        self._tokens.back_off(delay)
+                    else:
+                        self._stats["server_errors"] += 1
+                    reason = f"{e.code} {e.status}"
+                except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+                    if attempt == self.max_retries:
+                        self._stats["failed"] += 1
+                        raise
+                    self._stats["timeouts"] += 1
+                    reason = "timeout"
+                else:
+                    usage = response.usage_metadata if response else None
+                    prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+                    output_tokens = (usage.candidates_token_count or 0) if usage else 0
+                    if prompt_tokens:
+                        self._tokens.adjust(prompt_tokens - estimate)
+                    self._requests.recover()
+                    self._tokens.recover()
+                    self._stats["prompt_tokens"] += prompt_tokens
+                    self._stats["output_tokens"] += output_tokens
+                    self._stats["succeeded"] += 1
+                    finish_reason = response.candidates[0].finish_reason if response and response.candidates else None
+                    return text, {"prompt_tokens": prompt_tokens, "output_tokens": output_tokens,
+                                  "attempts": attempt + 1, "finish_reason": getattr(finish_reason, "name", finish_reason),
+                                  **timing}
+                finally:
+                    self._stats["in_flight"] -= 1
+
+            # Full jitter, but never sooner than the server asked
+            backoff = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            backoff = max(backoff, delay or 0)
+            self._stats["retries"] += 1
+            logger.warning(f"Gemini request failed ({reason}), retry {attempt + 1}/{self.max_retries} in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+
+    def submit(self, model: str, prompt: str, config: Dict, timeout: float) -> Future:
+        return asyncio.run_coroutine_threadsafe(self._generate(model, prompt, config, timeout), self._start())
+
+    def generate(self, model: str, prompt: str, config: Dict, timeout: float) -> Tuple[str, Dict]:
+        """
+        Blocking call from any thread.
+
+        Returns:
+            (response text, {"prompt_tokens": n, "output_tokens": n, "attempts": n})
+        """
+        return self.submit(model, prompt, config, timeout).result()
+
+    def stream(self, model: str, prompt: str, config: Dict, timeout: float,
+               consume: Callable[[str], None]) -> Tuple[str, Dict]:
+        """
+        Like generate(), but streams the response, passing each chunk of text to consume()
+        on the dispatcher thread as it arrives. An exception from consume() aborts the
+        stream and is raised here. Failures before any output are retried as usual;
+        after some, StreamInterrupted is raised.
+
+        Returns:
+            (response text, {"prompt_tokens", "output_tokens", "attempts", "finish_reason",
+                             "first_chunk_seconds", "model_seconds", "parse_seconds"})
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._generate(model, prompt, config, timeout, consume), self._start()
+        ).result()
+
+    async def agenerate(self, model: str, prompt: str, config: Dict, timeout: float) -> Tuple[str, Dict]:
+        """Same as generate(), awaitable from any event loop."""
+        return await asyncio.wrap_future(self.submit(model, prompt, config, timeout))
+
+    def stats(self) -> Dict:
+        stats = {**self._stats, **{key: round(self._stats[key], 1) for key in (
+                     "throttled_seconds", "first_chunk_seconds", "model_seconds")},
+                 "parse_seconds": round(self._stats["parse_seconds"], 4),
+                 "rpm": self.rpm, "tpm": self.tpm, "max_in_flight": self.max_in_flight}
+        if self._loop is not None:
+            stats["effective_rpm"] = round(self._requests.current)
+        return stats
+
+
+dispatcher = GeminiDispatcher()
@@ -1,18 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from concurrent.futures import ThreadPoolExecutor
-from app.database import SessionLocal
+from app.database import get_db, pool_stats
+from app.async_database import get_async_db, async_pool_stats
 from app.models import Module, Comment
-from app.pipeline import main as run_pipeline, MODULE_CODES, process_module
-from typing import List
+from app.jobs import get_job, list_jobs, run_job, start_job
+from app.module_status import classify_modules
+from app.cache import cached_json_response, cached_json_response_async, response_cache
+from app.db_search import search_indexes, search_modules_indexed, search_reviews
+from app.search_index import (
+    MAX_RESULTS as MAX_SEARCH_RESULTS, SEARCH_BACKEND, ensure_search_index, normalise, search_index, search_index_stale,
+    search_payload, search_priority,
+)
+from typing import List, Optional
 import asyncio
 import os
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-executor = ThreadPoolExecutor(max_workers=1)
+# Opt in to serving the module read endpoints from the asyncpg engine (default: sync handlers on the threadpool)
+ASYNC_DB_READS = os.getenv("ASYNC_DB_READS", "false").lower() == "true"
 
 app = FastAPI(title="ratemyNUS API")
 
@@ -29,24 +39,17 @@ app.add_middleware(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @app.get("/")
 def root():
     return {"message": "ratemyNUS API"}
 
 
-@app.get("/api/modules")
-def get_all_modules():
+def get_all_modules(request: Request, db: Session = Depends(get_db)):
     """Get all modules (code, name, comment_count, units only)"""
-    db = next(get_db())
-    
+    return cached_json_response(request, "modules", lambda: _all_modules(db))
+
+
+def _all_modules(db: Session):
     modules = db.query(Module).all()
     
     return [
@@ -62,11 +65,12 @@ def get_all_modules():
     ]
 
 
-@app.get("/api/modules/{code}")
-def get_module(code: str):
+def get_module(code: str, request: Request, db: Session = Depends(get_db)):
     """Get one module with metadata (no individual comments fetched)"""
-    db = next(get_db())
-    
+    return cached_json_response(request, f"module:{code.upper()}", lambda: _module_detail(db, code))
+
+
+def _module_detail(db: Session, code: str):
     # Case-insensitive search
     module = db.query(Module).filter(Module.code.ilike(code)).first()
     
@@ -86,167 +90,203 @@ def get_module(code: str):
     }
 
 
-@app.get("/api/search")
-def search_modules(q: str):
+def search_modules(q: str, request: Request, db: Session = Depends(get_db)):
     """
     Search modules by code or name
     Prioritizes exact code matches, then partial code matches, then name matches.
     """
-    db = next(get_db())
-    
     if not q or len(q.strip()) == 0:
         return []
     
-    q_upper = q.upper().strip()
+    return cached_json_response(request, f"search:{q}", lambda: _search(db, q))
+
+
+def _search(db: Session, q: str):
+    if SEARCH_BACKEND == "database":
+        return _search_database(db, q)
+
+    # Rebuilt when the pipeline bumps the response cache generation
+    index = ensure_search_index(lambda: _search_payloads(db), response_cache.generation())
+    return index.search(q, limit=MAX_SEARCH_RESULTS)
+
+
+def _search_payloads(db: Session):
+    return [search_payload(m) for m in db.query(Module).all()]
+
+
+def _search_database(db: Session, q: str):
+    # Sorted and limited in SQL, with the ILIKE filters served by pg_trgm indexes
+    if search_indexes(db)["trigram"]:
+        return search_modules_indexed(db, q, limit=MAX_SEARCH_RESULTS)
     
-    # Search with prioritization:
-    # 1. Exact code match
-    # 2. Code starts with query
-    # 3. Code contains query
-    # 4. Name contains query
+    q_upper = normalise(q)
     
     modules = db.query(Module).filter(
         (Module.code.ilike(f"%{q}%")) | (Module.name.ilike(f"%{q}%"))
     ).all()
     
-    # Sort by relevance
-    def get_search_priority(module):
-        code = module.code.upper()
-        name = module.name.upper()
-        
-        # Exact match (highest priority)
-        if code == q_upper:
-            return 0
-        
-        # Starts with query (code)
-        if code.startswith(q_upper):
-            return 1
-        
-        # Contains query (code)
-        if q_upper in code:
-            return 2
-        
-        # Starts with query (name)
-        if name.startswith(q_upper):
-            return 3
-        
-        # Contains query (name)
-        if q_upper in name:
-            return 4
-        
-        # Shouldn't happen, but fallback
-        return 5
-    
     # Sort by priority, then alphabetically by code
-    sorted_modules = sorted(modules, key=lambda m: (get_search_priority(m), m.code))
+    sorted_modules = sorted(
+        modules, key=lambda m: (search_priority(normalise(m.code), normalise(m.name), q_upper), m.code)
+    )
     
     # Limit to top 10 results
-    return [
-        {
-            "code": m.code,
-            "name": m.name,
-            "comment_count": m.last_comment_count,
-            "units": m.units,
-            "semesters": m.semesters_available
-        }
-        for m in sorted_modules[:10]
-    ]
+    return [search_payload(m) for m in sorted_modules[:MAX_SEARCH_RESULTS]]
 
-@app.get("/api/run-pipeline")
-async def trigger_pipeline():
+# ============================================================================
+# ASYNC READ PATH
+# ============================================================================
+# Same queries as the sync handlers, run through AsyncSession.run_sync: the ORM code
+# is shared, while the DB I/O happens on the event loop instead of tying up a thread.
+
+async def get_all_modules_async(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get all modules (code, name, comment_count, units only)"""
+    return await cached_json_response_async(request, "modules", lambda: db.run_sync(_all_modules))
+
+
+async def get_module_async(code: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get one module with metadata (no individual comments fetched)"""
+    return await cached_json_response_async(request, f"module:{code.upper()}", lambda: db.run_sync(_module_detail, code))
+
+
+async def search_modules_async(q: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
-    Endpoint triggered by Vercel Cron.
-    Runs the scraping and analysis pipeline.
+    Search modules by code or name
+    Prioritizes exact code matches, then partial code matches, then name matches.
     """
-    # Run pipeline in background to avoid timeout
-    loop = asyncio.get_event_loop()
+    if not q or len(q.strip()) == 0:
+        return []
     
-    def run_in_thread():
-        try:
-            run_pipeline()
-            return {"status": "success", "message": "Pipeline completed"}
-        except Exception as e:
-            logger.error(f"Pipeline failed: {e}")
-            return {"status": "error", "message": str(e)}
+    return await cached_json_response_async(request, f"search:{q}", lambda: _search_async(db, q))
+
+
+async def _search_async(db: AsyncSession, q: str):
+    if SEARCH_BACKEND == "database":
+        return await db.run_sync(_search_database, q)
+
+    # Only the query runs on the loop: the generation may be a Redis round trip, and a
+    # rebuild (or a search waiting on one) would stall every other request
+    generation = await run_in_threadpool(response_cache.generation)
+    if search_index_stale(generation):
+        payloads = await db.run_sync(_search_payloads)
+        await run_in_threadpool(search_index.build, payloads, generation)
+    return await run_in_threadpool(search_index.search, q, MAX_SEARCH_RESULTS)
+
+
+READ_ROUTES = [
+    ("/api/modules", get_all_modules, get_all_modules_async),
+    ("/api/modules/{code}", get_module, get_module_async),
+    ("/api/search", search_modules, search_modules_async),
+]
+for path, sync_handler, async_handler in READ_ROUTES:
+    app.add_api_route(path, async_handler if ASYNC_DB_READS else sync_handler, methods=["GET"])
+
+
+@app.get("/api/search/reviews")
+def search_reviews_endpoint(q: str, request: Request, limit: int = 10, db: Session = Depends(get_db)):
+    """
+    Full-text search over reviews, e.g. q="bell curve".
+    Returns modules ranked by how well their reviews match, with highlighted snippets.
+    """
+    if not q or len(q.strip()) == 0:
+        return []
+    limit = max(1, min(limit, 50))
     
-    # Start pipeline but don't wait for completion (runs in background)
-    future = loop.run_in_executor(executor, run_in_thread)
+    return cached_json_response(request, f"review-search:{limit}:{q}", lambda: _search_reviews(db, q, limit))
+
+
+def _search_reviews(db: Session, q: str, limit: int):
+    if not search_indexes(db)["fulltext"]:
+        logger.warning("Full-text index missing, review search is scanning comments (run migrate_db.py)")
+    return search_reviews(db, q, limit=limit)
+
+@app.get("/api/run-pipeline")
+def trigger_pipeline(request: Request):
+    """
+    Endpoint triggered by Vercel Cron.
+    Starts the scraping and analysis pipeline as a background job; while a run is
+    active, further triggers are coalesced into it instead of queueing another run.
+    """
+    trigger = "cron" if "vercel-cron" in request.headers.get("user-agent", "") else "manual"
+    run, started = start_job("pipeline", trigger=trigger)
     
     return {
-        "status": "started",
-        "message": "Pipeline started in background. Check logs for progress.",
+        "status": "started" if started else "already_running",
+        "job_id": run["id"],
+        "message": f"Pipeline {'started' if started else 'already running'} in background. "
+                   f"Check /api/pipeline-jobs/{run['id']} for progress.",
         "scheduled_time": "Daily at 3:00 AM SGT"
     }
 
+
+@app.get("/api/pipeline-jobs")
+def pipeline_jobs(limit: int = 20):
+    """Recent pipeline runs, newest first."""
+    return list_jobs(limit=max(1, min(limit, 100)))
+
+
+@app.get("/api/pipeline-jobs/{job_id}")
+def pipeline_job(job_id: int):
+    """One pipeline run: status, modules done/total, current stage, ETA and per-module outcomes."""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/cache-stats")
+def cache_stats():
+    """Response cache hit ratio and lookup latency, for monitoring."""
+    return response_cache.stats()
+
+
+@app.get("/api/db-pool-stats")
+def db_pool_stats():
+    """Connection pool usage: checked-out/overflow connections and checkout wait times."""
+    return {"sync": pool_stats(), "async": async_pool_stats()}
+
+
 @app.get("/api/pipeline-status")
-def pipeline_status():
+def pipeline_status(db: Session = Depends(get_db)):
     """
     Check which modules need attention.
     For debugging and testing purposes.
     """
-    db = SessionLocal()
-    
-    all_modules = db.query(Module).all()
-    
-    status = {
-        "needs_sentiment": [],
-        "needs_update": [],
-        "up_to_date": []
-    }
-    
-    for module in all_modules:
-        comment_count = db.query(Comment).filter(Comment.module_id == module.id).count()
-        
-        info = {
-            "code": module.code,
-            "comments": comment_count,
-            "has_sentiment": bool(module.sentiment_data)
-        }
-        
-        if comment_count > 0 and not module.sentiment_data:
-            status["needs_sentiment"].append(info)
-        elif comment_count != module.last_comment_count:
-            status["needs_update"].append(info)
-        else:
-            status["up_to_date"].append(info)
-    
-    db.close()
-    return status
+    return classify_modules(db)
 
 @app.get("/api/populate-database")
-async def populate_database():
+async def populate_database(modules: Optional[str] = None, start: Optional[int] = None, end: Optional[int] = None,
+                            max_seconds: Optional[float] = None, restart: bool = False, wait: bool = False):
     """
-    Manually trigger database population.
-    Run this ONCE after creating tables.
-    Takes 5-10 minutes.
-    """
-    import logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
-    db = SessionLocal()
-    results = {"success": [], "failed": [], "total": len(MODULE_CODES)}
+    Manually trigger database population as a background job.
+    Run this ONCE after creating tables (the full catalogue takes 5-10 minutes).
     
-    for module_code in MODULE_CODES:
-        try:
-            logger.info(f"Processing {module_code}...")
-            success = process_module(module_code, db)
-            
-            if success:
-                results["success"].append(module_code)
-                logger.info(f"✅ {module_code} complete")
-            else:
-                results["failed"].append(module_code)
-                logger.error(f"❌ {module_code} failed")
-        except Exception as e:
-            logger.error(f"Error with {module_code}: {e}")
-            results["failed"].append(module_code)
+    - modules=CS1010,CS2030 or start=0&end=100 (slice of MODULE_CODES) limits the run to a chunk
+    - max_seconds stops starting new modules after that long (status "partial")
+    - re-running the same chunk resumes after the modules already completed, unless restart=true
+    - wait=true keeps the request open until the run ends (for serverless, where
+      background work stops with the response); max_seconds should fit the platform limit
+    """
+    scope = {}
+    if modules:
+        scope["modules"] = [code for code in modules.split(",") if code.strip()]
+    else:
+        if start is not None:
+            scope["start"] = start
+        if end is not None:
+            scope["end"] = end
+    params = {"scope": scope, "max_seconds": max_seconds, "restart": restart}
     
-    db.close()
+    if wait:
+        # Blocking DB/browser work stays off the event loop
+        run = await asyncio.to_thread(run_job, "populate", "manual", params)
+        status = "already_running" if run["status"] in ("queued", "running") else run["status"]
+    else:
+        run, started = await asyncio.to_thread(start_job, "populate", "manual", params)
+        status = "started" if started else "already_running"
     
     return {
-        "status": "complete",
-        "processed": len(results["success"]) + len(results["failed"]),
-        "successful": results["success"],
-        "failed": results["failed"]
-    }
\ No newline at end of file
+        "status": status,
+        "job_id": run["id"],
+        "message": f"Check /api/pipeline-jobs/{run['id']} for progress.",
+        "job": run,
+    }
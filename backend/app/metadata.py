@@ -0,0 +1,223 @@
+from pathlib import Path
+from sqlalchemy import Text, cast, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models import Module, now_sgt
+from app.cache import invalidate_response_cache
+from app.search_index import patch_search_index
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import httpx
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# NUSMods API configuration (override via environment variables)
+NUSMODS_API_URL = os.getenv("NUSMODS_API_URL", "https://api.nusmods.com/v2/2024-2025").rstrip("/")
+CACHE_DIR = Path(os.getenv("NUSMODS_CACHE_DIR", Path(tempfile.gettempdir()) / "ratemynus-nusmods"))
+HTTP_TIMEOUT = float(os.getenv("NUSMODS_HTTP_TIMEOUT", "30"))
+UPSERT_BATCH_SIZE = int(os.getenv("METADATA_UPSERT_BATCH_SIZE", "2000"))  # rows per upsert round trip
+
+MODULE_INFO_URL = f"{NUSMODS_API_URL}/moduleInfo.json"  # every module in one dump
+UPSERT_COLUMNS = ("name", "description", "units", "semesters_available", "url")
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+# ============================================================================
+# HTTP CLIENT
+# ============================================================================
+
+def get_http_client() -> httpx.Client:
+    """Process-wide client, so NUSMods requests reuse keep-alive connections. Thread-safe."""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={"User-Agent": "ratemyNUS"},
+                follow_redirects=True,
+            )
+        return _client
+
+
+def close_http_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _cache_paths(url: str) -> Tuple[Path, Path]:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+    return CACHE_DIR / f"{key}.json", CACHE_DIR / f"{key}.meta.json"
+
+
+def _write_atomic(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+
+
+def fetch_json_cached(url: str, client: Optional[httpx.Client] = None) -> Tuple[Optional[Any], bool]:
+    """
+    GET a JSON document with If-None-Match / If-Modified-Since against an on-disk copy.
+    Falls back to the cached copy if the request fails.
+
+    Returns:
+        (data, changed) - data is None if unavailable (404, or an error with nothing cached);
+        changed is False when the server answered 304 or the cached copy was used
+    """
+    client = client or get_http_client()
+    body_path, meta_path = _cache_paths(url)
+    cached = body_path.exists() and meta_path.exists()
+    meta = json.loads(meta_path.read_text()) if cached else {}
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = client.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            logger.info(f"Not modified since last run: {url}")
+            return json.loads(body_path.read_bytes()), False
+        if response.status_code == 404:
+            logger.warning(f"Not found: {url}")
+            return None, False
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        if cached:
+            logger.warning(f"Request for {url} failed ({e}), using cached copy from {meta.get('fetched_at')}")
+            return json.loads(body_path.read_bytes()), False
+        logger.error(f"Request for {url} failed: {e}")
+        return None, False
+
+    data = response.json()
+    try:
+        _write_atomic(body_path, response.content)
+        _write_atomic(meta_path, json.dumps({
+            "url": url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched_at": now_sgt().isoformat(),
+        }).encode("utf-8"))
+    except OSError as e:
+        logger.warning(f"Could not cache {url}: {e}")
+    return data, True
+
+
+# ============================================================================
+# PARSING / UPSERT
+# ============================================================================
+
+def parse_module_info(data: Dict, module_code: Optional[str] = None) -> Dict:
+    """Convert a NUSMods module (single-module endpoint or moduleInfo.json entry) to our metadata dict."""
+    module_code = module_code or data.get("moduleCode")
+    semesters = []
+    for s in data.get("semesterData", []):
+        if (s.get("semester") == 3):
+            semesters.append("ST1")
+        elif (s.get("semester") == 4):
+            semesters.append("ST2")
+        else:
+            semesters.append(str(s.get("semester", "Unknown")))
+    try:
+        units = int(float(data.get("moduleCredit", 0)))
+    except (TypeError, ValueError):
+        units = 0
+    return {
+        "code": data.get("moduleCode"),
+        "name": data.get("title"),
+        "description": data.get("description", ""),
+        "units": units,
+        "semesters_available": semesters,
+        "url": f"https://nusmods.com/courses/{module_code}"
+    }
+
+
+def _batches(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def upsert_modules(db: Session, metadata_list: List[Dict]) -> List[Module]:
+    """
+    Insert or update many modules with batched INSERT ... ON CONFLICT statements.
+    Rows whose metadata is unchanged are left alone (no write, no updated_at bump).
+    Returns the inserted or changed modules.
+    """
+    if not metadata_list:
+        return []
+
+    now = now_sgt()
+    stmt = insert(Module)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["code"],
+        set_={**{column: excluded[column] for column in UPSERT_COLUMNS}, "updated_at": now},
+        where=or_(
+            Module.name.is_distinct_from(excluded.name),
+            Module.description.is_distinct_from(excluded.description),
+            Module.units.is_distinct_from(excluded.units),
+            Module.url.is_distinct_from(excluded.url),
+            # json has no equality operator; compare the serialised form
+            cast(Module.semesters_available, Text).is_distinct_from(cast(excluded.semesters_available, Text)),
+        ),
+    ).returning(Module)
+
+    changed: List[Module] = []
+    for batch in _batches(metadata_list, UPSERT_BATCH_SIZE):
+        rows = [{"code": m["code"], **{column: m[column] for column in UPSERT_COLUMNS},
+                 "created_at": now, "updated_at": now} for m in batch]
+        # Compiled once; SQLAlchemy sends each batch as multi-row INSERT ... VALUES pages
+        changed.extend(db.scalars(stmt, rows).all())
+    db.commit()
+
+    if changed:
+        invalidate_response_cache()
+        for module in changed:
+            patch_search_index(module)
+    return changed
+
+
+def ingest_metadata(db: Session, module_codes: Optional[Iterable[str]] = None,
+                    client: Optional[httpx.Client] = None) -> Dict:
+    """
+    Pull moduleInfo.json once (conditional request) and batch-upsert the modules in
+    `module_codes` (all modules in the dump if None).
+
+    Returns:
+        {"available": bool, "dump_changed": bool, "found": {codes}, "missing": [codes], "changed": [codes]}
+    """
+    data, dump_changed = fetch_json_cached(MODULE_INFO_URL, client)
+    wanted: Optional[Set[str]] = set(module_codes) if module_codes is not None else None
+    if data is None:
+        return {"available": False, "dump_changed": False, "found": set(), "missing": sorted(wanted or []), "changed": []}
+
+    metadata_list = [
+        parse_module_info(entry) for entry in data
+        if entry.get("moduleCode") and (wanted is None or entry["moduleCode"] in wanted)
+    ]
+    changed = upsert_modules(db, metadata_list)
+    found = {m["code"] for m in metadata_list}
+
+    logger.info(f"Ingested metadata for {len(found)} modules ({len(changed)} new or changed, "
+                f"dump {'updated' if dump_changed else 'not modified'})")
+    return {
+        "available": True,
+        "dump_changed": dump_changed,
+        "found": found,
+        "missing": sorted((wanted or set()) - found),
+        "changed": [m.code for m in changed],
+    }
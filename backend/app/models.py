@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Boolean, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime, timezone, timedelta
@@ -20,11 +20,18 @@ class Module(Base):
     semesters_available = Column(JSON)  # ["Sem 1", "Sem 2", "ST1", "ST2"]
     units = Column(Integer)
     last_comment_count = Column(Integer, default=0)
+    
+    # Resolved Disqus embed URL, cached so repeat runs can skip the NUSMods page render
+    disqus_url = Column(String(1000))
+    disqus_url_validated_at = Column(DateTime)
     has_sufficient_reviews = Column(Boolean)
     
     # Aggregated sentiment analysis results
     sentiment_data = Column(JSON)  # {workload: 4.2, difficulty: 3.8, summary: "...", advice: "..."}
-    last_analyzed = Column(DateTime)
+    last_analyzed = Column(DateTime)            # start of the last analysis; later comments are "new"
+    full_analysis_at = Column(DateTime)         # last analysis from all comments (not a delta update)
+    analyzed_comment_count = Column(Integer)    # comments reflected in sentiment_data
+    full_analysis_comment_count = Column(Integer)  # comments at the last full analysis
     
     # Timestamps
     created_at = Column(DateTime, default=now_sgt)
@@ -36,13 +43,89 @@ class Module(Base):
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        UniqueConstraint("module_id", "external_id", name="uq_comments_module_external_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     module_id = Column(Integer, ForeignKey("modules.id"), nullable=False)
+    # Stable identity across scrapes: Disqus post id, or a content hash if the post id is unknown
+    external_id = Column(String(64))
     text = Column(Text, nullable=False)
     posted_date = Column(DateTime)
     upvotes = Column(Integer, default=0)
     scraped_at = Column(DateTime, default=now_sgt)
     
     # Relationship
-    module = relationship("Module", back_populates="comments")
\ No newline at end of file
+    module = relationship("Module", back_populates="comments")
+
+
+class SentimentCache(Base):
+    __tablename__ = "sentiment_cache"
+    
+    # sha256 of (comments, module, prompt version, model, generation config)
+    key = Column(String(64), primary_key=True)
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(String(20), nullable=False)
+    result = Column(JSON, nullable=False)  # Parsed sentiment_data, ready to store on the module
+    
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=now_sgt)
+    last_hit_at = Column(DateTime, default=now_sgt, index=True)
+
+
+class PipelineRun(Base):
+    __tablename__ = "pipeline_runs"
+    __table_args__ = (
+        # At most one queued/running run per kind and scope; a second trigger is coalesced into it
+        Index("uq_pipeline_runs_active_scope", "kind", "scope_key", unique=True,
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)        # "pipeline", "populate"
+    status = Column(String(20), nullable=False)      # queued, running, succeeded, partial (time budget hit), failed
+    params = Column(JSON)                            # {"scope": {...}, "max_seconds": ..., "restart": ...}
+    scope_key = Column(String(64), nullable=False, default="")  # hash of params["scope"]; runs with equal keys share checkpoints
+    trigger = Column(String(50))                     # cron, manual, cli
+    coalesced_triggers = Column(Integer, default=0)  # triggers received while this run was active
+    
+    # Progress (flushed every few seconds while running)
+    total_modules = Column(Integer, default=0)
+    completed_modules = Column(Integer, default=0)
+    failed_modules = Column(Integer, default=0)
+    skipped_modules = Column(Integer, default=0)
+    current_stage = Column(String(50))
+    module_results = Column(JSON)  # {code: {"outcome": "success"|"failed", "stage": ..., "seconds": ...}}
+    stage_stats = Column(JSON)     # run_modules()' per-stage report
+    error = Column(Text)
+    
+    created_at = Column(DateTime, default=now_sgt)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class ModuleWork(Base):
+    __tablename__ = "module_work"
+    __table_args__ = (
+        # Claim order for pending/expired work (see app/work_queue.py)
+        Index("ix_module_work_claim", "status", text("priority DESC"), "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(20), unique=True, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, leased, done, failed
+    priority = Column(Integer, nullable=False, default=0)            # higher is claimed first
+    attempts = Column(Integer, nullable=False, default=0)            # claims so far, including reclaimed leases
+    
+    # Lease: the module belongs to lease_owner until lease_expires_at (extended by heartbeats).
+    # Stored with a timezone and compared against the database clock, so workers on
+    # machines with skewed clocks agree on expiry.
+    lease_owner = Column(String(100))
+    lease_expires_at = Column(DateTime(timezone=True))
+    
+    outcome_stage = Column(String(50))  # stage the last attempt ended in
+    last_error = Column(Text)
+    enqueued_at = Column(DateTime(timezone=True), server_default=text("now()"))
+    finished_at = Column(DateTime(timezone=True))
@@ -0,0 +1,73 @@
+from typing import Dict, List
+from sqlalchemy import Text, and_, cast, func
+from sqlalchemy.orm import Session
+from app.models import Module, Comment
+
+
+def has_sentiment_clause():
+    """
+    SQL for "has a Gemini analysis": the same truthiness as `bool(module.sentiment_data)`,
+    without loading the JSON, except that provisional local scores don't count.
+    """
+    data = func.coalesce(cast(Module.sentiment_data, Text), "null")
+    return and_(
+        data != "null",
+        data != "{}",  # not NOT IN: its expanding parameter can't be used in executemany updates
+        func.coalesce(Module.sentiment_data["provisional"].as_boolean(), False).is_(False),
+    )
+
+
+def classify_modules(db: Session) -> Dict[str, List[Dict]]:
+    """
+    Split all modules into the pipeline's priority buckets with a single query
+    (comment counts come from one GROUP BY, not a COUNT per module).
+    
+    Returns:
+        {"needs_sentiment": [...], "needs_update": [...], "up_to_date": [...]}
+        where each entry is {"code": ..., "comments": n, "has_sentiment": bool}
+    """
+    comment_counts = (
+        db.query(Comment.module_id, func.count(Comment.id).label("comment_count"))
+        .group_by(Comment.module_id)
+        .subquery()
+    )
+    has_sentiment = has_sentiment_clause()
+    
+    rows = (
+        db.query(
+            Module.code,
+            Module.last_comment_count,
+            func.coalesce(comment_counts.c.comment_count, 0),
+            has_sentiment,
+        )
+        .outerjoin(comment_counts, comment_counts.c.module_id == Module.id)
+        .order_by(Module.id)
+        .all()
+    )
+    
+    status = {
+        "needs_sentiment": [],  # Has comments but no sentiment data (or only provisional scores)
+        "needs_update": [],     # Comment count changed
+        "up_to_date": []        # No change needed
+    }
+    
+    for code, last_comment_count, comment_count, sentiment in rows:
+        info = {
+            "code": code,
+            "comments": comment_count,
+            "has_sentiment": bool(sentiment)
+        }
+        
+        # Priority 1: Has comments but missing sentiment data
+        if comment_count > 0 and not sentiment:
+            status["needs_sentiment"].append(info)
+        # Priority 2: Comment count changed
+        elif comment_count != last_comment_count:
+            status["needs_update"].append(info)
+        elif not sentiment and comment_count == 0:
+            status["needs_update"].append(info) # scrape comments
+        # Priority 3: Up to date
+        else:
+            status["up_to_date"].append(info)
+    
+    return status
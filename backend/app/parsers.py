@@ -0,0 +1,186 @@
+from bs4 import BeautifulSoup
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import os
+
+try:
+    import lxml.html
+except ImportError:  # Optional dependency: fall back to BeautifulSoup
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+# "lxml" (fast, default when installed) or "bs4" (reference implementation)
+HTML_PARSER = os.getenv("HTML_PARSER", "lxml")
+DISQUS_DATE_FORMAT = "%A, %B %d, %Y %I:%M %p"
+
+
+def _parse_date(date_string: Optional[str]) -> Optional[datetime]:
+    if not date_string:
+        return None
+    try:
+        return datetime.strptime(date_string, DISQUS_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def _post_id(element_id: Optional[str]) -> Optional[str]:
+    # <li id="post-123456">
+    if element_id and element_id.startswith("post-"):
+        return element_id[len("post-"):]
+    return None
+
+
+class BeautifulSoupParser:
+    """Reference implementation (html.parser). Slow, but the behaviour other parsers must match."""
+
+    name = "bs4"
+
+    def extract_disqus_url(self, html: str) -> Optional[str]:
+        soup = BeautifulSoup(html, "html.parser")
+        iframe = soup.find("div", id="disqus_thread")
+        if iframe and iframe.find("iframe"):
+            return iframe.find("iframe")["src"]
+        return None
+
+    def parse_comments(self, html: str) -> List[Dict[str, any]]:
+        soup = BeautifulSoup(html, "html.parser")
+        comments = []
+        post_list = soup.find("ul", id="post-list")
+        if not post_list:
+            logger.warning("Could not find post-list in Disqus HTML")
+            return comments
+
+        for post in post_list.find_all("li", class_="post"):
+            comment = {}
+
+            # Extract Disqus post id
+            comment["post_id"] = _post_id(post.get("id"))
+
+            # Extract text
+            text_element = post.find("div", class_="post-message")
+            if text_element:
+                comment["text"] = text_element.get_text(strip=True)
+            else:
+                comment["text"] = ""
+
+            # Extract date
+            date_element = post.find("a", class_="time-ago")
+            comment["posted_date"] = _parse_date(date_element.get("title") if date_element else None)
+
+            # Extract author
+            author_span = post.find("span", class_="author")
+            author_element = author_span.find("a") if author_span else None
+            if author_element:
+                comment["author"] = author_element.get_text(strip=True)
+            else:
+                comment["author"] = "Anonymous" # Disqus allows anonymous comments
+
+            # Extract upvotes
+            upvote_element = post.find("div", class_="post-votes")
+            if upvote_element:
+                try:
+                    comment["upvotes"] = int(upvote_element.find_all("span")[1].get_text(strip=True) or 0)
+                except (IndexError, ValueError, AttributeError):
+                    comment["upvotes"] = 0
+            else:
+                comment["upvotes"] = 0
+
+            comments.append(comment)
+
+        return comments
+
+
+class LxmlParser:
+    """
+    lxml-based parser producing the same output as BeautifulSoupParser.
+    Each li.post subtree is walked once, picking up every field on the way.
+    """
+
+    name = "lxml"
+
+    @staticmethod
+    def _classes(element) -> List[str]:
+        return (element.get("class") or "").split()
+
+    @staticmethod
+    def _text(element) -> str:
+        # Same as BeautifulSoup's get_text(strip=True): stripped text nodes, no separator
+        return "".join(part.strip() for part in element.xpath(".//text()"))
+
+    def extract_disqus_url(self, html: str) -> Optional[str]:
+        if not html:
+            return None
+        root = lxml.html.fromstring(html)
+        for thread in root.iter("div"):
+            if thread.get("id") == "disqus_thread":
+                for iframe in thread.iter("iframe"):
+                    return iframe.get("src")
+                return None
+        return None
+
+    def parse_comments(self, html: str) -> List[Dict[str, any]]:
+        comments = []
+        root = lxml.html.fromstring(html) if html else None
+        post_list = None
+        if root is not None:
+            post_list = next((ul for ul in root.iter("ul") if ul.get("id") == "post-list"), None)
+        if post_list is None:
+            logger.warning("Could not find post-list in Disqus HTML")
+            return comments
+
+        for post in post_list.iter("li"):
+            if "post" not in self._classes(post):
+                continue
+
+            text = date = author_span = votes = None
+            # First match in document order for each field, like BeautifulSoup's find()
+            for element in post.iterdescendants():
+                tag = element.tag
+                if not isinstance(tag, str):
+                    continue  # Comments / processing instructions
+                classes = self._classes(element)
+                if text is None and tag == "div" and "post-message" in classes:
+                    text = element
+                elif date is None and tag == "a" and "time-ago" in classes:
+                    date = element
+                elif author_span is None and tag == "span" and "author" in classes:
+                    author_span = element
+                elif votes is None and tag == "div" and "post-votes" in classes:
+                    votes = element
+
+            author_link = next(author_span.iter("a"), None) if author_span is not None else None
+
+            upvotes = 0
+            if votes is not None:
+                spans = list(votes.iter("span"))
+                try:
+                    upvotes = int(self._text(spans[1]) or 0)
+                except (IndexError, ValueError):
+                    upvotes = 0
+
+            comments.append({
+                "post_id": _post_id(post.get("id")),
+                "text": self._text(text) if text is not None else "",
+                "posted_date": _parse_date(date.get("title") if date is not None else None),
+                "author": self._text(author_link) if author_link is not None else "Anonymous",
+                "upvotes": upvotes,
+            })
+
+        return comments
+
+
+_parsers = {}
+
+
+def get_parser(name: Optional[str] = None):
+    """Return the configured HTML parser (HTML_PARSER), falling back to BeautifulSoup if lxml is missing."""
+    name = name or HTML_PARSER
+    if name == "lxml" and lxml is None:
+        logger.warning("lxml not installed, using BeautifulSoup parser")
+        name = "bs4"
+
+    if name not in _parsers:
+        _parsers[name] = LxmlParser() if name == "lxml" else BeautifulSoupParser()
+    return _parsers[name]
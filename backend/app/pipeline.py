@@ -1,20 +1,24 @@
-import httpx
+import hashlib
 import sys
 from pathlib import Path
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from app.database import SessionLocal
-from app.models import Module, Comment
-from app.scraper import scrape_module_reviews, get_comment_count
-from app.sentiment import analyze_module_sentiment
-from typing import Dict, List, Optional
+from app.models import Module, Comment, now_sgt
+from app.scraper import scrape_module, ScrapeResult
+from app.bulk import write_comment_rows
+from app.module_status import classify_modules
+from app.cache import invalidate_response_cache
+from app.search_index import patch_search_index
+from app.sentiment import analyze_module_sentiment, is_provisional
+from app.metadata import NUSMODS_API_URL, get_http_client, parse_module_info
+from typing import Dict, List, Optional, Tuple
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-NUSMODS_API_BASE = "https://api.nusmods.com/v2/2024-2025/modules"
+NUSMODS_API_BASE = f"{NUSMODS_API_URL}/modules"
 MODULE_CODES = [
     "GEA1000", "CS1010", "CS1101S", "CS2030S", "CS2040S", 
     "CS2100", "MA1521", "MA1522", "ST2334", "IS1108", 
@@ -27,11 +31,14 @@ MODULE_CODES = [
 # ============================================================================
 
 def fetch_module_metadata(module_code: str) -> Optional[Dict]:
-    """Fetch module metadata from NUSMods API."""
+    """
+    Fetch one module's metadata from the NUSMods API.
+    Runs normally use the bulk dump (app.metadata.ingest_metadata); this covers modules missing from it.
+    """
     url = f"{NUSMODS_API_BASE}/{module_code}.json"
     
     try:
-        response = httpx.get(url, timeout=10.0)
+        response = get_http_client().get(url, timeout=10.0)
         
         if response.status_code == 404:
             logger.warning(f"Module {module_code} not found in API")
@@ -41,23 +48,7 @@ def fetch_module_metadata(module_code: str) -> Optional[Dict]:
             logger.error(f"API returned {response.status_code} for {module_code}")
             return None
         
-        data = response.json()
-        semesters = []
-        for s in data.get("semesterData", []):
-            if (s.get("semester") == 3):
-                semesters.append("ST1")
-            elif (s.get("semester") == 4):
-                semesters.append("ST2")
-            else:
-                semesters.append(str(s.get("semester", "Unknown")))
-        metadata = {
-            "code": data.get("moduleCode"),
-            "name": data.get("title"),
-            "description": data.get("description", ""),
-            "units": int(data.get("moduleCredit", 0)),
-            "semesters_available": semesters,
-            "url": f"https://nusmods.com/courses/{module_code}"
-        }
+        metadata = parse_module_info(response.json(), module_code)
         
         logger.info(f"Fetched metadata for {module_code}")
         return metadata
@@ -93,39 +84,81 @@ def upsert_module(db: Session, metadata: Dict) -> Module:
     
     result = db.execute(stmt)
     db.commit()
+    invalidate_response_cache()
     
     module = result.scalar_one()
+    patch_search_index(module)
     logger.info(f"Upserted module {metadata['code']}")
     return module
 
 
-def replace_module_comments(db: Session, module_id: int, comments: List[Dict]):
+def comment_identity(comment: Dict) -> str:
+    """Disqus post id if known, otherwise a hash of the text and posting date."""
+    if comment.get("post_id"):
+        return str(comment["post_id"])
+    posted = comment["posted_date"].isoformat() if comment.get("posted_date") else ""
+    digest = hashlib.sha1(f"{comment['text']}\x00{posted}".encode("utf-8")).hexdigest()
+    return f"h:{digest}"
+
+
+def sync_module_comments(db: Session, module_id: int, comments: List[Dict]) -> Dict[str, int]:
     """
-    Delete old comments and insert new ones for a module.
+    Sync a module's stored comments with a fresh scrape:
+    insert new posts, update posts whose upvotes/text changed, delete posts that vanished.
+    Unchanged rows are not touched.
+    
+    Returns:
+        {"inserted": n, "updated": n, "deleted": n}
     """
-    # Delete old
-    deleted = db.query(Comment).filter(Comment.module_id == module_id).delete()
-    logger.info(f"Deleted {deleted} old comments for module_id {module_id}")
+    scraped = {}
+    for c in comments:
+        scraped[comment_identity(c)] = c
     
-    # Insert new
-    if comments:
-        comment_objects = [
-            Comment(
-                module_id=module_id,
-                text=c["text"],
-                posted_date=c["posted_date"],
-                upvotes=c.get("upvotes", 0)
-            )
-            for c in comments
-        ]
-        db.add_all(comment_objects)
+    existing = {
+        external_id: (upvotes, text)
+        for external_id, upvotes, text in db.query(Comment.external_id, Comment.upvotes, Comment.text)
+        .filter(Comment.module_id == module_id)
+    }
+    
+    rows = []
+    inserted = updated = 0
+    scraped_at = now_sgt()
+    for external_id, c in scraped.items():
+        upvotes = int(c.get("upvotes") or 0)
+        if external_id not in existing:
+            inserted += 1
+        elif existing[external_id] != (upvotes, c["text"]):
+            updated += 1
+        else:
+            continue
+        rows.append({
+            "module_id": module_id,
+            "external_id": external_id,
+            "text": c["text"],
+            "posted_date": c["posted_date"],
+            "upvotes": upvotes,
+            "scraped_at": scraped_at,
+        })
+    
+    # Upsert new/changed (batched INSERTs, or COPY for very large batches)
+    write_comment_rows(db, rows)
+    
+    # Delete vanished (also clears legacy rows scraped before external_id existed)
+    deleted = db.query(Comment).filter(
+        Comment.module_id == module_id,
+        (Comment.external_id.is_(None)) | (Comment.external_id.notin_(list(scraped.keys())))
+    ).delete(synchronize_session=False)
     
     # Set sufficient review flag
     module = db.query(Module).filter(Module.id == module_id).first()
     if module:
-        module.has_sufficient_reviews = len(comments) > 3
-        db.commit()
-        logger.info(f"Inserted {len(comments)} new comments")
+        module.has_sufficient_reviews = len(scraped) > 3
+    db.commit()
+    invalidate_response_cache()
+    
+    counts = {"inserted": inserted, "updated": updated, "deleted": deleted}
+    logger.info(f"Synced comments for module_id {module_id}: {counts}")
+    return counts
 
 
 def update_module_comment_count(db: Session, module_id: int, count: int):
@@ -134,12 +167,104 @@ def update_module_comment_count(db: Session, module_id: int, count: int):
     if module:
         module.last_comment_count = count
         db.commit()
+        invalidate_response_cache()
+        patch_search_index(module)
+
+
+def update_module_disqus_url(db: Session, module_id: int, disqus_url: str):
+    """Cache the resolved Disqus URL for a module and mark it as freshly validated."""
+    module = db.query(Module).filter(Module.id == module_id).first()
+    if module:
+        module.disqus_url = disqus_url
+        module.disqus_url_validated_at = now_sgt()
+        db.commit()
 
 
 # ============================================================================
 # ORCHESTRATION
 # ============================================================================
 
+def prepare_module(db: Session, module_code: str, metadata_ingested: bool = False) -> Optional[Dict]:
+    """
+    Steps 1-2: fetch metadata and upsert the module (already done in bulk if metadata_ingested).
+    Returns a plain snapshot of what the scrape step needs (safe to use after the session closes),
+    or None if metadata couldn't be fetched.
+    """
+    module = db.query(Module).filter(Module.code == module_code).first() if metadata_ingested else None
+    if module is None:
+        metadata = fetch_module_metadata(module_code)
+        if not metadata:
+            logger.error(f"Failed to fetch metadata for {module_code}")
+            return None
+        module = upsert_module(db, metadata)
+    
+    return {
+        "id": module.id,
+        "code": module.code,
+        "last_comment_count": module.last_comment_count,
+        "disqus_url": module.disqus_url,
+        # Only skip pagination when there is an analysis to keep (provisional local scores
+        # aren't one: the module must reach analysis again even if its comments are unchanged)
+        "known_count": module.last_comment_count if module.sentiment_data and not is_provisional(module.sentiment_data) else None,
+    }
+
+
+def persist_scrape_result(db: Session, module_code: str, snapshot: Dict, result: ScrapeResult) -> Tuple[bool, bool]:
+    """
+    Steps 4-5: persist a ScrapeResult (comments must already be parsed).
+    Returns (success, needs_analysis).
+    """
+    module_id = snapshot["id"]
+    if result.disqus_url:
+        update_module_disqus_url(db, module_id, result.disqus_url)
+    
+    if result.error == "not_found":
+        logger.warning(f"{module_code} reviews not found")
+        update_module_comment_count(db, module_id, 0)
+        return True, False
+    
+    if result.error == "scrape_failed":
+        logger.error(f"Failed to scrape {module_code}")
+        return False, False
+    
+    if result.unchanged:
+        logger.info(f"✅ {module_code} unchanged ({result.count} comments), skipping")
+        return True, False
+
+    # Step 4: Comments were scraped in the same visit (only if changed)
+    logger.info(f"📊 {module_code} has changed: {snapshot['last_comment_count']} → {result.count} comments")
+    
+    if result.error == "no_reviews":
+        logger.info(f"{module_code} has no reviews")
+        update_module_comment_count(db, module_id, 0)
+        return True, False
+    
+    comments = result.comments
+    
+    # Step 5: Sync comments (only new/changed/vanished rows are written)
+    sync_module_comments(db, module_id, comments)
+    update_module_comment_count(db, module_id, len(comments))
+    return True, True
+
+
+def store_scrape_result(db: Session, module_code: str, snapshot: Dict, result: ScrapeResult) -> bool:
+    """
+    Steps 4-6: persist a ScrapeResult and, if comments changed, run sentiment analysis.
+    Returns True if success, False if failed.
+    """
+    success, needs_analysis = persist_scrape_result(db, module_code, snapshot, result)
+    if not needs_analysis:
+        return success
+
+    # Step 6: Run sentiment analysis
+    logger.info(f"Running sentiment analysis for {module_code}...")
+    if not analyze_module_sentiment(db, snapshot["id"]):
+        return False
+    
+    logger.info(f"✅ {module_code} complete ({len(result.comments)} comments)")
+    return True
+
+
 def process_module(module_code: str, db: Session) -> bool:
     """
     Complete pipeline for one module.
@@ -149,52 +274,16 @@ def process_module(module_code: str, db: Session) -> bool:
     logger.info(f"\n{'='*60}\nProcessing {module_code}\n{'='*60}")
     
     try:
-        # Step 1: Fetch metadata
-        metadata = fetch_module_metadata(module_code)
-        if not metadata:
-            logger.error(f"Failed to fetch metadata for {module_code}")
+        # Steps 1-2: Fetch metadata and upsert module
+        snapshot = prepare_module(db, module_code)
+        if not snapshot:
             return False
         
-        # Step 2: Upsert module
-        module = upsert_module(db, metadata)
-        
-        # Step 3: Check for change in comment count
-        current_count, error = get_comment_count(module_code)
-        if error:
-            logger.error(f"Failed to get comment count for {module_code}")
-            return False
-        elif current_count == module.last_comment_count and module.sentiment_data:
-            logger.info(f"✅ {module_code} unchanged ({current_count} comments), skipping")
-            return True
-
-        # Step 4: Scrape comments (only if changed)
-        logger.info(f"📊 {module_code} has changed: {module.last_comment_count} → {current_count} comments")
-        comments, error = scrape_module_reviews(module_code)
+        # Step 3: Open the module once; comments are only paginated if the count changed
+        result = scrape_module(module_code, known_count=snapshot["known_count"], disqus_url=snapshot["disqus_url"])
         
-        if error == "not_found":
-            logger.warning(f"{module_code} reviews not found")
-            update_module_comment_count(db, module.id, 0)
-            return True
-        
-        if error == "scrape_failed":
-            logger.error(f"Failed to scrape {module_code}")
-            return False
-        
-        if error == "no_reviews":
-            logger.info(f"{module_code} has no reviews")
-            update_module_comment_count(db, module.id, 0)
-            return True
-        
-        # Step 5: Replace comments
-        replace_module_comments(db, module.id, comments)
-        update_module_comment_count(db, module.id, len(comments))
-
-        # Step 6: Run sentiment analysis
-        logger.info(f"Running sentiment analysis for {module_code}...")
-        analyze_module_sentiment(db, module.id)
-        
-        logger.info(f"✅ {module_code} complete ({len(comments)} comments)")
-        return True
+        # Steps 4-6: Store comments and analyse
+        return store_scrape_result(db, module_code, snapshot, result)
         
     except Exception as e:
         logger.error(f"❌ Error processing {module_code}: {e}")
@@ -202,52 +291,7 @@ def process_module(module_code: str, db: Session) -> bool:
         return False
 
 
-def main():
-    """Run the full pipeline for all modules."""
-    db = SessionLocal()
-    all_modules = db.query(Module).all()
-    
-    # Separate into priority groups
-    needs_sentiment = []  # Has comments but no sentiment data
-    needs_update = []     # Comment count changed
-    up_to_date = []       # No change needed
-    
-    for module in all_modules:
-        comment_count = db.query(Comment).filter(Comment.module_id == module.id).count()
-        
-        # Priority 1: Has comments but missing sentiment data
-        if comment_count > 0 and not module.sentiment_data:
-            needs_sentiment.append(module.code)
-        # Priority 2: Comment count changed
-        elif comment_count != module.last_comment_count:
-            needs_update.append(module.code)
-        elif not module.sentiment_data and comment_count == 0:
-            needs_update.append(module.code) # scrape comments
-        # Priority 3: Up to date
-        else:
-            up_to_date.append(module.code)
-    
-    # Process in priority order
-    processing_order = needs_sentiment + needs_update
-    results = {
-        "success": 0,
-        "failed": 0,
-        "skipped": 0
-    }
-    
-    # Process priority modules
-    for module_code in processing_order:
-        success = process_module(module_code, db)
-        if success:
-            results["success"] += 1
-        else:
-            results["failed"] += 1
-    
-    # Skip up-to-date modules
-    results["skipped"] = len(up_to_date)
-    db.close()
-    
-    # Summary
+def log_summary(results: Dict[str, int]):
     logger.info(f"\n{'='*60}")
     logger.info(f"PIPELINE COMPLETE")
     logger.info(f"{'='*60}")
@@ -257,5 +301,47 @@ def main():
     logger.info(f"{'='*60}\n")
 
 
+def plan_pipeline_run(db: Session) -> Tuple[List[str], int]:
+    """
+    Modules the nightly run should process, in priority order.
+    
+    Returns:
+        (codes, number of up-to-date modules skipped)
+    """
+    status = classify_modules(db)
+    processing_order = [m["code"] for m in status["needs_sentiment"] + status["needs_update"]]
+    return processing_order, len(status["up_to_date"])
+
+
+def populate_scope(modules: Optional[List[str]] = None, start: Optional[int] = None,
+                   end: Optional[int] = None) -> List[str]:
+    """
+    Module codes for a populate run: an explicit list, or MODULE_CODES[start:end]
+    so the full catalogue can be split into chunks run by separate invocations.
+    """
+    if modules:
+        return list(dict.fromkeys(code.strip().upper() for code in modules if code.strip()))
+    return MODULE_CODES[start:end]
+
+
+def main():
+    """Run the full pipeline for all modules (recorded in pipeline_runs like API-triggered runs)."""
+    # Imported here: app.jobs imports this module
+    from app.jobs import run_job
+    
+    run = run_job("pipeline", trigger="cli")
+    if run["status"] in ("queued", "running"):
+        logger.warning(f"⏭️  Pipeline run {run['id']} is already {run['status']}, not starting another")
+        return
+    
+    results = {
+        "success": run["completed_modules"],
+        "failed": run["failed_modules"],
+        # Skip up-to-date modules
+        "skipped": run["skipped_modules"]
+    }
+    log_summary(results)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,192 @@
+from app.json_stream import Field, Schema
+from app.models import Module, Comment
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+
+# Bump whenever build_prompt() or OUTPUT_FORMAT changes meaningfully, so cached analyses are not reused
+PROMPT_VERSION = "1"
+# Same, for the map/reduce prompts used on modules with too many reviews for one prompt
+MAP_REDUCE_PROMPT_VERSION = "1"
+
+COMMENT_SEPARATOR = "\n\n---\n\n"
+SCORE_FIELDS = ("workload", "difficulty", "usefulness", "enjoyability")
+
+STYLE = "Use British English spelling and phrasing. The tone can be slightly informal, as if advising a friend, but still be clear, concise and instructional."
+
+ADVICE_RULES = "IMPORTANT: If no advice is provided for any sub-category (e.g. if the midterm or practical is never mentioned), OMIT that field from the JSON entirely. Only include advice sections that are actually mentioned in the reviews. For each advice sub-category, synthesise the common themes across reviews into a concise summary that future students can easily understand and act on. Do NOT just copy-paste individual comments. The advice should provide actionable insights based on the reviews. Maximum length of each advice sub-category: 50 words."
+
+# Final sentiment_data schema and rules, shared by the single-pass and reduce prompts
+OUTPUT_FORMAT = """TASK:
+Return ONLY valid JSON (no markdown, no preamble) with this structure:
+{
+  "workload": <float 1-5, where 1=very light, 5=very heavy>,
+  "difficulty": <float 1-5, where 1=very easy, 5=very hard>,
+  "usefulness": <float 1-5, where 1=not useful, 5=extremely useful>,
+  "enjoyability": <float 1-5, where 1=not enjoyable, 5=very enjoyable>,
+  "summary": "<a concise synthesis of overall sentiment, around 100 words>",
+  "reasoning": "<a brief explanation of how you arrived at the scores, mentioning key themes from the reviews. each score should have its own concise one-sentence justification>",
+  "advice": {
+    "general": "<synthesise general advice for future students, only if mentioned in reviews>",
+    "midterm": "<synthesise specific advice for midterm exam from different reviews (only if mentioned in reviews)>",
+    "final": "<similar to above (only if mentioned)>",
+    "practical": "<similar to above (only if mentioned)>",
+    "assignments": "<similar to above (only if mentioned)>",
+    "tutorial": "<similar to above (only if mentioned)>",
+    "recitation": "<similar to above (only if mentioned)>"
+  },
+  "top_comment": {
+      "text": <Reformat the comment text with proper line breaks. Add \\n between sentences or major points to improve readability. Keep the exact meaning but make it easier to read.>,
+      "upvotes": <number>,
+      "date": "<ISO date>",
+      "author": "<if mentioned, otherwise null>"
+    },
+}
+
+RULES:
+- Scores should reflect the AVERAGE sentiment, not extremes
+- Scores should be in whole numbers where possible, but can be in decimals (strictly 0.5 increments) to more accurately represent small differences between modules
+- Advice sections: only include if students actually mention that exam type
+- Summary should be a concise synthesis of overall sentiment, not just a generic statement. It should be one paragraph, around 100 words.
+- Advice should synthesise common themes across reviews, not just copy-paste individual comments. For example, if multiple students mention that the midterm is very difficult and covers obscure topics, the midterm advice could be: "The midterm is challenging, with questions that cover difficult topics such as [...] (fill this in). It's recommended to review lecture materials thoroughly and practice with past year papers to identify these tricky areas."
+- Advice should be presented in a way that future students can easily understand and act on, rather than just being a collection of quotes. It should provide actionable insights. Each advice section should be 3 sentences summarising the key points from the reviews, approximately 50 words.
+- Top comment: Select a singular comment that gives comprehensive advice. Choose one comment that is posted in the last 3 years to ensure relevance. If there are more recent comments claiming a change in module structure/content, prioritize those instead.
+- Return ONLY the JSON object, nothing else"""
+
+# Top-level fields of OUTPUT_FORMAT, checked while the response streams in (see app.json_stream)
+SENTIMENT_SCHEMA: Schema = {
+    **{field: Field(("number",), minimum=1, maximum=5) for field in SCORE_FIELDS},
+    "summary": Field(("string",)),
+    "reasoning": Field(("string",), required=False),
+    "advice": Field(("object",), required=False),
+    "top_comment": Field(("object", "null"), required=False),
+}
+
+# Per-batch summary schema for the map step
+MAP_OUTPUT_FORMAT = """TASK:
+Return ONLY valid JSON (no markdown, no preamble) with this structure:
+{
+  "workload": <float 1-5, where 1=very light, 5=very heavy>,
+  "difficulty": <float 1-5, where 1=very easy, 5=very hard>,
+  "usefulness": <float 1-5, where 1=not useful, 5=extremely useful>,
+  "enjoyability": <float 1-5, where 1=not enjoyable, 5=very enjoyable>,
+  "themes": "<the main points these reviews make, around 60 words>",
+  "score_notes": "<one short sentence per score explaining it>",
+  "advice": {
+    "general": "<advice given in these reviews, at most 40 words>",
+    "midterm": "<same, for the midterm>",
+    "final": "<same>",
+    "practical": "<same>",
+    "assignments": "<same>",
+    "tutorial": "<same>",
+    "recitation": "<same>"
+  },
+  "top_comment": <number of the comment in this batch that gives the most comprehensive advice, preferring ones posted in the last 3 years, or null>
+}
+
+RULES:
+- Scores should reflect the AVERAGE sentiment of this batch, in 0.5 increments
+- Omit advice sub-categories these reviews don't mention
+- Keep the notes factual and specific to this module; they will be merged with other batches
+- Return ONLY the JSON object, nothing else"""
+
+# Top-level fields of MAP_OUTPUT_FORMAT
+MAP_SCHEMA: Schema = {
+    **{field: Field(("number",), minimum=1, maximum=5) for field in SCORE_FIELDS},
+    "themes": Field(("string",)),
+    "score_notes": Field(("string",), required=False),
+    "advice": Field(("object",), required=False),
+    "top_comment": Field(("number", "string", "null"), required=False),
+}
+
+
+def format_comment(number: int, comment: Comment, max_chars: Optional[int] = None) -> str:
+    text = comment.text
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars].rstrip() + " [...]"
+    return f"Comment {number} (Upvotes: {comment.upvotes}, Date: {comment.posted_date}):\n{text}"
+
+
+def build_prompt(module: Module, comments: List[Comment]) -> str:
+    """Build the single-pass Gemini prompt for a module's reviews. Bump PROMPT_VERSION when changing it."""
+    # Prepare comments for Gemini
+    comments_text = COMMENT_SEPARATOR.join([format_comment(i + 1, c) for i, c in enumerate(comments)])
+
+    # Construct prompt
+    return f"""You are analyzing student reviews for the NUS module "{module.code} - {module.name}".
+
+Below are {len(comments)} student reviews from NUSMods. Analyze them and provide a comprehensive summary in JSON format. {STYLE}
+
+{ADVICE_RULES}
+
+REVIEWS:
+{comments_text}
+
+{OUTPUT_FORMAT}"""
+
+
+def build_map_prompt(module: Module, batch: Sequence[str], batch_number: int, batches: int, total_reviews: int) -> str:
+    """Map step: summarise one batch of already formatted comments."""
+    return f"""You are analyzing student reviews for the NUS module "{module.code} - {module.name}".
+
+The module has {total_reviews} reviews, too many to analyse in one go. Below is batch {batch_number} of {batches}, containing {len(batch)} of them. Summarise this batch in JSON format. Use British English spelling.
+
+REVIEWS:
+{COMMENT_SEPARATOR.join(batch)}
+
+{MAP_OUTPUT_FORMAT}"""
+
+
+def build_reduce_prompt(module: Module, partials: List[Tuple[Dict, int, str]], weighted_scores: Dict[str, float],
+                        candidates: List[str], total_reviews: int, analysed_reviews: int) -> str:
+    """
+    Reduce step: merge the batch summaries into the final sentiment_data.
+    partials are (map output, number of reviews, date range); candidates are formatted top comment candidates.
+    """
+    batches_text = "\n\n".join(
+        f"Batch {i + 1} ({count} reviews, {dates}):\n{json.dumps({k: v for k, v in partial.items() if k != 'top_comment'}, ensure_ascii=False)}"
+        for i, (partial, count, dates) in enumerate(partials)
+    )
+    sampled = ""
+    if analysed_reviews < total_reviews:
+        sampled = f" The {analysed_reviews} most upvoted and recent of the {total_reviews} reviews were used."
+    scores_text = ", ".join(f"{field} {score}" for field, score in weighted_scores.items())
+
+    return f"""You are analyzing student reviews for the NUS module "{module.code} - {module.name}".
+
+This module has {total_reviews} student reviews from NUSMods, too many to read at once, so they were split into {len(partials)} batches and each batch was summarised.{sampled} Combine the batch summaries below into one comprehensive summary in JSON format. {STYLE}
+
+Weight each batch by its number of reviews. The review-weighted average scores across batches are: {scores_text}. Use these as the starting point for the scores.
+
+{ADVICE_RULES}
+
+BATCH SUMMARIES:
+{batches_text}
+
+TOP COMMENT CANDIDATES (pick the top comment from these):
+{COMMENT_SEPARATOR.join(candidates)}
+
+{OUTPUT_FORMAT}"""
+
+
+def build_delta_prompt(module: Module, previous: Dict, analysed_reviews: int, new_comments: List[Comment]) -> str:
+    """Incremental update: fold reviews posted since the last analysis into the existing sentiment_data."""
+    previous = {k: v for k, v in previous.items() if k != "average"}
+    comments_text = COMMENT_SEPARATOR.join([format_comment(i + 1, c) for i, c in enumerate(new_comments)])
+
+    return f"""You are updating the analysis of student reviews for the NUS module "{module.code} - {module.name}".
+
+The CURRENT ANALYSIS below summarises {analysed_reviews} earlier reviews. Since then, {len(new_comments)} new reviews have been posted. Produce the updated analysis in JSON format, as if written from all {analysed_reviews + len(new_comments)} reviews. {STYLE}
+
+- Scores: move them only as far as the new reviews justify, weighting the current scores by {analysed_reviews} reviews and the new reviews by {len(new_comments)}.
+- Summary, reasoning and advice: keep what still holds, and work in anything the new reviews add or contradict (e.g. a changed module structure). Don't drop advice sections the new reviews don't mention.
+- Top comment: keep the current one unless a new review is clearly more comprehensive and recent.
+
+{ADVICE_RULES}
+
+CURRENT ANALYSIS:
+{json.dumps(previous, ensure_ascii=False, indent=2)}
+
+NEW REVIEWS:
+{comments_text}
+
+{OUTPUT_FORMAT}"""
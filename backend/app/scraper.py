@@ -1,13 +1,216 @@
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
-from bs4 import BeautifulSoup
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeout
+from app.browser import get_browser_pool
+from app.parsers import get_parser
+from dataclasses import dataclass
 from typing import Optional, Tuple, List, Dict
 from datetime import datetime
+import json
 import logging
+import os
 import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 MAX_FAILURES = 3
+MAX_CLICKS = 200
+
+# Point at a local stand-in (fixtures/disqus_server.py) to scrape offline
+NUSMODS_BASE_URL = os.getenv("NUSMODS_BASE_URL", "https://nusmods.com")
+
+# "network": collect posts from the JSON Disqus fetches on each "Load more" (falls back to DOM if unavailable)
+# "dom":     click "Load more" until done, then parse the rendered HTML
+DISQUS_SCRAPE_MODE = os.getenv("DISQUS_SCRAPE_MODE", "network")
+DISQUS_POSTS_ENDPOINT = "/threads/listPosts"  # matches listPosts and listPostsThreaded
+LOAD_MORE_TIMEOUT = 15000  # ms to wait for the next batch after clicking "Load more"
+
+
+# ============================================================================
+# PAGE STEP LOGIC (shared with the async driver in app/async_scraper.py)
+# ============================================================================
+# The sync and async drivers only do the browser I/O; what to look for, when to
+# stop paginating and how to turn what was read into a result lives here.
+
+DISQUS_THREAD_SELECTOR = "div#disqus_thread"
+COMMENT_COUNT_SELECTOR = "span.comment-count"
+POST_LIST_SELECTOR = "ul#post-list"
+POST_SELECTOR = "li.post"
+LOAD_MORE_SELECTOR = 'a[data-action="more-posts"]'
+THREAD_DATA_SELECTOR = "#disqus-threadData"
+MORE_POSTS_RENDERED = "n => document.querySelectorAll('li.post').length > n"  # JS, called with the previous post count
+
+
+@dataclass
+class ScrapeResult:
+    """
+    Outcome of scrape_module().
+
+    count:    comment count reported by Disqus (None if scraping failed)
+    comments: parsed comments, or None if the count matched known_count and pagination was skipped
+    error:    None, "not_found", "no_reviews" or "scrape_failed" (same codes as scrape_module_reviews)
+    disqus_url: the Disqus URL that was successfully used (cache it on the Module)
+    html:     rendered Disqus HTML still to be parsed with parse_comments (only when the caller deferred parsing)
+    """
+    count: Optional[int] = None
+    comments: Optional[List[Dict]] = None
+    error: Optional[str] = None
+    disqus_url: Optional[str] = None
+    html: Optional[str] = None
+
+    @property
+    def unchanged(self) -> bool:
+        return self.error is None and self.comments is None and self.html is None
+
+
+def module_page_url(module_code: str) -> str:
+    return f"{NUSMODS_BASE_URL}/courses/{module_code}"
+
+
+def disqus_url_from_html(html: str, module_code: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns:
+        (disqus_url, None), or (None, "scrape_failed") if the rendered page has no embed
+    """
+    disqus_url = extract_disqus_url(html, module_code)
+    if not disqus_url:
+        logger.error(f"Could not find Disqus URL for {module_code}")
+        return None, "scrape_failed"
+    return disqus_url, None
+
+
+def parse_comment_count(count_text: Optional[str], module_code: str, error: Optional[Exception] = None) -> int:
+    """The number in the embed's "N comments" header; 0 if it couldn't be read (`error`) or parsed."""
+    if error is None:
+        try:
+            count = int(count_text.split()[0])
+            logger.info(f"{module_code} has {count} comments")
+            return count
+        except (AttributeError, IndexError, ValueError) as e:
+            error = e
+    logger.warning(f"Could not get comment count for {module_code}: {error}")
+    return 0  # Assume 0 if can't find count
+
+
+def is_posts_response(response) -> bool:
+    """expect_response() predicate for the listPosts request a "Load more" click triggers."""
+    return DISQUS_POSTS_ENDPOINT in response.url and response.request.method == "GET"
+
+
+class LoadMoreTracker:
+    """
+    Bookkeeping for DOM mode, which clicks "Load more" until every comment is rendered:
+    stops after MAX_CLICKS, or after MAX_FAILURES clicks in a row that rendered nothing new.
+    """
+
+    def __init__(self):
+        self.clicks = 0
+        self.failures = 0
+
+    def wants_more(self) -> bool:
+        return self.clicks < MAX_CLICKS
+
+    def clicked(self, rendered: bool) -> bool:
+        """Record a click and whether new posts appeared. Returns False once it's time to give up."""
+        self.clicks += 1
+        if rendered:
+            self.failures = 0
+            return True
+        self.failures += 1
+        if self.failures >= MAX_FAILURES:
+            logger.warning(f"Stopping after {self.failures} attempts failed to load new comments")
+            return False
+        return True
+
+    def finish(self) -> int:
+        """Returns the number of batches loaded."""
+        if self.clicks >= MAX_CLICKS:
+            logger.warning(f"WARNING: Reached max clicks ({MAX_CLICKS})!!")
+        return self.clicks + 1
+
+
+class DisqusPostCollector:
+    """
+    Bookkeeping for network mode, which collects posts from the JSON Disqus itself loads:
+    the first batch is embedded in the page as #disqus-threadData, later batches arrive
+    as listPosts responses each time "Load more" is clicked.
+    Raises if `thread_data` isn't the embedded thread JSON (caller falls back to DOM parsing).
+    """
+
+    def __init__(self, thread_data: str):
+        data = json.loads(thread_data)
+        self.collected: Dict = {}
+        self.batches = 0
+        self.failures = 0
+        self.has_next = False
+        self._add(data["response"]["posts"], data.get("cursor"))
+
+    def _add(self, posts: List[Dict], cursor: Optional[Dict]):
+        for post in posts:
+            comment = parse_disqus_post(post)
+            if comment:
+                self.collected[comment["post_id"] or len(self.collected)] = comment
+        self.batches += 1
+        self.failures = 0
+        self.has_next = bool((cursor or {}).get("hasNext"))
+
+    def wants_more(self) -> bool:
+        return self.has_next and self.batches < MAX_CLICKS
+
+    def add_response(self, payload: Dict):
+        """Add the posts from one listPosts response."""
+        self._add(payload.get("response") or [], payload.get("cursor"))
+
+    def failed(self, error: Exception) -> bool:
+        """Record a batch that couldn't be captured. Returns False once it's time to give up."""
+        self.failures += 1
+        logger.warning(f"Failed to capture Disqus batch {self.batches + 1}: {error}")
+        if self.failures >= MAX_FAILURES:
+            logger.warning(f"Stopping after {self.failures} attempts failed to load new comments")
+            return False
+        return True
+
+    def finish(self) -> List[Dict]:
+        if self.has_next and self.batches >= MAX_CLICKS:
+            logger.warning(f"WARNING: Reached max clicks ({MAX_CLICKS})!!")
+        logger.info(f"Captured {len(self.collected)} Disqus posts (in {self.batches} batches)")
+        return list(self.collected.values())
+
+
+def parse_dom_comments(html: str, batches: int) -> List[Dict]:
+    comments = parse_comments(html)
+    logger.info(f"Parsed {len(comments)} comments from the DOM (in {batches} batches)")
+    return comments
+
+
+def comments_result(module_code: str, count: int, comments: List[Dict], disqus_url: str) -> ScrapeResult:
+    if len(comments) == 0:
+        logger.info(f"No reviews found for {module_code}")
+        return ScrapeResult(count=count, comments=[], error="no_reviews", disqus_url=disqus_url)
+
+    logger.info(f"Scraped {len(comments)} reviews for {module_code}")
+    return ScrapeResult(count=count, comments=comments, disqus_url=disqus_url)
+
+
+# ============================================================================
+# PAGE STEPS (sync driver)
+# ============================================================================
+
+def _open_module_page(page: Page, module_code: str) -> Tuple[Optional[str], Optional[str]]:
+    """Navigate a leased page to the NUSMods module page and return its HTML."""
+    response = page.goto(module_page_url(module_code), wait_until="networkidle", timeout=15000)
+    
+    # Check if module exists (404 page)
+    if response.status == 404:
+        logger.warning(f"Module {module_code} not found (404)")
+        return None, "not_found"
+    
+    # Wait for Disqus iframe to load
+    try:
+        page.wait_for_selector(DISQUS_THREAD_SELECTOR, timeout=10000)
+    except PlaywrightTimeout:
+        logger.error(f"Disqus iframe didn't load for {module_code}")
+        return None, "scrape_failed"
+    
+    return page.content(), None
 
 
 def fetch_module_page(module_code: str) -> Tuple[Optional[str], Optional[str]]:
@@ -19,31 +222,11 @@ def fetch_module_page(module_code: str) -> Tuple[Optional[str], Optional[str]]:
         (None, "not_found") if module doesn't exist
         (None, "scrape_failed") if scraping failed
     """
-    url = f"https://nusmods.com/courses/{module_code}"
-    
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            response = page.goto(url, wait_until="networkidle", timeout=15000)
-            
-            # Check if module exists (404 page)
-            if response.status == 404:
-                logger.warning(f"Module {module_code} not found (404)")
-                browser.close()
-                return None, "not_found"
-            
-            # Wait for Disqus iframe to load
-            try:
-                page.wait_for_selector("div#disqus_thread", timeout=10000)
-            except PlaywrightTimeout:
-                logger.error(f"Disqus iframe didn't load for {module_code}")
-                browser.close()
-                return None, "scrape_failed"
-            
-            html = page.content()
-            browser.close()
+        with get_browser_pool().page() as page:
+            html, error = _open_module_page(page, module_code)
+            if error:
+                return None, error
             
             logger.info(f"Successfully fetched {module_code}")
             return html, None
@@ -60,13 +243,150 @@ def extract_disqus_url(html: str, module_code: str) -> Optional[str]:
     Returns:
         Disqus URL string or None if not found
     """
-    soup = BeautifulSoup(html, "html.parser")
-    iframe = soup.find("div", id="disqus_thread")
-    if iframe and iframe.find("iframe"):
-        return iframe.find("iframe")["src"]
+    return get_parser().extract_disqus_url(html)
+
+
+def _open_disqus_page(page: Page, disqus_url: str) -> Optional[str]:
+    """Navigate a leased page to the Disqus embed. Returns an error code on failure."""
+    response = page.goto(disqus_url, wait_until="networkidle", timeout=15000)
+    if not response.ok:
+        logger.error(f"Failed to load Disqus URL: {disqus_url} with status {response.status}")
+        return "scrape_failed"
     return None
 
 
+def _open_cached_disqus_page(page: Page, disqus_url: str, module_code: str) -> bool:
+    """
+    Navigate straight to a previously resolved Disqus URL.
+    Returns False if the embed no longer renders a thread, so the caller can fall
+    back to resolving the URL from the NUSMods page.
+    """
+    try:
+        if _open_disqus_page(page, disqus_url):
+            return False
+        page.wait_for_selector(COMMENT_COUNT_SELECTOR, timeout=5000)
+        return True
+    except Exception as e:
+        logger.warning(f"Cached Disqus URL failed for {module_code}, falling back to NUSMods: {e}")
+        return False
+
+
+def _resolve_disqus_url(page: Page, module_code: str) -> Tuple[Optional[str], Optional[str]]:
+    """Render the NUSMods page on a leased page and extract the Disqus URL."""
+    html, error = _open_module_page(page, module_code)
+    if error:
+        return None, error
+    return disqus_url_from_html(html, module_code)
+
+
+def _read_comment_count(page: Page, module_code: str) -> int:
+    """Read the "N comments" header from an opened Disqus embed."""
+    try:
+        return parse_comment_count(page.locator(COMMENT_COUNT_SELECTOR).first.inner_text(timeout=5000), module_code)
+    except Exception as e:
+        return parse_comment_count(None, module_code, error=e)
+
+
+def _load_all_comments(page: Page) -> int:
+    """
+    Click "Load more" on an opened Disqus embed until every comment is visible.
+    Returns the number of batches loaded, or 0 if the post list never appeared.
+    """
+    # Wait for initial comments to load
+    try:
+        page.wait_for_selector(POST_LIST_SELECTOR, timeout=10000)
+    except PlaywrightTimeout: 
+        # No comments found or post-list didn't load
+        logger.warning("No comments found (post-list didn't load)")
+        return 0
+    
+    # Click "Load more" button until it disappears
+    tracker = LoadMoreTracker()
+    while tracker.wants_more():
+        try:
+            load_more = page.locator(LOAD_MORE_SELECTOR)
+            if not load_more.is_visible(timeout=4000):
+                break
+            before_count = page.locator(POST_SELECTOR).count()
+            load_more.click()
+
+            # Wait for new comments to render (returns as soon as they appear)
+            try:
+                page.wait_for_function(MORE_POSTS_RENDERED, arg=before_count, timeout=LOAD_MORE_TIMEOUT)
+                rendered = True
+            except PlaywrightTimeout:
+                rendered = False
+            if not tracker.clicked(rendered):
+                break
+        except Exception:
+            break
+    return tracker.finish()
+
+
+def parse_disqus_post(post: Dict) -> Optional[Dict]:
+    """
+    Convert one post object from the Disqus JSON API into the same shape as parse_comments().
+    Returns None for deleted/spam posts, which the embed doesn't render either.
+    """
+    if post.get("isDeleted") or post.get("isSpam"):
+        return None
+
+    try:
+        posted_date = datetime.fromisoformat(post["createdAt"])
+    except (KeyError, TypeError, ValueError):
+        posted_date = None
+
+    author = (post.get("author") or {}).get("name")
+    return {
+        "post_id": str(post["id"]) if post.get("id") is not None else None,
+        "text": (post.get("raw_message") or "").strip(),
+        "posted_date": posted_date,
+        "author": author or "Anonymous",
+        "upvotes": int(post.get("likes") or 0),
+    }
+
+
+def _capture_all_comments(page: Page) -> Optional[List[Dict]]:
+    """
+    Collect every post on an opened Disqus embed from the JSON Disqus itself loads
+    (see DisqusPostCollector).
+    
+    Returns:
+        List of comment dicts (same shape as parse_comments)
+        None if the embed doesn't expose thread data (caller should fall back to DOM parsing)
+    """
+    try:
+        collector = DisqusPostCollector(page.locator(THREAD_DATA_SELECTOR).text_content(timeout=5000))
+    except Exception as e:
+        logger.warning(f"Disqus thread data unavailable, falling back to DOM parsing: {e}")
+        return None
+
+    while collector.wants_more():
+        try:
+            # Event-driven: returns as soon as Disqus answers the "Load more" request
+            with page.expect_response(is_posts_response, timeout=LOAD_MORE_TIMEOUT) as response_info:
+                page.locator(LOAD_MORE_SELECTOR).click(timeout=LOAD_MORE_TIMEOUT)
+            payload = response_info.value.json()
+        except Exception as e:
+            if not collector.failed(e):
+                break
+            continue
+        collector.add_response(payload)
+
+    return collector.finish()
+
+
+def _collect_comments(page: Page) -> List[Dict]:
+    """Collect all comments from an opened Disqus embed using DISQUS_SCRAPE_MODE."""
+    if DISQUS_SCRAPE_MODE == "network":
+        comments = _capture_all_comments(page)
+        if comments is not None:
+            return comments
+
+    batches = _load_all_comments(page)
+    return parse_dom_comments(page.content(), batches)
+
+
 def fetch_disqus_comments(disqus_url: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Fetch Disqus embed page HTML.
@@ -77,61 +397,18 @@ def fetch_disqus_comments(disqus_url: str) -> Tuple[Optional[str], Optional[str]
         (None, error_code) if failed
     """
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            response = page.goto(disqus_url, wait_until="networkidle", timeout=15000)
-            
-            if not response.ok:
-                logger.error(f"Failed to load Disqus URL: {disqus_url} with status {response.status}")
-                browser.close()
-                return None, "scrape_failed"
-            
-            # Wait for initial comments to load
-            try:
-                page.wait_for_selector("ul#post-list", timeout=10000)
-            except PlaywrightTimeout: 
-                # No comments found or post-list didn't load
-                logger.warning("No comments found (post-list didn't load)")
-                browser.close()
-                return page.content(), None 
-            
-            # Click "Load more" button until it disappears
-            initial_count = len(page.locator('li.post').all())
-            clicks = 0
-            max_clicks = 200 
-            failures = 0
-            while clicks < max_clicks:
-                try:
-                    load_more = page.locator('a[data-action="more-posts"]')
-                    if not load_more.is_visible(timeout=4000):
-                        break
-                    before_count = len(page.locator('li.post').all())
-                    load_more.click()
-                    clicks += 1
-
-                    # Wait for new comments to load
-                    time.sleep(3)
-                    after_count = len(page.locator('li.post').all())
-                    if after_count == before_count:
-                        failures += 1
-                        if failures >= MAX_FAILURES:
-                            logger.warning(f"Stopping after {failures} attempts failed to load new comments")
-                            break
-                    else:
-                        failures = 0
-                except Exception:
-                    break
+        with get_browser_pool().page() as page:
+            error = _open_disqus_page(page, disqus_url)
+            if error:
+                return None, error
             
-            if clicks >= max_clicks:
-                logger.warning(f"WARNING: Reached max clicks ({max_clicks})!!")
+            batches = _load_all_comments(page)
 
             # Get final HTML with all comments loaded
             html = page.content()
-            browser.close()
             
-            logger.info(f"Successfully fetched Disqus comments from {disqus_url} (in {clicks + 1} batches)")
+            if batches:
+                logger.info(f"Successfully fetched Disqus comments from {disqus_url} (in {batches} batches)")
             return html, None
     except Exception as e:
         logger.error(f"Error fetching Disqus URL {disqus_url}: {e}")
@@ -140,66 +417,20 @@ def fetch_disqus_comments(disqus_url: str) -> Tuple[Optional[str], Optional[str]
 
 def parse_comments(html: str) -> List[Dict[str, any]]:
     """
-    Parse comments from Disqus HTML. 
+    Parse comments from Disqus HTML with the configured parser (see app/parsers.py). 
     
     Returns:
-        List of dicts: [{"text": "...", "posted_date": "...", "upvotes": 0}, ...]
+        List of dicts: [{"post_id": "...", "text": "...", "posted_date": "...", "author": "...", "upvotes": 0}, ...]
         Empty list if no comments found
     """
-    soup = BeautifulSoup(html, "html.parser")
-    comments = []
-    post_list = soup.find("ul", id="post-list")
-    if not post_list:
-        logger.warning("Could not find post-list in Disqus HTML")
-        return comments
-
-    # Note: For now, children comments are ignored. Only top-level comments are scraped.
-    for post in post_list.find_all("li", class_="post"):
-        comment = {}
-
-        # Extract text
-        text_element = post.find("div", class_="post-message")
-        if text_element:
-            comment["text"] = text_element.get_text(strip=True)
-        else:
-            comment["text"] = ""
-
-        # Extract date
-        date_element = post.find("a", class_="time-ago")
-        if date_element and date_element.get("title"):
-            date_string = date_element["title"]
-            try: 
-                comment["posted_date"] = datetime.strptime(date_string, "%A, %B %d, %Y %I:%M %p")
-            except ValueError:
-                comment["posted_date"] = None
-        else:
-            comment["posted_date"] = None
-
-        # Extract author
-        author_element = post.find("span", class_="author").find("a")
-        if author_element:
-            comment["author"] = author_element.get_text(strip=True)
-        else:
-            comment["author"] = "Anonymous" # Disqus allows anonymous comments
-        
-        # Extract upvotes
-        upvote_element = post.find("div", class_="post-votes")
-        if upvote_element:
-            try: 
-                comment["upvotes"] = upvote_element.find_all("span")[1].get_text(strip=True)
-            except (IndexError, ValueError, AttributeError):
-                comment["upvotes"] = 0
-        else:
-            comment["upvotes"] = 0
-
-        comments.append(comment)
-
-    return comments
+    return get_parser().parse_comments(html)
 
 
-def scrape_module_reviews(module_code: str, retry_count: int = 3) -> Tuple[List[Dict], Optional[str]]:
+def scrape_module_reviews(module_code: str, retry_count: int = 3, disqus_url: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
     """
     Complete scraping workflow for one module.
+    If a cached disqus_url is given, it is tried first and the NUSMods page is only
+    rendered if it fails.
     Handles retries on failure.
     
     Returns:
@@ -208,85 +439,86 @@ def scrape_module_reviews(module_code: str, retry_count: int = 3) -> Tuple[List[
         ([], "no_reviews") if module has 0 reviews
         ([], "scrape_failed") if scraping failed after retries
     """
-    for attempt in range(retry_count):
-        # Step 1: Fetch NUSMods page
-        html, error = fetch_module_page(module_code)
-        
-        if error == "not_found":
-            return [], "not_found"
-        
-        if error == "scrape_failed":
-            if attempt < retry_count - 1:
-                logger.info(f"Retry {attempt + 1}/{retry_count} for {module_code}")
-                time.sleep(2)  # Wait before retry
-                continue
-            else:
-                return [], "scrape_failed"
-        
-        # Step 2: Extract Disqus URL
-        disqus_url = extract_disqus_url(html, module_code)
-        if not disqus_url:
-            logger.error(f"Could not find Disqus URL for {module_code}")
-            return [], "scrape_failed"
-        
-        # Step 3: Fetch Disqus page
-        disqus_html, error = fetch_disqus_comments(disqus_url)
-        if error:
-            if attempt < retry_count - 1:
-                logger.info(f"Retry {attempt + 1}/{retry_count} for Disqus")
-                time.sleep(2)
-                continue
-            else:
-                return [], "scrape_failed"
-        
-        # Step 4: Parse comments
-        comments = parse_comments(disqus_html)
-        
-        if len(comments) == 0:
-            logger.info(f"No reviews found for {module_code}")
-            return [], "no_reviews"
-        
-        logger.info(f"Scraped {len(comments)} reviews for {module_code}")
-        return comments, None
-    
-    return [], "scrape_failed"
+    result = scrape_module(module_code, retry_count=retry_count, disqus_url=disqus_url)
+    if result.error:
+        return [], result.error
+    return result.comments, None
 
-def get_comment_count(module_code: str) -> Tuple[Optional[int], Optional[str]]:
+def get_comment_count(module_code: str, disqus_url: Optional[str] = None) -> Tuple[Optional[int], Optional[str]]:
     """
     Get total number of comments for a module without scraping them all.
+    If a cached disqus_url is given, the NUSMods page is only rendered if it fails.
     
     Returns:
         (count, None) if success
         (None, error_code) if failed
     """
     try:
-        html, error = fetch_module_page(module_code)
-        
-        if error:
-            return None, error
-        
-        disqus_url = extract_disqus_url(html, module_code)
-        if not disqus_url:
-            return None, "scrape_failed"
-        
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(disqus_url, wait_until="networkidle", timeout=15000)
+        with get_browser_pool().page() as page:
+            if disqus_url and _open_cached_disqus_page(page, disqus_url, module_code):
+                return _read_comment_count(page, module_code), None
             
-            try:
-                count_element = page.locator('span.comment-count').first
-                count_text = count_element.inner_text(timeout=5000)
-                count = int(count_text.split()[0])
-                browser.close()
-                logger.info(f"{module_code} has {count} comments")
-                return count, None
-                
-            except Exception as e:
-                logger.warning(f"Could not get comment count for {module_code}: {e}")
-                browser.close()
-                return 0, None  # Assume 0 if can't find count
+            disqus_url, error = _resolve_disqus_url(page, module_code)
+            if error:
+                return None, error
+            
+            page.goto(disqus_url, wait_until="networkidle", timeout=15000)
+            return _read_comment_count(page, module_code), None
                 
     except Exception as e:
         logger.error(f"Error getting comment count for {module_code}: {e}")
-        return None, "scrape_failed"
\ No newline at end of file
+        return None, "scrape_failed"
+
+
+# ============================================================================
+# SCRAPE SESSION (count + comments in one visit)
+# ============================================================================
+
+def _scrape_module_once(module_code: str, known_count: Optional[int], disqus_url: Optional[str]) -> ScrapeResult:
+    with get_browser_pool().page() as page:
+        # Step 1: Go straight to the cached Disqus URL; fall back to NUSMods page -> Disqus URL
+        if not (disqus_url and _open_cached_disqus_page(page, disqus_url, module_code)):
+            disqus_url, error = _resolve_disqus_url(page, module_code)
+            if error:
+                return ScrapeResult(error=error)
+            
+            # Disqus embed on the same page, no re-render of NUSMods
+            error = _open_disqus_page(page, disqus_url)
+            if error:
+                return ScrapeResult(error=error)
+        
+        # Step 2: Comment count
+        count = _read_comment_count(page, module_code)
+        if known_count is not None and count == known_count:
+            return ScrapeResult(count=count, disqus_url=disqus_url)
+        
+        # Step 3: Count changed -> continue paginating on the already-open embed
+        return comments_result(module_code, count, _collect_comments(page), disqus_url)
+
+
+def scrape_module(module_code: str, known_count: Optional[int] = None, retry_count: int = 3,
+                  disqus_url: Optional[str] = None) -> ScrapeResult:
+    """
+    Open a module once, read its comment count and, only if it differs from
+    known_count, continue into full pagination on the same page.
+    Pass known_count=None to always scrape comments.
+    If a cached disqus_url is given, the NUSMods page is only rendered if it fails.
+    Handles retries on failure.
+    """
+    for attempt in range(retry_count):
+        try:
+            result = _scrape_module_once(module_code, known_count, disqus_url)
+        except Exception as e:
+            logger.error(f"Error scraping {module_code}: {e}")
+            result = ScrapeResult(error="scrape_failed")
+        
+        if result.error != "scrape_failed":
+            return result
+        
+        # Don't trust the cached URL again on retry
+        disqus_url = None
+        if attempt < retry_count - 1:
+            logger.info(f"Retry {attempt + 1}/{retry_count} for {module_code}")
+            time.sleep(2)  # Wait before retry
+    
+    return ScrapeResult(error="scrape_failed")
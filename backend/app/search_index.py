@@ -0,0 +1,235 @@
+from bisect import insort
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 10
+NGRAM_SIZES = (1, 2, 3)  # Queries longer than 3 chars use the rarest trigram as the candidate list
+MIN_REBUILD_INTERVAL = float(os.getenv("SEARCH_INDEX_MIN_REBUILD_INTERVAL", "5"))  # seconds
+MAX_AGE = float(os.getenv("SEARCH_INDEX_MAX_AGE", "300"))  # seconds; bounds staleness when the generation only moves in-process
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory")  # "memory" (this index) | "database" (ILIKE + sort)
+
+
+def normalise(text: Optional[str]) -> str:
+    return (text or "").upper().strip()
+
+
+def search_priority(code: str, name: str, query: str) -> int:
+    """
+    Relevance bucket for a module (all arguments normalised):
+    0 exact code, 1 code prefix, 2 code contains, 3 name prefix, 4 name contains, 5 no match.
+    """
+    if code == query:
+        return 0
+    if code.startswith(query):
+        return 1
+    if query in code:
+        return 2
+    if name.startswith(query):
+        return 3
+    if query in name:
+        return 4
+    return 5
+
+
+def search_payload(module) -> Dict:
+    """The /api/search result dict for a Module row."""
+    return {
+        "code": module.code,
+        "name": module.name,
+        "comment_count": module.last_comment_count,
+        "units": module.units,
+        "semesters": module.semesters_available,
+    }
+
+
+def _ngrams(text: str) -> set:
+    return {text[i:i + n] for n in NGRAM_SIZES for i in range(len(text) - n + 1)}
+
+
+class _TrieNode:
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.terminal = False
+
+
+class SearchIndex:
+    """
+    In-memory module search with the same ranking as the original /api/search:
+    results ordered by (search_priority, code), top MAX_RESULTS.
+
+    - Codes: a prefix trie, walked in sorted order, so prefix matches come out already ranked.
+    - Code/name substrings: 1-3 gram posting lists kept sorted by code, scanned from the
+      rarest gram of the query and stopped as soon as enough results are found.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self.generation: Optional[int] = None
+        self.built_at = 0.0
+
+    def _clear(self):
+        self._entries: Dict[str, Dict] = {}          # code -> {"code_norm", "name_norm", "payload"}
+        self._trie = _TrieNode()
+        self._code_grams: Dict[str, List[str]] = defaultdict(list)
+        self._name_grams: Dict[str, List[str]] = defaultdict(list)
+
+    # ------------------------------------------------------------------
+    # Building / patching
+    # ------------------------------------------------------------------
+
+    def build(self, payloads: Iterable[Dict], generation: Optional[int] = None):
+        """Replace the whole index. Each payload is the /api/search result dict for a module."""
+        with self._lock:
+            self._clear()
+            for payload in payloads:
+                self._add(payload, keep_sorted=False)
+            for grams in (self._code_grams, self._name_grams):
+                for postings in grams.values():
+                    postings.sort()
+            self.generation = generation
+            self.built_at = time.monotonic()
+        logger.info(f"Built search index over {len(self._entries)} modules")
+
+    def patch(self, payload: Dict):
+        """Insert or update a single module without rebuilding."""
+        with self._lock:
+            self._remove(normalise(payload["code"]))
+            self._add(payload)
+
+    def _add(self, payload: Dict, keep_sorted: bool = True):
+        code, name = normalise(payload["code"]), normalise(payload["name"])
+        self._entries[code] = {"code_norm": code, "name_norm": name, "payload": payload}
+
+        node = self._trie
+        for char in code:
+            node = node.children.setdefault(char, _TrieNode())
+        node.terminal = True
+
+        add = insort if keep_sorted else list.append
+        for gram in _ngrams(code):
+            add(self._code_grams[gram], code)
+        for gram in _ngrams(name):
+            add(self._name_grams[gram], code)
+
+    def _remove(self, code: str):
+        entry = self._entries.pop(code, None)
+        if entry is None:
+            return
+        for grams, text in ((self._code_grams, entry["code_norm"]), (self._name_grams, entry["name_norm"])):
+            for gram in _ngrams(text):
+                grams[gram].remove(code)
+        # Trie nodes are left in place; a non-terminal path just yields nothing
+        node = self._trie
+        for char in code:
+            node = node.children[char]
+        node.terminal = False
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+
+    def _prefix_codes(self, prefix: str) -> Iterator[str]:
+        node = self._trie
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return
+        # Pre-order walk with sorted children = lexicographic order
+        stack = [(node, prefix)]
+        while stack:
+            node, code = stack.pop()
+            if node.terminal:
+                yield code
+            for char in sorted(node.children, reverse=True):
+                stack.append((node.children[char], code + char))
+
+    def _candidates(self, grams: Dict[str, List[str]], query: str) -> List[str]:
+        """Sorted codes whose text may contain query (a superset; callers verify)."""
+        if len(query) <= max(NGRAM_SIZES):
+            return grams.get(query, [])
+        postings = [grams.get(gram, []) for gram in _ngrams(query) if len(gram) == max(NGRAM_SIZES)]
+        return min(postings, key=len)
+
+    def search(self, q: str, limit: int = MAX_RESULTS) -> List[Dict]:
+        query = normalise(q)
+        if not query:
+            return []
+
+        with self._lock:
+            results: List[str] = []
+
+            def take(codes: Iterable[str], bucket: int):
+                for code in codes:
+                    if len(results) >= limit:
+                        return
+                    entry = self._entries[code]
+                    if search_priority(entry["code_norm"], entry["name_norm"], query) == bucket:
+                        results.append(code)
+
+            # 0: exact code, 1: code prefix
+            if query in self._entries:
+                results.append(query)
+            take(self._prefix_codes(query), 1)
+
+            # 2: code contains
+            if len(results) < limit:
+                take(self._candidates(self._code_grams, query), 2)
+
+            # 3: name prefix, 4: name contains (one sorted pass over the candidates)
+            if len(results) < limit:
+                name_prefix, name_contains = [], []
+                remaining = limit - len(results)
+                for code in self._candidates(self._name_grams, query):
+                    entry = self._entries[code]
+                    bucket = search_priority(entry["code_norm"], entry["name_norm"], query)
+                    if bucket == 3:
+                        name_prefix.append(code)
+                        if len(name_prefix) >= remaining:
+                            break
+                    elif bucket == 4 and len(name_contains) < remaining:
+                        name_contains.append(code)
+                results.extend((name_prefix + name_contains)[:remaining])
+
+            return [self._entries[code]["payload"] for code in results]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+search_index = SearchIndex()
+
+
+def search_index_stale(generation: int) -> bool:
+    """
+    Whether the index should be (re)built: on first use, and when the response cache
+    generation has moved (i.e. modules were written since the last build). Rebuilds are
+    spaced at least MIN_REBUILD_INTERVAL apart so a running pipeline doesn't cause a rebuild per search.
+
+    Without a shared cache tier the generation only moves for writes made in this process,
+    so the index is also rebuilt once it is MAX_AGE old, picking up other processes' writes.
+    """
+    age = time.monotonic() - search_index.built_at
+    stale = search_index.generation != generation or age >= MAX_AGE
+    return search_index.generation is None or (stale and age >= MIN_REBUILD_INTERVAL)
+
+
+def ensure_search_index(load_payloads: Callable[[], Iterable[Dict]], generation: int) -> SearchIndex:
+    """Build or rebuild the index if search_index_stale(), then return it."""
+    if search_index_stale(generation):
+        search_index.build(load_payloads(), generation)
+    return search_index
+
+
+def patch_search_index(module):
+    """Apply a module write made in this process to an already-built index."""
+    if search_index.generation is not None:
+        search_index.patch(search_payload(module))
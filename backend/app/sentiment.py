@@ -1,11 +1,25 @@
-import json
 import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from typing import Dict
+from datetime import timedelta
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import bindparam, func, not_, update
 from sqlalchemy.orm import Session
-from app.models import Module, Comment
+from app.database import SessionLocal
+from app.models import Module, Comment, now_sgt
+from app.module_status import has_sentiment_clause
+from app.llm import StreamInterrupted, dispatcher
+from app import sentiment_cache, summarisation
+from app.json_stream import IncompleteJson, InvalidJson, JsonStreamParser, Schema
+from app.prompts import PROMPT_VERSION, SCORE_FIELDS, SENTIMENT_SCHEMA, build_delta_prompt, build_prompt
+from app.cache import invalidate_response_cache
 import logging
 
 load_dotenv()
@@ -15,12 +29,141 @@ logger = logging.getLogger(__name__)
 # Configure Gemini
 MODEL_TYPE = 'gemini-2.5-flash-lite' # Find alternative models @ https://ai.google.dev/gemini-api/docs/models
 MAX_TOKENS = 5000
+CALL_TIMEOUT = float(os.getenv("SENTIMENT_CALL_TIMEOUT", "120"))  # seconds per Gemini call
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "max_output_tokens": MAX_TOKENS,
+    "response_mime_type": "application/json",
+    "candidate_count": 1,
+}
+STREAM_ATTEMPTS = int(os.getenv("SENTIMENT_STREAM_ATTEMPTS", "3"))  # calls per result before giving up on invalid output
+
+# Incremental updates (override via environment variables)
+DELTA_UPDATES = os.getenv("SENTIMENT_DELTA_UPDATES", "true").lower() == "true"
+DRIFT_THRESHOLD = float(os.getenv("SENTIMENT_DRIFT_THRESHOLD", "0.25"))  # share of reviews added/removed since the last full analysis
+FULL_REFRESH_DAYS = int(os.getenv("SENTIMENT_FULL_REFRESH_DAYS", "90"))  # recompute fully at least this often
+
+# Modules analysed at once by analyze_all_modules(); Gemini concurrency and quota are enforced by app.llm.
+# Each holds a DB connection while waiting on Gemini, so keep it within DB_POOL_SIZE + DB_MAX_OVERFLOW
+MODULE_WORKERS = int(os.getenv("SENTIMENT_MODULE_WORKERS", "8"))
+
+# Modules with this many reviews or fewer just show them (no scores)
+MAX_RAW_REVIEWS = 3
+
+# Local scorer: provisional scores from a model trained on earlier Gemini results (override via environment variables)
+LOCAL_PREPASS = os.getenv("SENTIMENT_LOCAL_PREPASS", "true").lower() == "true"   # fill in provisional scores before analyze_all_modules() calls Gemini
+LOCAL_VOCABULARY = int(os.getenv("SENTIMENT_LOCAL_VOCABULARY", "2000"))          # words and word pairs used as features
+LOCAL_MIN_DF = int(os.getenv("SENTIMENT_LOCAL_MIN_DF", "5"))                     # ... each in at least this many reviews
+LOCAL_MIN_TRAINING = int(os.getenv("SENTIMENT_LOCAL_MIN_TRAINING", "30"))        # analysed modules needed to train
+LOCAL_SCORER_TTL = int(os.getenv("SENTIMENT_LOCAL_SCORER_TTL", "3600"))          # seconds before the fallback scorer is retrained
+RIDGE_ALPHAS = (1.0, 10.0, 100.0, 1000.0, 10000.0)  # regularisation tried; the best on a held-out fifth of the modules is used
+
+def generate_json(prompt: str, config: Optional[Dict] = None, schema: Schema = SENTIMENT_SCHEMA) -> Dict:
+    """
+    One Gemini result as parsed JSON, validated against `schema` while it streams in.
+    `config` overrides GENERATION_CONFIG.
+    
+    Output that can't become valid (prose, a score written as a word, a score out of range)
+    is abandoned mid-stream and the call re-issued, up to STREAM_ATTEMPTS calls; output cut
+    off at max_output_tokens is re-issued with twice the budget. Fields that completed in any
+    attempt are kept: if the attempts run out but every required field was recovered, those
+    fields are returned.
+    
+    Goes through the shared dispatcher (rate limits, retries), so it is safe to call from many threads.
+    Raises InvalidJson if no usable result could be assembled.
+    """
+    config = {**GENERATION_CONFIG, **(config or {})}
+    recovered = {}
+    for attempt in range(1, STREAM_ATTEMPTS + 1):
+        parser = JsonStreamParser(schema)
+        usage = None
+        try:
+            _, usage = dispatcher.stream(MODEL_TYPE, prompt, config, CALL_TIMEOUT, parser.feed)
+            result = parser.close()
+            logger.debug(f"Gemini: first chunk {usage['first_chunk_seconds']:.2f}s, "
+                         f"model {usage['model_seconds']:.2f}s, parse {parser.parse_seconds * 1000:.1f}ms")
+            return result
+        except IncompleteJson as e:
+            problem = e
+            if usage and usage["finish_reason"] == "MAX_TOKENS":
+                config["max_output_tokens"] = config["max_output_tokens"] * 2
+        except (InvalidJson, StreamInterrupted) as e:
+            problem = e
+        recovered.update(parser.fields)
+        logger.warning(f"⚠️ Unusable Gemini output ({problem}), attempt {attempt}/{STREAM_ATTEMPTS}")
+    
+    missing = parser.missing(recovered)
+    if not missing:
+        logger.warning(f"⚠️ Using {len(recovered)} fields recovered from {STREAM_ATTEMPTS} incomplete responses")
+        return recovered
+    raise InvalidJson(f"no usable output after {STREAM_ATTEMPTS} attempts (missing {', '.join(missing)}): {problem}")
+
+
+def average_score(scores: Dict) -> float:
+    """Overall score from the four scores, to the nearest 0.5."""
+    # NOTE: Because workload/difficulty are negative vs usefulness/enjoyability are positive, take inverse score for workload/difficulty to calculate average sentiment score
+    average = (
+        (5 - scores.get("workload", 3)) +
+        (5 - scores.get("difficulty", 3)) +
+        scores.get("usefulness", 3) +
+        scores.get("enjoyability", 3)) / 4
+    # round up the average score to the nearest 0.5 increment
+    return round(average * 2) / 2
+
+
+def is_provisional(sentiment_data) -> bool:
+    """Local scores standing in until Gemini's analysis lands (see fill_provisional_sentiment())."""
+    return isinstance(sentiment_data, dict) and bool(sentiment_data.get("provisional"))
+
+
+def plan_analysis(module: Module, comments: List[Comment]) -> Tuple[str, List[Comment]]:
+    """
+    Decide whether the module's existing analysis can be updated with just the
+    comments scraped since last_analyzed, or must be recomputed from all comments:
+    full when there is no usable analysis, when the reviews added or removed since
+    the last full analysis exceed DRIFT_THRESHOLD of it, or when it is older than
+    FULL_REFRESH_DAYS.
+    
+    Returns:
+        ("delta", new comments) or ("full", [])
+    """
+    previous = module.sentiment_data or {}
+    if (not DELTA_UPDATES or not previous or previous.get("insufficient_data") or is_provisional(previous)
+            or module.last_analyzed is None or module.full_analysis_at is None
+            or not module.full_analysis_comment_count or module.analyzed_comment_count is None):
+        return "full", []
+    
+    # Upserts don't touch scraped_at, so this is exactly the comments inserted since then
+    new_comments = [c for c in comments if c.scraped_at and c.scraped_at > module.last_analyzed]
+    removed = max(module.analyzed_comment_count + len(new_comments) - len(comments), 0)
+    if not new_comments:
+        return "full", []  # only removals (or edits): nothing to fold in
+    
+    drift = (module.analyzed_comment_count - module.full_analysis_comment_count + len(new_comments) + removed) \
+        / module.full_analysis_comment_count
+    if drift > DRIFT_THRESHOLD:
+        logger.info(f"{module.code}: {drift:.0%} of reviews changed since the last full analysis, recomputing")
+        return "full", []
+    if now_sgt().replace(tzinfo=None) - module.full_analysis_at > timedelta(days=FULL_REFRESH_DAYS):
+        logger.info(f"{module.code}: last full analysis is over {FULL_REFRESH_DAYS} days old, recomputing")
+        return "full", []
+    return "delta", new_comments
+
+
+def _record_analysis(module: Module, started, comment_count: int, full: bool):
+    """Bookkeeping for plan_analysis(). `started` is taken before the comments were read."""
+    module.last_analyzed = started
+    module.analyzed_comment_count = comment_count
+    if full:
+        module.full_analysis_at = started
+        module.full_analysis_comment_count = comment_count
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
 def analyze_module_sentiment(db: Session, module_id: int) -> bool:
     """
     Analyze sentiment for a module using Gemini API.
+    If only a few reviews were added since the last analysis, they are folded into
+    the existing result instead of re-sending every review (see plan_analysis()).
     Returns True if successful, False otherwise.
     """
     module = db.query(Module).filter(Module.id == module_id).first()
@@ -28,10 +171,11 @@ def analyze_module_sentiment(db: Session, module_id: int) -> bool:
         logger.error(f"Module ID {module_id} not found")
         return False
     
-    comments = db.query(Comment).filter(Comment.module_id == module_id).all()
+    started = now_sgt()
+    comments = db.query(Comment).filter(Comment.module_id == module_id).order_by(Comment.id).all()
     
     # Handle ≤3 reviews case (insufficient data)
-    if len(comments) <= 3:
+    if len(comments) <= MAX_RAW_REVIEWS:
         logger.info(f"{module.code} has ≤3 reviews, storing raw comments")
         module.sentiment_data = {
             "insufficient_data": True,
@@ -45,128 +189,98 @@ def analyze_module_sentiment(db: Session, module_id: int) -> bool:
             ]
         }
         module.has_sufficient_reviews = False
+        _record_analysis(module, started, len(comments), full=True)
         db.commit()
+        invalidate_response_cache()
         return True
     
-    # Prepare comments for Gemini
-    comments_text = "\n\n---\n\n".join([
-        f"Comment {i+1} (Upvotes: {c.upvotes}, Date: {c.posted_date}):\n{c.text}"
-        for i, c in enumerate(comments)
-    ])
-    
-    # Construct prompt
-    prompt = f"""You are analyzing student reviews for the NUS module "{module.code} - {module.name}".
-
-Below are {len(comments)} student reviews from NUSMods. Analyze them and provide a comprehensive summary in JSON format. Use British English spelling and phrasing. The tone can be slightly informal, as if advising a friend, but still be clear, concise and instructional.
-
-IMPORTANT: If no advice is provided for any sub-category (e.g. if the midterm or practical is never mentioned), OMIT that field from the JSON entirely. Only include advice sections that are actually mentioned in the reviews. For each advice sub-category, synthesise the common themes across reviews into a concise summary that future students can easily understand and act on. Do NOT just copy-paste individual comments. The advice should provide actionable insights based on the reviews. Maximum length of each advice sub-category: 50 words.
-
-REVIEWS:
-{comments_text}
-
-TASK:
-Return ONLY valid JSON (no markdown, no preamble) with this structure:
-{{
-  "workload": <float 1-5, where 1=very light, 5=very heavy>,
-  "difficulty": <float 1-5, where 1=very easy, 5=very hard>,
-  "usefulness": <float 1-5, where 1=not useful, 5=extremely useful>,
-  "enjoyability": <float 1-5, where 1=not enjoyable, 5=very enjoyable>,
-  "summary": "<a concise synthesis of overall sentiment, around 100 words>",
-  "reasoning": "<a brief explanation of how you arrived at the scores, mentioning key themes from the reviews. each score should have its own concise one-sentence justification>",
-  "advice": {{
-    "general": "<synthesise general advice for future students, only if mentioned in reviews>",
-    "midterm": "<synthesise specific advice for midterm exam from different reviews (only if mentioned in reviews)>",
-    "final": "<similar to above (only if mentioned)>",
-    "practical": "<similar to above (only if mentioned)>",
-    "assignments": "<similar to above (only if mentioned)>",
-    "tutorial": "<similar to above (only if mentioned)>",
-    "recitation": "<similar to above (only if mentioned)>"
-  }},
-  "top_comment": {{
-      "text": <Reformat the comment text with proper line breaks. Add \\n between sentences or major points to improve readability. Keep the exact meaning but make it easier to read.>,
-      "upvotes": <number>,
-      "date": "<ISO date>",
-      "author": "<if mentioned, otherwise null>"
-    }},
-}}
-
-RULES:
-- Scores should reflect the AVERAGE sentiment, not extremes
-- Scores should be in whole numbers where possible, but can be in decimals (strictly 0.5 increments) to more accurately represent small differences between modules
-- Advice sections: only include if students actually mention that exam type
-- Summary should be a concise synthesis of overall sentiment, not just a generic statement. It should be one paragraph, around 100 words.
-- Advice should synthesise common themes across reviews, not just copy-paste individual comments. For example, if multiple students mention that the midterm is very difficult and covers obscure topics, the midterm advice could be: "The midterm is challenging, with questions that cover difficult topics such as [...] (fill this in). It's recommended to review lecture materials thoroughly and practice with past year papers to identify these tricky areas."
-- Advice should be presented in a way that future students can easily understand and act on, rather than just being a collection of quotes. It should provide actionable insights. Each advice section should be 3 sentences summarising the key points from the reviews, approximately 50 words.
-- Top comment: Select a singular comment that gives comprehensive advice. Choose one comment that is posted in the last 3 years to ensure relevance. If there are more recent comments claiming a change in module structure/content, prioritize those instead.
-- Return ONLY the JSON object, nothing else"""
+    # Reviews that don't fit one prompt are summarised in batches, then merged
+    prompt = build_prompt(module, comments)
+    map_reduce = summarisation.needs_map_reduce(prompt)
+    config = {**GENERATION_CONFIG, "map_reduce": summarisation.strategy_config()} if map_reduce else GENERATION_CONFIG
+    
+    # Identical comments + prompt + model config -> reuse the earlier result, no API call
+    key = sentiment_cache.cache_key(module, comments, PROMPT_VERSION, MODEL_TYPE, config)
+    cached = sentiment_cache.get_cached(db, key)
+    if cached is not None:
+        module.sentiment_data = cached
+        module.has_sufficient_reviews = True
+        _record_analysis(module, started, len(comments), full=True)
+        db.commit()
+        invalidate_response_cache()
+        logger.info(f"✅ {module.code} sentiment served from cache")
+        return True
+
+    mode, new_comments = plan_analysis(module, comments)
+    if mode == "delta":
+        delta_prompt = build_delta_prompt(module, module.sentiment_data, module.analyzed_comment_count, new_comments)
+        if summarisation.needs_map_reduce(delta_prompt):
+            mode = "full"
+        else:
+            logger.info(f"🔁 {module.code}: folding {len(new_comments)} new reviews into the existing analysis "
+                        f"(~{summarisation.estimate_tokens(delta_prompt)} prompt tokens instead of "
+                        f"~{summarisation.estimate_tokens(prompt)})")
 
     try:
-        # Call Gemini API
-        response = client.models.generate_content(
-            model=MODEL_TYPE,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-                max_output_tokens=MAX_TOKENS,
-                response_mime_type="application/json",
-                candidate_count=1,
-            )
-        )
-        
-        # Extract JSON from response
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith('```'):
-            lines = response_text.split('\n')
-            response_text = '\n'.join(lines[1:-1])
-        
-        # Parse JSON
-        try:
-            sentiment_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            # Likely because Gemini's response exceeded max tokens and got cut off, resulting in invalid JSON
-            # For now, do a manual fix
-            logger.error(f"FAILED: First parse attempt for {module.code}: {e}")
-            logger.error(f"Response was: {response_text[:500]}")
-            missing_braces = response_text.count('{') - response_text.count('}')
-            response_text = response_text + ('}' * missing_braces)
-            sentiment_data = json.loads(response_text)
+        if mode == "delta":
+            sentiment_data = generate_json(delta_prompt)
+        elif map_reduce:
+            sentiment_data = summarisation.map_reduce_analysis(module, comments, generate_json)
+        else:
+            sentiment_data = generate_json(prompt)
         
         # Calculate average score
-        # NOTE: Because workload/difficulty are negative vs usefulness/enjoyability are positive, take inverse score for workload/difficulty to calculate average sentiment score
-        average_score = (
-            (5 - sentiment_data.get("workload", 3)) +
-            (5 - sentiment_data.get("difficulty", 3)) +
-            sentiment_data.get("usefulness", 3) +
-            sentiment_data.get("enjoyability", 3)) / 4
-        # round up the average score to the nearest 0.5 increment
-        average_score = round(average_score * 2) / 2
-        sentiment_data["average"] = average_score
+        sentiment_data["average"] = average_score(sentiment_data)
         
-        # Store in database
+        # Store in database (and full analyses in the cache for identical future runs;
+        # a delta result also depends on the earlier analysis, so it isn't cached)
         module.sentiment_data = sentiment_data
         module.has_sufficient_reviews = True
+        _record_analysis(module, started, len(comments), full=mode == "full")
+        if mode == "full":
+            sentiment_cache.store(db, key, sentiment_data, PROMPT_VERSION, MODEL_TYPE)
         db.commit()
+        invalidate_response_cache()
         
         logger.info(f"✅ Successfully analyzed {module.code}")
         return True
         
-    except json.JSONDecodeError as e:
+    except InvalidJson as e:
         logger.error(f"Failed to parse JSON for {module.code}: {e}")
-        logger.error(f"Response was: {response_text[:500]}")
+        _provisional_fallback(db, module, comments)
         return False
     except Exception as e:
         logger.error(f"Error analyzing {module.code}: {e}")
+        _provisional_fallback(db, module, comments)
         return False
 
 
-def analyze_all_modules(db: Session) -> Dict[str, int]:
+def _analyze_in_session(module_id: int) -> Tuple[bool, bool]:
+    """analyze_module_sentiment() with its own session, for worker threads. Returns (success, sufficient reviews)."""
+    db = SessionLocal()
+    try:
+        success = analyze_module_sentiment(db, module_id)
+        module = db.query(Module).filter(Module.id == module_id).first()
+        return success, bool(module and module.has_sufficient_reviews)
+    finally:
+        db.close()
+
+
+def analyze_all_modules(db: Session, workers: int = MODULE_WORKERS) -> Dict[str, int]:
     """
-    Analyze all modules in database.
+    Analyze all modules in database, `workers` at a time.
+    First fills in provisional local scores for modules still waiting (see
+    fill_provisional_sentiment()), which Gemini's results then replace; a scorer
+    trained in the last LOCAL_SCORER_TTL seconds is reused.
     Returns dict with success/failure counts.
     """
-    modules = db.query(Module).all()
+    if LOCAL_PREPASS:
+        fill_provisional_sentiment(db, _fresh_scorer())
+    
+    comment_counts = dict(
+        db.query(Comment.module_id, func.count(Comment.id)).group_by(Comment.module_id).all()
+    )
+    modules = db.query(Module).order_by(Module.id).all()
     
     results = {
         "success": 0,
@@ -174,30 +288,348 @@ def analyze_all_modules(db: Session) -> Dict[str, int]:
         "insufficient_data": 0
     }
     
+    pending = []
     for module in modules:
-        logger.info(f"\n{'='*60}\nAnalyzing {module.code}\n{'='*60}")
-        
         # Check if already has sentiment data
-        if module.sentiment_data:
+        if module.sentiment_data and not is_provisional(module.sentiment_data):
             logger.info(f"{module.code} already has sentiment data, skipping")
             results["success"] += 1
             continue
         
         # Check comment count
-        comment_count = db.query(Comment).filter(Comment.module_id == module.id).count()
-        if comment_count == 0:
+        if comment_counts.get(module.id, 0) == 0:
             logger.info(f"{module.code} has no comments, skipping")
             continue
         
-        # Analyze
-        success = analyze_module_sentiment(db, module.id)
-        
-        if success:
-            if module.has_sufficient_reviews:
-                results["success"] += 1
+        pending.append(module.id)
+    
+    logger.info(f"Analyzing {len(pending)} modules, {workers} at a time")
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sentiment") as executor:
+        for success, sufficient in executor.map(_analyze_in_session, pending):
+            if success:
+                if sufficient:
+                    results["success"] += 1
+                else:
+                    results["insufficient_data"] += 1
             else:
-                results["insufficient_data"] += 1
-        else:
-            results["failed"] += 1
+                results["failed"] += 1
+    
+    return results
+
+
+# ============================================================================
+# LOCAL SCORER
+# ============================================================================
+
+_WORD = re.compile(r"[a-z][a-z']*")
+
+
+@dataclass
+class LocalScorer:
+    """
+    Ridge regression from review wording to the four scores, trained on the modules
+    Gemini has analysed. Each feature is a word or word pair's share of a review's words,
+    so `coef` doubles as a lexicon: how much each term moves each score.
+    """
+    vocabulary: Dict[str, int]
+    coef: np.ndarray          # (terms, 4), in SCORE_FIELDS order
+    intercept: np.ndarray     # (4,)
+    alpha: float
+    validation_mae: float     # mean absolute error per score on held-out modules, before refitting on all
+    trained_on: int           # modules
+    trained_at: float         # time.monotonic()
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Scores for rows of module features, clipped to 1-5 and rounded to the nearest 0.5."""
+        return np.clip(np.round((features @ self.coef + self.intercept) * 2) / 2, 1, 5)
+
+
+_scorer: Optional[LocalScorer] = None
+_scorer_lock = threading.Lock()
+# One training at a time: during a Gemini outage every failing worker wants a scorer at once
+_training_lock = threading.Lock()
+_training_failed_at: Optional[float] = None  # last time there were too few analysed modules to train
+
+
+def _terms(text: str) -> List[str]:
+    """Words and adjacent word pairs ("not hard" reads differently from "hard")."""
+    words = _WORD.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _review_weights(upvotes: np.ndarray, posted: np.ndarray) -> np.ndarray:
+    """
+    How much each review counts towards its module's scores: more for upvoted reviews
+    (log-scaled), halving every RECENCY_HALF_LIFE_DAYS of age, as for review sampling.
+    Reviews without a date count as one half-life old.
+    """
+    now = np.datetime64(now_sgt().replace(tzinfo=None), "s")
+    age_days = (now - posted) / np.timedelta64(1, "D")
+    age_days = np.where(np.isnat(posted), summarisation.RECENCY_HALF_LIFE_DAYS, np.maximum(age_days, 0))
+    return (1 + np.log1p(np.maximum(upvotes, 0))) * 0.5 ** (age_days / summarisation.RECENCY_HALF_LIFE_DAYS)
+
+
+def _module_features(vocabulary: Dict[str, int], terms: List[List[str]], rows: np.ndarray,
+                     weights: np.ndarray, modules: int) -> np.ndarray:
+    """
+    Weighted mean over each module's reviews of the reviews' term frequencies, as one
+    (modules, terms) matrix. rows[i] is the module row of review i.
+
+    The model is linear, so scoring every review with the lexicon and taking each module's
+    weighted mean is the same as applying it once to these features.
+    """
+    ids = [[vocabulary[t] for t in review if t in vocabulary] for review in terms]
+    counts = np.fromiter((len(i) for i in ids), dtype=np.int64, count=len(ids))
+    columns = np.fromiter(chain.from_iterable(ids), dtype=np.int64, count=int(counts.sum()))
+    review = np.repeat(np.arange(len(ids)), counts)
+
+    # Each occurrence adds the review's weight / its word count (words only, not pairs)
+    words = np.fromiter(((len(t) + 1) // 2 for t in terms), dtype=np.float64, count=len(terms))
+    occurrence = (weights / np.maximum(words, 1))[review]
+    vocabulary_size = len(vocabulary)
+    features = np.bincount(rows[review] * vocabulary_size + columns, weights=occurrence,
+                           minlength=modules * vocabulary_size).reshape(modules, vocabulary_size)
+    return features / np.maximum(np.bincount(rows, weights=weights, minlength=modules), 1e-12)[:, None]
+
+
+def _fit_ridge(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, float]:
+    """
+    Ridge regression on standardised features, with the strength picked from RIDGE_ALPHAS
+    on a held-out fifth of the rows, then refitted on all of them.
+    
+    Returns:
+        (coef, intercept) for the raw features, the chosen alpha, and its held-out MAE
+    """
+    mean = x.mean(axis=0)
+    scale = x.std(axis=0)
+    scale[scale == 0] = 1
+    z = (x - mean) / scale
+    
+    def solve(rows: np.ndarray, alpha: float) -> Tuple[np.ndarray, np.ndarray]:
+        zr, yr = z[rows], y[rows]
+        offset = yr.mean(axis=0)
+        coef = np.linalg.solve(zr.T @ zr + alpha * np.eye(z.shape[1]), zr.T @ (yr - offset))
+        return coef, offset
+    
+    order = np.random.default_rng(0).permutation(len(z))
+    held_out, train = order[:len(z) // 5], order[len(z) // 5:]
+    errors = {}
+    for alpha in RIDGE_ALPHAS:
+        coef, offset = solve(train, alpha)
+        errors[alpha] = float(np.abs(z[held_out] @ coef + offset - y[held_out]).mean())
+    alpha = min(errors, key=errors.get)
+    
+    coef, offset = solve(np.arange(len(z)), alpha)
+    coef = coef / scale[:, None]
+    return coef, offset - mean @ coef, alpha, errors[alpha]
+
+
+@dataclass
+class _Reviews:
+    """Every comment, as arrays; `rows` maps each comment to its module's index in `module_ids`."""
+    module_ids: np.ndarray
+    rows: np.ndarray
+    texts: List[str]
+    upvotes: np.ndarray
+    dates: list
+    weights: np.ndarray
+
+    def terms(self) -> List[List[str]]:
+        return [_terms(t) for t in self.texts]
+
+
+def _load_reviews(db: Session) -> _Reviews:
+    """Every comment in one query."""
+    comments = db.query(Comment.module_id, Comment.text, Comment.upvotes, Comment.posted_date).all()
+    module_of = np.fromiter((c.module_id for c in comments), dtype=np.int64, count=len(comments))
+    module_ids, rows = np.unique(module_of, return_inverse=True)
+    upvotes = np.fromiter((c.upvotes or 0 for c in comments), dtype=np.int64, count=len(comments))
+    dates = [c.posted_date for c in comments]
+    weights = _review_weights(upvotes, np.array(dates, dtype="datetime64[s]"))
+    return _Reviews(module_ids, rows.astype(np.int64), [c.text or "" for c in comments], upvotes, dates, weights)
+
+
+def _gemini_scores(db: Session) -> Dict[int, List[float]]:
+    """The four scores of every module with a (non-provisional) Gemini analysis."""
+    labels = {}
+    for module_id, data in db.query(Module.id, Module.sentiment_data).filter(has_sentiment_clause()):
+        if not isinstance(data, dict) or data.get("insufficient_data"):
+            continue
+        scores = [data.get(field) for field in SCORE_FIELDS]
+        if all(isinstance(score, (int, float)) and not isinstance(score, bool) for score in scores):
+            labels[module_id] = scores
+    return labels
+
+
+def train_local_scorer(db: Session, reviews: Optional[_Reviews] = None,
+                       terms: Optional[List[List[str]]] = None) -> Optional[LocalScorer]:
+    """
+    Train the local scorer on every module Gemini has analysed, and keep it for
+    local_scorer(). Returns None (and logs why) if fewer than LOCAL_MIN_TRAINING have been.
+    """
+    with _training_lock:
+        return _train_local_scorer(db, reviews, terms)
+
+
+def _train_local_scorer(db: Session, reviews: Optional[_Reviews],
+                        terms: Optional[List[List[str]]]) -> Optional[LocalScorer]:
+    global _scorer, _training_failed_at
+    started = time.monotonic()
+    reviews = reviews or _load_reviews(db)
+    terms = terms if terms is not None else reviews.terms()
+    labels = _gemini_scores(db)
+    labelled = np.flatnonzero(np.isin(reviews.module_ids, list(labels)))
+    if len(labelled) < LOCAL_MIN_TRAINING:
+        logger.warning(f"Local scorer needs {LOCAL_MIN_TRAINING} analysed modules to train, "
+                       f"only {len(labelled)} have reviews and scores")
+        _training_failed_at = time.monotonic()
+        return None
+    
+    # Vocabulary: the most common terms in the analysed modules' reviews
+    in_training = np.isin(reviews.rows, labelled)
+    training_terms = [t for t, keep in zip(terms, in_training) if keep]
+    frequency = Counter(chain.from_iterable(set(t) for t in training_terms))
+    common = [t for t, n in frequency.most_common(LOCAL_VOCABULARY) if n >= LOCAL_MIN_DF]
+    vocabulary = {t: i for i, t in enumerate(common)}
     
-    return results
\ No newline at end of file
+    x = _module_features(vocabulary, training_terms, np.searchsorted(labelled, reviews.rows[in_training]),
+                         reviews.weights[in_training], len(labelled))
+    y = np.array([labels[int(module_id)] for module_id in reviews.module_ids[labelled]], dtype=np.float64)
+    coef, intercept, alpha, mae = _fit_ridge(x, y)
+    
+    scorer = LocalScorer(vocabulary, coef, intercept, alpha, mae, len(labelled), time.monotonic())
+    with _scorer_lock:
+        _scorer = scorer
+    logger.info(f"🧮 Local scorer trained on {scorer.trained_on} modules in {time.monotonic() - started:.1f}s "
+                f"({len(vocabulary)} terms, alpha {alpha:g}, held-out MAE {mae:.2f})")
+    return scorer
+
+
+def _fresh_scorer() -> Optional[LocalScorer]:
+    """The last trained scorer, unless it is older than LOCAL_SCORER_TTL."""
+    with _scorer_lock:
+        scorer = _scorer
+    if scorer is None or time.monotonic() - scorer.trained_at > LOCAL_SCORER_TTL:
+        return None
+    return scorer
+
+
+def local_scorer(db: Session) -> Optional[LocalScorer]:
+    """
+    The last trained scorer, retrained first if missing or older than LOCAL_SCORER_TTL.
+    Concurrent callers wait for one training instead of each running their own, and a
+    failed training (too few analysed modules) isn't retried within LOCAL_SCORER_TTL.
+    """
+    scorer = _fresh_scorer()
+    if scorer is not None:
+        return scorer
+    with _training_lock:
+        # Another thread may have trained (or found it can't) while this one waited
+        scorer = _fresh_scorer()
+        if scorer is not None:
+            return scorer
+        if _training_failed_at is not None and time.monotonic() - _training_failed_at < LOCAL_SCORER_TTL:
+            return None
+        return _train_local_scorer(db, None, None)
+
+
+def _provisional_data(scores: np.ndarray, reviews: int, top_comment: Optional[Dict]) -> Dict:
+    """sentiment_data the frontend can show as-is until Gemini's analysis replaces it."""
+    data = {field: float(score) for field, score in zip(SCORE_FIELDS, scores)}
+    data["average"] = average_score(data)
+    data.update({
+        "summary": f"These scores are estimated from {reviews} reviews. The full summary will appear once they have been analysed.",
+        "reasoning": "",
+        "advice": {},
+        "top_comment": top_comment,
+        "provisional": True,
+    })
+    return data
+
+
+def _top_comment(text: str, upvotes: int, posted_date) -> Dict:
+    return {"text": text, "upvotes": int(upvotes or 0), "date": posted_date.isoformat() if posted_date else None, "author": None}
+
+
+def _store_provisional(db: Session, values: List[Dict]):
+    """Write provisional sentiment_data, skipping modules whose Gemini analysis landed in the meantime."""
+    table = Module.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .where(not_(has_sentiment_clause()))
+        .values(sentiment_data=bindparam("b_data"), has_sufficient_reviews=True)
+    )
+    db.execute(statement, values)
+    db.commit()
+    invalidate_response_cache()
+
+
+def fill_provisional_sentiment(db: Session, scorer: Optional[LocalScorer] = None) -> int:
+    """
+    Give every module with more than MAX_RAW_REVIEWS reviews but no Gemini analysis
+    provisional scores from the local scorer, in one pass over all comments: the
+    upvote- and recency-weighted mean of its reviews' lexicon scores, with its highest
+    weighted review as the top comment. Gemini's analysis replaces them when it lands.
+    
+    Trains the scorer first unless one is given. Returns the number of modules filled in.
+    """
+    started = time.monotonic()
+    reviews = _load_reviews(db)
+    terms = reviews.terms()
+    scorer = scorer or train_local_scorer(db, reviews, terms)
+    if scorer is None:
+        return 0
+    
+    # Modules waiting for Gemini, with enough reviews for scores
+    waiting = [module_id for (module_id,) in db.query(Module.id).filter(not_(has_sentiment_clause()))]
+    counts = np.bincount(reviews.rows, minlength=len(reviews.module_ids))
+    targets = np.flatnonzero(np.isin(reviews.module_ids, waiting) & (counts > MAX_RAW_REVIEWS))
+    if not len(targets):
+        return 0
+    
+    scoring = time.monotonic()
+    features = _module_features(scorer.vocabulary, terms, reviews.rows, reviews.weights, len(reviews.module_ids))
+    scores = scorer.predict(features[targets])
+    
+    # Top comment: the last review of each module once sorted by module, then weight
+    order = np.lexsort((reviews.weights, reviews.rows))
+    top = order[np.r_[np.flatnonzero(np.diff(reviews.rows[order])), len(order) - 1]]
+    top_of = dict(zip(reviews.rows[top].tolist(), top.tolist()))
+    scored = time.monotonic()
+    
+    values = []
+    for target, module_scores in zip(targets.tolist(), scores):
+        i = top_of[target]
+        top_comment = _top_comment(reviews.texts[i], reviews.upvotes[i], reviews.dates[i])
+        values.append({"b_id": int(reviews.module_ids[target]),
+                       "b_data": _provisional_data(module_scores, int(counts[target]), top_comment)})
+    _store_provisional(db, values)
+    
+    logger.info(f"🧮 Provisional scores for {len(values)} modules from {len(reviews.texts)} reviews: "
+                f"scored in {scored - scoring:.2f}s, {time.monotonic() - started:.1f}s in all")
+    return len(values)
+
+
+def _provisional_fallback(db: Session, module: Module, comments: List[Comment]):
+    """Gemini failed: give the module provisional local scores if it has no analysis at all."""
+    try:
+        db.rollback()
+        if (module.sentiment_data and not is_provisional(module.sentiment_data)) or len(comments) <= MAX_RAW_REVIEWS:
+            return
+        scorer = local_scorer(db)
+        if scorer is None:
+            return
+        texts = [c.text or "" for c in comments]
+        weights = _review_weights(np.array([c.upvotes or 0 for c in comments], dtype=np.float64),
+                                  np.array([c.posted_date for c in comments], dtype="datetime64[s]"))
+        features = _module_features(scorer.vocabulary, [_terms(t) for t in texts],
+                                    np.zeros(len(comments), dtype=np.int64), weights, 1)
+        top = comments[int(np.argmax(weights))]
+        top_comment = _top_comment(top.text, top.upvotes, top.posted_date)
+        _store_provisional(db, [{"b_id": module.id,
+                                 "b_data": _provisional_data(scorer.predict(features)[0], len(comments), top_comment)}])
+        logger.info(f"🧮 {module.code}: provisional local scores until Gemini's analysis succeeds")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Local scoring failed for {module.code}: {e}")
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.models import Module, Comment, SentimentCache, now_sgt
+
+logger = logging.getLogger(__name__)
+
+# Eviction policy (override via environment variables)
+MAX_ENTRIES = int(os.getenv("SENTIMENT_CACHE_MAX_ENTRIES", "5000"))  # least recently hit entries go first
+TTL_DAYS = int(os.getenv("SENTIMENT_CACHE_TTL_DAYS", "180"))         # entries not hit for this long are dropped
+
+# In-process counters, reset per process
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def cache_key(module: Module, comments: List[Comment], prompt_version: str, model: str, config: Dict) -> str:
+    """
+    Content address for one analysis: everything that goes into the prompt or the
+    model call. Comment order doesn't matter.
+    """
+    payload = {
+        "module": [module.code, module.name],
+        "comments": sorted(
+            ([c.text, c.upvotes or 0, c.posted_date.isoformat() if c.posted_date else None] for c in comments),
+            key=lambda row: (row[0], row[1], row[2] or ""),  # undated comments: None can't be compared with a date
+        ),
+        "prompt_version": prompt_version,
+        "model": model,
+        "config": config,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def get_cached(db: Session, key: str) -> Optional[Dict]:
+    """Return the cached sentiment_data for key, or None on a miss."""
+    entry = db.query(SentimentCache).filter(SentimentCache.key == key).first()
+    if entry is None:
+        _stats["misses"] += 1
+        return None
+
+    _stats["hits"] += 1
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_hit_at = now_sgt()
+    return entry.result
+
+
+def store(db: Session, key: str, result: Dict, prompt_version: str, model: str):
+    """Cache a parsed result (caller commits), then apply the eviction policy."""
+    entry = db.query(SentimentCache).filter(SentimentCache.key == key).first()
+    if entry is None:
+        entry = SentimentCache(key=key, model=model, prompt_version=prompt_version, result=result)
+        db.add(entry)
+    else:
+        entry.result = result
+        entry.last_hit_at = now_sgt()
+    _stats["stores"] += 1
+    db.flush()
+    evict(db)
+
+
+def evict(db: Session) -> int:
+    """Drop expired entries, then the least recently hit ones beyond MAX_ENTRIES."""
+    evicted = db.query(SentimentCache).filter(
+        SentimentCache.last_hit_at < now_sgt() - timedelta(days=TTL_DAYS)
+    ).delete(synchronize_session=False)
+
+    overflow = db.query(SentimentCache).count() - MAX_ENTRIES
+    if overflow > 0:
+        stale_keys = [
+            key for (key,) in db.query(SentimentCache.key)
+            .order_by(SentimentCache.last_hit_at.asc())
+            .limit(overflow)
+        ]
+        evicted += db.query(SentimentCache).filter(
+            SentimentCache.key.in_(stale_keys)
+        ).delete(synchronize_session=False)
+
+    if evicted:
+        logger.info(f"Evicted {evicted} sentiment cache entries")
+        _stats["evictions"] += evicted
+    return evicted
+
+
+def cache_stats() -> Dict[str, float]:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {**_stats, "hit_ratio": round(_stats["hits"] / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.models import Module, Comment, now_sgt
+from app.json_stream import Schema
+from app.prompts import (
+    COMMENT_SEPARATOR, MAP_REDUCE_PROMPT_VERSION, MAP_SCHEMA, SCORE_FIELDS, SENTIMENT_SCHEMA,
+    build_map_prompt, build_reduce_prompt, format_comment,
+)
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Token budgeting (override via environment variables)
+CHARS_PER_TOKEN = float(os.getenv("SENTIMENT_CHARS_PER_TOKEN", "4"))        # rough estimate for English text
+INPUT_TOKEN_BUDGET = int(os.getenv("SENTIMENT_INPUT_TOKENS", "8000"))       # max prompt size per Gemini call
+MAX_CHUNKS = int(os.getenv("SENTIMENT_MAX_CHUNKS", "8"))                    # map calls per module; beyond this, reviews are sampled
+MAP_WORKERS = int(os.getenv("SENTIMENT_MAP_WORKERS", "8"))                  # map calls in flight per module
+MAP_MAX_TOKENS = int(os.getenv("SENTIMENT_MAP_OUTPUT_TOKENS", "1024"))      # output budget for one batch summary
+CANDIDATE_CHARS = int(os.getenv("SENTIMENT_CANDIDATE_CHARS", "4000"))       # top comment candidates are cut to this for the reduce step
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("SENTIMENT_RECENCY_HALF_LIFE_DAYS", "730"))  # for sampling reviews
+
+# (prompt, generation config overrides, expected schema) -> parsed JSON; supplied by app.sentiment
+GenerateJson = Callable[[str, Optional[Dict], Schema], Dict]
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _comment_tokens(number: int, comment: Comment, max_chars: int) -> int:
+    return estimate_tokens(format_comment(number, comment, max_chars) + COMMENT_SEPARATOR)
+
+
+def strategy_config() -> Dict:
+    """Everything that shapes a map-reduce analysis, for the sentiment cache key."""
+    return {
+        "prompt_version": MAP_REDUCE_PROMPT_VERSION,
+        "input_tokens": INPUT_TOKEN_BUDGET,
+        "max_chunks": MAX_CHUNKS,
+        "map_output_tokens": MAP_MAX_TOKENS,
+    }
+
+
+# ============================================================================
+# CHUNKING
+# ============================================================================
+
+def _priority(comment: Comment, now) -> float:
+    """Upvotes (log-scaled) plus a recency bonus that halves every RECENCY_HALF_LIFE_DAYS."""
+    score = math.log1p(max(comment.upvotes or 0, 0))
+    if comment.posted_date:
+        age_days = max((now - comment.posted_date).days, 0)
+        score += 2 * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+    return score
+
+
+def select_comments(comments: List[Comment], capacity_tokens: int, max_comment_chars: int) -> List[Comment]:
+    """
+    Comments to analyse: all of them if they fit in `capacity_tokens`, otherwise the
+    most upvoted and recent ones that do. Keeps the original order.
+    """
+    sizes = [_comment_tokens(i + 1, c, max_comment_chars) for i, c in enumerate(comments)]
+    if sum(sizes) <= capacity_tokens:
+        return comments
+
+    now = now_sgt().replace(tzinfo=None)
+    ranked = sorted(range(len(comments)), key=lambda i: _priority(comments[i], now), reverse=True)
+    keep, used = set(), 0
+    for i in ranked:
+        if used + sizes[i] <= capacity_tokens:
+            keep.add(i)
+            used += sizes[i]
+    return [c for i, c in enumerate(comments) if i in keep]
+
+
+def chunk_comments(comments: List[Comment], chunk_tokens: int, max_comment_chars: int) -> List[List[Tuple[Comment, str]]]:
+    """Pack formatted comments greedily into chunks of at most `chunk_tokens` (numbered across chunks)."""
+    chunks, current, used = [], [], 0
+    for i, c in enumerate(comments):
+        text = format_comment(i + 1, c, max_comment_chars)
+        size = _comment_tokens(i + 1, c, max_comment_chars)
+        if current and used + size > chunk_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append((c, text))
+        used += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _date_range(batch: List[Tuple[Comment, str]]) -> str:
+    dates = sorted(c.posted_date.date().isoformat() for c, _ in batch if c.posted_date)
+    return f"{dates[0]} to {dates[-1]}" if dates else "dates unknown"
+
+
+def weighted_scores(partials: List[Tuple[Dict, int, str]]) -> Dict[str, float]:
+    """Review-weighted mean of each score over the batch summaries, to the nearest 0.5."""
+    scores = {}
+    for field in SCORE_FIELDS:
+        pairs = [(p[field], n) for p, n, _ in partials if isinstance(p.get(field), (int, float))]
+        weight = sum(n for _, n in pairs)
+        if weight:
+            scores[field] = round(sum(s * n for s, n in pairs) / weight * 2) / 2
+    return scores
+
+
+# ============================================================================
+# MAP-REDUCE
+# ============================================================================
+
+def needs_map_reduce(prompt: str) -> bool:
+    return estimate_tokens(prompt) > INPUT_TOKEN_BUDGET
+
+
+def map_reduce_analysis(module: Module, comments: List[Comment], generate: GenerateJson) -> Dict:
+    """
+    Analyse a module whose single prompt would exceed INPUT_TOKEN_BUDGET:
+    split the reviews into at most MAX_CHUNKS batches that each fit the budget,
+    summarise the batches in parallel (map), then merge the summaries into the
+    final sentiment_data (reduce).
+
+    Latency is bounded by one wave of map calls (MAX_CHUNKS <= MAP_WORKERS) plus one
+    reduce call, however many reviews there are: past MAX_CHUNKS batches' worth, only
+    the most upvoted and recent reviews are used.
+
+    Returns the parsed sentiment_data (without "average"). Raises if any call fails.
+    """
+    started = time.monotonic()
+    overhead = estimate_tokens(build_map_prompt(module, [], 1, 1, len(comments)))
+    chunk_tokens = INPUT_TOKEN_BUDGET - overhead
+    max_comment_chars = int(chunk_tokens * CHARS_PER_TOKEN * 0.9)  # one very long review still fits a batch
+
+    capacity = chunk_tokens * MAX_CHUNKS
+    while True:
+        selected = select_comments(comments, capacity, max_comment_chars)
+        chunks = chunk_comments(selected, chunk_tokens, max_comment_chars)
+        if len(chunks) <= MAX_CHUNKS:
+            break
+        capacity = int(capacity * 0.95)  # greedy packing leaves gaps; select a little less
+    logger.info(f"🧩 {module.code}: {len(comments)} reviews → {len(selected)} analysed in {len(chunks)} batches")
+
+    def summarise(numbered: Tuple[int, List[Tuple[Comment, str]]]) -> Dict:
+        number, batch = numbered
+        prompt = build_map_prompt(module, [text for _, text in batch], number + 1, len(chunks), len(comments))
+        return generate(prompt, {"max_output_tokens": MAP_MAX_TOKENS}, MAP_SCHEMA)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(MAP_WORKERS, len(chunks)))) as executor:
+        results = list(executor.map(summarise, enumerate(chunks)))
+    mapped = time.monotonic()
+
+    # The map step names its top comment by number; hand the reduce step the actual text
+    numbers = {id(c): i + 1 for i, c in enumerate(selected)}
+    partials, candidates = [], []
+    for result, batch in zip(results, chunks):
+        partials.append((result, len(batch), _date_range(batch)))
+        pick = result.get("top_comment")
+        for c, _ in batch:
+            if pick is not None and str(numbers[id(c)]) == str(pick):
+                candidates.append((c, format_comment(numbers[id(c)], c, CANDIDATE_CHARS)))
+
+    scores = weighted_scores(partials)
+    prompt = build_reduce_prompt(module, partials, scores, [text for _, text in candidates], len(comments), len(selected))
+    # Too many long candidates: keep the highest priority ones that fit
+    now = now_sgt().replace(tzinfo=None)
+    candidates.sort(key=lambda item: _priority(item[0], now), reverse=True)
+    while len(candidates) > 1 and estimate_tokens(prompt) > INPUT_TOKEN_BUDGET:
+        candidates.pop()
+        prompt = build_reduce_prompt(module, partials, scores, [text for _, text in candidates], len(comments), len(selected))
+
+    sentiment_data = generate(prompt, None, SENTIMENT_SCHEMA)
+    logger.info(f"🧩 {module.code}: map {mapped - started:.1f}s ({len(chunks)} calls), "
+                f"reduce {time.monotonic() - mapped:.1f}s")
+    return sentiment_data
@@ -0,0 +1,446 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from collections import Counter
+from datetime import timedelta
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import ModuleWork
+from app.async_scraper import HostLimiter, HOST_CONCURRENCY, HOST_MIN_INTERVAL
+from app.async_pipeline import PIPELINE_CONCURRENCY, run_modules
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Work queue configuration (override via environment variables)
+LEASE_SECONDS = float(os.getenv("WORK_LEASE_SECONDS", "300"))           # a claim lapses unless heartbeated within this
+HEARTBEAT_INTERVAL = float(os.getenv("WORK_HEARTBEAT_SECONDS", "60"))   # seconds between lease extensions
+MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", "3"))                 # claims before a module is marked failed
+CLAIM_BATCH = int(os.getenv("WORK_CLAIM_BATCH", "16"))                  # modules claimed per round trip
+POLL_INTERVAL = float(os.getenv("WORK_POLL_SECONDS", "10"))             # idle wait when the queue is empty
+SHARE_HOST_LIMITS = os.getenv("WORK_SHARE_HOST_LIMITS", "true").lower() == "true"  # SCRAPER_HOST_* are fleet-wide
+SHARE_REFRESH_INTERVAL = float(os.getenv("WORK_SHARE_REFRESH_SECONDS", "10"))  # seconds between recounts of the fleet
+
+# Processes a batch of modules, reporting each outcome through the progress callback
+BatchProcessor = Callable[..., Awaitable[Dict]]
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _lease_expiry():
+    # Database clock, so workers on different machines agree on expiry
+    return func.now() + timedelta(seconds=LEASE_SECONDS)
+
+
+# ============================================================================
+# QUEUE OPERATIONS
+# ============================================================================
+
+def enqueue_modules(db: Session, module_codes: Iterable[str], priority: int = 0, requeue: bool = False) -> int:
+    """
+    Add modules to the queue. Modules already queued are left alone; with `requeue`,
+    finished (done/failed) ones are reset to pending.
+    Returns the number of modules that became pending.
+    """
+    rows = [{"code": code, "status": "pending", "priority": priority, "attempts": 0}
+            for code in dict.fromkeys(module_codes)]
+    if not rows:
+        return 0
+
+    stmt = insert(ModuleWork)
+    if requeue:
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["code"],
+            set_={"status": "pending", "priority": excluded.priority, "attempts": 0, "lease_owner": None,
+                  "lease_expires_at": None, "last_error": None, "finished_at": None, "enqueued_at": func.now()},
+            where=ModuleWork.status.in_(["done", "failed"]),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=["code"])
+    queued = len(db.scalars(stmt.returning(ModuleWork.id), rows).all())
+    db.commit()
+    logger.info(f"📥 Queued {queued} of {len(rows)} modules")
+    return queued
+
+
+def claim_modules(db: Session, worker_id: str, limit: int = CLAIM_BATCH) -> List[str]:
+    """
+    Lease up to `limit` pending modules (or modules whose lease expired) to this worker.
+    SKIP LOCKED lets concurrent workers claim disjoint rows without waiting on each other.
+    Returns the claimed codes, highest priority first.
+    """
+    # Leases that lapsed too often (the module keeps killing its worker) are given up on
+    db.execute(
+        update(ModuleWork)
+        .where(ModuleWork.status == "leased", ModuleWork.lease_expires_at < func.now(),
+               ModuleWork.attempts >= MAX_ATTEMPTS)
+        .values(status="failed", lease_owner=None, finished_at=func.now(),
+                last_error=f"lease expired {MAX_ATTEMPTS} times")
+    )
+
+    claimable = (
+        select(ModuleWork.id)
+        .where(or_(
+            ModuleWork.status == "pending",
+            and_(ModuleWork.status == "leased", ModuleWork.lease_expires_at < func.now()),
+        ))
+        .order_by(ModuleWork.priority.desc(), ModuleWork.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(ModuleWork)
+        .where(ModuleWork.id.in_(claimable.scalar_subquery()))
+        .values(status="leased", lease_owner=worker_id, lease_expires_at=_lease_expiry(),
+                attempts=ModuleWork.attempts + 1)
+        .returning(ModuleWork.code, ModuleWork.priority, ModuleWork.id)
+    ).all()
+    db.commit()
+    return [code for code, _, _ in sorted(rows, key=lambda r: (-r[1], r[2]))]
+
+
+def extend_leases(db: Session, worker_id: str, module_codes: Iterable[str]) -> Set[str]:
+    """Heartbeat: push back the expiry of this worker's leases. Returns the codes it still holds."""
+    module_codes = list(module_codes)
+    if not module_codes:
+        return set()
+    held = db.scalars(
+        update(ModuleWork)
+        .where(ModuleWork.code.in_(module_codes), ModuleWork.status == "leased",
+               ModuleWork.lease_owner == worker_id)
+        .values(lease_expires_at=_lease_expiry())
+        .returning(ModuleWork.code)
+    ).all()
+    db.commit()
+    return set(held)
+
+
+def complete_module(db: Session, worker_id: str, module_code: str, success: bool,
+                    stage: Optional[str] = None, error: Optional[str] = None) -> bool:
+    """
+    Record a module's outcome. A failed module goes back to pending until it has used
+    MAX_ATTEMPTS claims. Ignored if the lease was lost (another worker reclaimed it).
+    Returns True if recorded.
+    """
+    if success:
+        status, finished_at = "done", func.now()
+    else:
+        status = case((ModuleWork.attempts >= MAX_ATTEMPTS, "failed"), else_="pending")
+        finished_at = case((ModuleWork.attempts >= MAX_ATTEMPTS, func.now()), else_=None)
+    recorded = db.execute(
+        update(ModuleWork)
+        .where(ModuleWork.code == module_code, ModuleWork.status == "leased",
+               ModuleWork.lease_owner == worker_id)
+        .values(status=status, finished_at=finished_at, lease_owner=None, lease_expires_at=None,
+                outcome_stage=stage, last_error=error)
+    ).rowcount
+    db.commit()
+    return bool(recorded)
+
+
+def release_modules(db: Session, worker_id: str, module_codes: Iterable[str], error: Optional[str] = None) -> int:
+    """Hand unfinished leases back (shutdown, crash in the batch) so other workers can claim them."""
+    module_codes = list(module_codes)
+    if not module_codes:
+        return 0
+    released = db.execute(
+        update(ModuleWork)
+        .where(ModuleWork.code.in_(module_codes), ModuleWork.status == "leased",
+               ModuleWork.lease_owner == worker_id)
+        .values(status=case((ModuleWork.attempts >= MAX_ATTEMPTS, "failed"), else_="pending"),
+                lease_owner=None, lease_expires_at=None, last_error=error)
+    ).rowcount
+    db.commit()
+    return released
+
+
+def active_workers(db: Session) -> int:
+    """Workers currently holding an unexpired lease."""
+    return db.query(func.count(func.distinct(ModuleWork.lease_owner))).filter(
+        ModuleWork.status == "leased", ModuleWork.lease_expires_at >= func.now(),
+    ).scalar() or 0
+
+
+def queue_stats(db: Session) -> Dict:
+    """
+    Returns:
+        {"pending": n, "leased": n, "done": n, "failed": n, "expired_leases": n, "active_workers": n}
+    """
+    stats = {status: 0 for status in ("pending", "leased", "done", "failed")}
+    stats.update(dict(db.query(ModuleWork.status, func.count(ModuleWork.id)).group_by(ModuleWork.status).all()))
+    stats["expired_leases"] = db.query(func.count(ModuleWork.id)).filter(
+        ModuleWork.status == "leased", ModuleWork.lease_expires_at < func.now(),
+    ).scalar()
+    stats["active_workers"] = active_workers(db)
+    return stats
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+def _share_host_limits(limiter: HostLimiter, workers: int):
+    """
+    Set this worker's share of the per-host politeness limits, so the fleet as a whole
+    stays within them. Approximate: `workers` counts lease holders, refreshed every
+    SHARE_REFRESH_INTERVAL, so workers that start or stop in between are only counted
+    at the next refresh.
+    """
+    workers = max(1, workers)
+    limiter.concurrency = max(1, HOST_CONCURRENCY // workers)
+    limiter.min_interval = HOST_MIN_INTERVAL * workers
+
+
+def _run_batch(worker_id: str, module_codes: List[str], concurrency: int, process: BatchProcessor) -> Counter:
+    """
+    Process one claimed batch, recording each module as it finishes and heartbeating the rest.
+    Outcomes are written by a writer thread: the progress callback runs on the pipeline's event loop.
+    """
+    held = set(module_codes)
+    stage_of: Dict[str, str] = {}
+    lock = threading.Lock()
+    outcomes: "queue.Queue[Optional[Tuple[str, str, Optional[str]]]]" = queue.Queue()
+    stop_background = threading.Event()
+    totals = Counter()
+    limiter = HostLimiter() if SHARE_HOST_LIMITS else None
+
+    def progress(code: str, event: str):
+        with lock:
+            if event not in ("success", "failed", "skipped"):
+                stage_of[code] = event
+                return
+            stage = stage_of.get(code)
+        outcomes.put((code, event, stage))
+
+    def write_outcomes():
+        db = SessionLocal()
+        try:
+            while True:
+                item = outcomes.get()
+                if item is None:
+                    return
+                code, event, stage = item
+                try:
+                    if event == "skipped":
+                        release_modules(db, worker_id, [code])
+                    else:
+                        totals[event] += 1
+                        error = None if event == "success" else f"failed in {stage or 'fetch'}"
+                        if not complete_module(db, worker_id, code, event == "success", stage, error):
+                            totals["lost"] += 1
+                            logger.warning(f"⚠️  Lease on {code} was lost before it finished; outcome not recorded")
+                except Exception as e:
+                    # Still held, so the batch's cleanup releases it
+                    db.rollback()
+                    logger.warning(f"Could not record {event} for {code}: {e}")
+                    continue
+                with lock:
+                    held.discard(code)
+        finally:
+            db.close()
+
+    def heartbeat():
+        while not stop_background.wait(HEARTBEAT_INTERVAL):
+            with lock:
+                codes = set(held)
+            db = SessionLocal()
+            try:
+                extended = extend_leases(db, worker_id, codes)
+                with lock:
+                    lost = (codes - extended) & held  # not just recorded by the writer meanwhile
+                if lost:
+                    logger.warning(f"⚠️  Lost leases on {sorted(lost)} (expired and reclaimed by another worker)")
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Lease heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    def refresh_share():
+        while True:
+            db = SessionLocal()
+            try:
+                _share_host_limits(limiter, active_workers(db))
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Could not count active workers: {e}")
+            finally:
+                db.close()
+            if stop_background.wait(SHARE_REFRESH_INTERVAL):
+                return
+
+    writer = threading.Thread(target=write_outcomes, name=f"work-outcomes-{worker_id}", daemon=True)
+    writer.start()
+    threading.Thread(target=heartbeat, name=f"work-heartbeat-{worker_id}", daemon=True).start()
+    if limiter is not None:
+        threading.Thread(target=refresh_share, name=f"work-share-{worker_id}", daemon=True).start()
+    error = None
+    try:
+        asyncio.run(process(module_codes, concurrency, progress=progress, limiter=limiter))
+    except BaseException as e:
+        error = f"worker stopped: {type(e).__name__}: {e}"
+        raise
+    finally:
+        stop_background.set()
+        outcomes.put(None)
+        writer.join()  # every reported outcome is recorded before the rest is released
+        with lock:
+            unfinished = set(held)
+        if unfinished:
+            db = SessionLocal()
+            try:
+                released = release_modules(db, worker_id, unfinished, error)
+                logger.info(f"↩️  Released {released} unfinished modules back to the queue")
+            finally:
+                db.close()
+    return totals
+
+
+def run_worker(worker_id: Optional[str] = None, concurrency: int = PIPELINE_CONCURRENCY,
+               batch_size: int = CLAIM_BATCH, drain: bool = False,
+               stop: Optional[threading.Event] = None, process: BatchProcessor = run_modules) -> Dict[str, int]:
+    """
+    Claim and process batches until `stop` is set, or (with `drain`) until no work is left.
+    Several workers, in one or many processes/machines, can share the queue.
+
+    Returns:
+        {"success": n, "failed": n, "lost": n, "batches": n}
+    """
+    worker_id = worker_id or default_worker_id()
+    stop = stop or threading.Event()
+    totals = Counter()
+    logger.info(f"👷 Worker {worker_id} started (concurrency={concurrency}, batch={batch_size})")
+
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            codes = claim_modules(db, worker_id, batch_size)
+            if not codes:
+                stats = queue_stats(db)
+        finally:
+            db.close()
+
+        if not codes:
+            # Leased modules may still come back (expired or released), so only stop when none are out
+            if drain and stats["pending"] == 0 and stats["leased"] == 0:
+                break
+            stop.wait(POLL_INTERVAL)
+            continue
+
+        logger.info(f"👷 {worker_id} claimed {len(codes)} modules")
+        totals += _run_batch(worker_id, codes, concurrency, process)
+        totals["batches"] += 1
+
+    logger.info(f"👷 Worker {worker_id} stopped: {dict(totals)}")
+    return {key: totals[key] for key in ("success", "failed", "lost", "batches")}
+
+
+def _worker_process(index: int, options: Dict):
+    logging.basicConfig(level=logging.INFO)
+    stop = threading.Event()
+
+    def on_signal(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt  # Second signal: abandon the batch (leases are released)
+        logger.info(f"Stopping after the current batch (signal again to abort it)")
+        stop.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    try:
+        run_worker(f"{default_worker_id()}/{index}", stop=stop, **options)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(count: int, **options) -> List[multiprocessing.Process]:
+    """Start `count` worker processes (fresh interpreters, so none inherit DB connections)."""
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_worker_process, args=(i, options), name=f"module-worker-{i}")
+               for i in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Distribute the pipeline across worker processes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="add modules to the queue")
+    source = enqueue.add_mutually_exclusive_group(required=True)
+    source.add_argument("--codes", nargs="+", help="explicit module codes")
+    source.add_argument("--catalogue", action="store_true", help="every module in the NUSMods catalogue")
+    source.add_argument("--plan", action="store_true", help="modules the nightly run would process")
+    enqueue.add_argument("--priority", type=int, default=0)
+    enqueue.add_argument("--requeue", action="store_true", help="reset done/failed modules to pending")
+
+    work = commands.add_parser("work", help="run worker processes")
+    work.add_argument("-n", "--workers", type=int, default=1, help="worker processes on this machine")
+    work.add_argument("--concurrency", type=int, default=PIPELINE_CONCURRENCY, help="browser fetches per worker")
+    work.add_argument("--batch-size", type=int, default=CLAIM_BATCH)
+    work.add_argument("--drain", action="store_true", help="exit once the queue is empty")
+
+    commands.add_parser("status", help="show queue counts")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        db = SessionLocal()
+        try:
+            if args.catalogue:
+                from app.metadata import ingest_metadata
+                report = ingest_metadata(db)
+                if not report["available"]:
+                    logger.error("❌ NUSMods catalogue unavailable")
+                    sys.exit(1)
+                codes = sorted(report["found"])
+            elif args.plan:
+                from app.pipeline import plan_pipeline_run
+                codes, _ = plan_pipeline_run(db)
+            else:
+                codes = [code.strip().upper() for code in args.codes]
+            enqueue_modules(db, codes, args.priority, args.requeue)
+        finally:
+            db.close()
+
+    elif args.command == "work":
+        options = {"concurrency": args.concurrency, "batch_size": args.batch_size, "drain": args.drain}
+        if args.workers == 1:
+            _worker_process(0, options)
+        else:
+            workers = start_workers(args.workers, **options)
+            # Ctrl-C reaches the whole process group; SIGTERM is passed on. Workers finish their batch and exit
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda signum, frame: [w.terminate() for w in workers])
+            for worker in workers:
+                worker.join()
+
+    db = SessionLocal()
+    try:
+        print(json.dumps(queue_stats(db), indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
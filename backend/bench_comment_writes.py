@@ -0,0 +1,90 @@
+import sys
+import time
+from datetime import datetime, timedelta
+from app.database import SessionLocal
+from app.models import Module, Comment, now_sgt
+from app.bulk import insert_comment_rows_core, copy_comment_rows
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCH_MODULE = "BENCH0000"  # Scratch module, deleted afterwards
+SIZES = [10_000, 100_000]
+
+
+def make_rows(module_id: int, n: int):
+    """Synthetic comments shaped like sync_module_comments() rows."""
+    start = datetime(2024, 1, 1)
+    scraped_at = now_sgt()
+    return [
+        {
+            "module_id": module_id,
+            "external_id": str(10_000_000 + i),
+            "text": f"Synthetic review {i}. Workload was fine, the midterm was hard, start assignments early.",
+            "posted_date": start - timedelta(hours=i),
+            "upvotes": i % 37,
+            "scraped_at": scraped_at,
+        }
+        for i in range(n)
+    ]
+
+
+def write_orm(db, rows):
+    db.add_all([Comment(**row) for row in rows])
+
+
+def write_core(db, rows):
+    insert_comment_rows_core(db, rows, upsert=False)
+
+
+def write_copy(db, rows):
+    copy_comment_rows(db, rows, upsert=False)
+
+
+METHODS = {"orm": write_orm, "core": write_core, "copy": write_copy}
+
+
+def run_benchmark(sizes=SIZES):
+    """
+    Time ORM add_all vs Core batched INSERT vs COPY FROM STDIN on synthetic comments.
+    Needs DATABASE_URL pointing at a PostgreSQL database with the current schema.
+    """
+    db = SessionLocal()
+    module = Module(code=BENCH_MODULE, name="Bulk write benchmark")
+    db.add(module)
+    db.commit()
+    
+    results = []
+    try:
+        for n in sizes:
+            rows = make_rows(module.id, n)
+            for name, write in METHODS.items():
+                db.query(Comment).filter(Comment.module_id == module.id).delete()
+                db.commit()
+                
+                started = time.perf_counter()
+                write(db, rows)
+                db.commit()
+                elapsed = time.perf_counter() - started
+                
+                results.append((n, name, elapsed))
+                logger.info(f"{name:5} {n:>7} rows: {elapsed:7.2f}s ({n / elapsed:,.0f} rows/s)")
+    finally:
+        db.query(Comment).filter(Comment.module_id == module.id).delete()
+        db.query(Module).filter(Module.id == module.id).delete()
+        db.commit()
+        db.close()
+    
+    print("\n" + "="*60)
+    print("BULK WRITE BENCHMARK")
+    print("="*60)
+    print(f"{'rows':>8}  {'method':6} {'seconds':>8} {'rows/s':>10}")
+    for n, name, elapsed in results:
+        print(f"{n:>8}  {name:6} {elapsed:8.2f} {n / elapsed:10,.0f}")
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    run_benchmark(sizes)
@@ -0,0 +1,79 @@
+"""
+Exercises app/llm.py against the local Gemini stand-in (fixtures/gemini_mock_server.py):
+serial calls (the old behaviour, timed on a sample) vs the dispatcher, and the dispatcher
+recovering from 429s when its limits are set above the server's quota.
+
+    python bench_llm_dispatch.py
+    python bench_llm_dispatch.py --prompts 600 --latency 2 --server-rpm 300
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+import argparse
+import os
+import sys
+import time
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures"))
+import gemini_mock_server
+
+from app.llm import GeminiDispatcher
+
+PORT = 8767
+MODEL = "gemini-2.5-flash-lite"
+CONFIG = {"temperature": 0.7, "max_output_tokens": 1024, "response_mime_type": "application/json"}
+
+
+def run(dispatcher: GeminiDispatcher, prompts: int, threads: int) -> Tuple[float, int]:
+    """Returns (seconds, requests that failed after all retries)."""
+    prompt = "Summarise these reviews. " + "The tutorials were hard but useful. " * 300  # ~2.7k tokens
+
+    def call(_) -> bool:
+        try:
+            dispatcher.generate(MODEL, prompt, CONFIG, 30)
+            return True
+        except Exception:
+            return False
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        failed = sum(1 for ok in executor.map(call, range(prompts)) if not ok)
+    return time.monotonic() - started, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=240)
+    parser.add_argument("--serial-sample", type=int, default=20, help="prompts timed for the serial baseline")
+    parser.add_argument("--latency", type=float, default=1.0, help="mock seconds per response")
+    parser.add_argument("--server-rpm", type=int, default=120)
+    parser.add_argument("--server-tpm", type=int, default=1_000_000)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "mock")
+    base_url = f"http://127.0.0.1:{PORT}"
+    gemini_mock_server.serve(PORT, args.server_rpm, args.server_tpm, args.latency, args.error_rate)
+
+    scenarios = [
+        ("serial", GeminiDispatcher(args.server_rpm, args.server_tpm, 1, base_url=base_url), 1, args.serial_sample),
+        ("dispatcher", GeminiDispatcher(args.server_rpm, args.server_tpm, 16, base_url=base_url), 64, args.prompts),
+        ("over quota", GeminiDispatcher(args.server_rpm * 10, args.server_tpm * 10, 16, base_url=base_url), 64, args.prompts),
+    ]
+    print(f"{args.prompts} prompts, ~{args.latency}s each, server quota {args.server_rpm} RPM / {args.server_tpm} TPM, "
+          f"{args.error_rate:.0%} 503s")
+    print(f"{'mode':12} {'prompts':>8} {'seconds':>8} {'req/min':>8} {'retries':>8} {'429s':>6} {'503s':>6} "
+          f"{'failed':>7} {'peak in flight':>15}")
+    for name, dispatcher, threads, prompts in scenarios:
+        # Let the server's one-minute window from the previous scenario pass
+        if name != "serial":
+            time.sleep(61)
+        elapsed, failed = run(dispatcher, prompts, threads)
+        s = dispatcher.stats()
+        print(f"{name:12} {prompts:>8} {elapsed:>8.1f} {prompts / elapsed * 60:>8.0f} {s['retries']:>8} "
+              f"{s['rate_limited']:>6} {s['server_errors']:>6} {failed:>7} {s['peak_in_flight']:>15}")
+    print(f"server: {httpx.get(f'{base_url}/__stats').json()}")
+
+
+if __name__ == "__main__":
+    main()
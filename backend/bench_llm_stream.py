@@ -0,0 +1,107 @@
+"""
+Compares buffered and streamed Gemini responses against the local stand-in
+(fixtures/gemini_mock_server.py), with a share of the answers broken the ways real ones
+are: a score written as a word, or output cut off at max_output_tokens.
+
+    buffered             the old generate_json(): wait for the whole response, json.loads,
+                         patch missing braces, parse again; one call
+    buffered, re-issued  the same, calling again (up to 3 calls) when the result is unusable
+    streamed             app.sentiment.generate_json(): parsed and validated as it arrives,
+                         abandoned and re-issued as soon as it goes wrong
+
+    python bench_llm_stream.py
+    python bench_llm_stream.py --prompts 96 --latency 4 --invalid-rate 0.2 --truncate-rate 0.2
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import sys
+import time
+import httpx
+
+PORT = 8768
+os.environ.setdefault("GEMINI_BASE_URL", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("GEMINI_RPM", "100000")
+os.environ.setdefault("GEMINI_TPM", "100000000")
+os.environ.setdefault("GEMINI_MAX_IN_FLIGHT", "32")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures"))
+import gemini_mock_server
+
+from app.json_stream import InvalidJson
+from app.llm import dispatcher
+from app.prompts import SCORE_FIELDS
+from app.sentiment import CALL_TIMEOUT, GENERATION_CONFIG, MODEL_TYPE, generate_json
+
+PROMPT = "You are analyzing student reviews. " + "The tutorials were hard but useful. " * 300
+
+
+def buffered(attempts: int) -> bool:
+    """The pre-streaming generate_json(), plus the score check analyze_module_sentiment() would trip over."""
+    for _ in range(attempts):
+        text, _ = dispatcher.generate(MODEL_TYPE, PROMPT, GENERATION_CONFIG, CALL_TIMEOUT)
+        text = text.strip()
+        try:
+            try:
+                data = json.loads(text)
+            except json.JSONDecodeError:
+                data = json.loads(text + "}" * (text.count("{") - text.count("}")))
+            if all(isinstance(data.get(field), (int, float)) for field in SCORE_FIELDS):
+                return True
+        except json.JSONDecodeError:
+            pass
+    return False
+
+
+def streamed() -> bool:
+    try:
+        generate_json(PROMPT)
+        return True
+    except InvalidJson:
+        return False
+
+
+def run(name: str, call, prompts: int, threads: int):
+    before = dispatcher.stats()
+    server_before = httpx.get(f"http://127.0.0.1:{PORT}/__stats").json()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        usable = sum(executor.map(lambda _: call(), range(prompts)))
+    elapsed = time.monotonic() - started
+    after = dispatcher.stats()
+    server = httpx.get(f"http://127.0.0.1:{PORT}/__stats").json()
+
+    calls = after["requests"] - before["requests"]
+    closed = server.get("streams_closed_early", 0) - server_before.get("streams_closed_early", 0)
+    unsent = server.get("chunks_not_generated", 0) - server_before.get("chunks_not_generated", 0)
+    streams = after["streams"] - before["streams"]
+    model = after["model_seconds"] - before["model_seconds"]
+    parse_ms = (after["parse_seconds"] - before["parse_seconds"]) * 1000
+    timing = f"{model / streams:>6.2f}s {parse_ms / streams:>7.2f}ms" if streams else f"{'-':>7} {'-':>9}"
+    print(f"{name:20} {usable:>3}/{prompts:<3} {elapsed:>8.1f} {elapsed * threads / max(usable, 1):>11.2f} "
+          f"{calls:>6} {closed:>7} {unsent:>11} {timing}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Buffered vs streamed Gemini responses against the local stand-in")
+    parser.add_argument("--prompts", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=3.0, help="mock seconds per full response")
+    parser.add_argument("--invalid-rate", type=float, default=0.15)
+    parser.add_argument("--truncate-rate", type=float, default=0.15)
+    args = parser.parse_args()
+
+    server = gemini_mock_server.serve(PORT, 100000, 100_000_000, args.latency, 0.0, args.invalid_rate, args.truncate_rate)
+    print(f"{args.prompts} prompts, {args.threads} at a time, ~{args.latency}s per response, "
+          f"{args.invalid_rate:.0%} invalid, {args.truncate_rate:.0%} cut off\n")
+    print(f"{'mode':20} {'usable':>7} {'seconds':>8} {'s/result':>11} {'calls':>6} {'aborted':>7} "
+          f"{'chunks saved':>11} {'model/call':>7} {'parse/call':>9}")
+    run("buffered", lambda: buffered(1), args.prompts, args.threads)
+    run("buffered, re-issued", lambda: buffered(3), args.prompts, args.threads)
+    run("streamed", streamed, args.prompts, args.threads)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
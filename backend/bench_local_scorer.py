@@ -0,0 +1,142 @@
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert
+from app.database import SessionLocal
+from app.models import Module, Comment, now_sgt
+from app.bulk import copy_comment_rows
+from app.prompts import SCORE_FIELDS
+from app.sentiment import average_score, fill_provisional_sentiment
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCH_PREFIX = "BENCHLS"  # Scratch modules, deleted afterwards
+MODULES = 3000
+ANALYSED_SHARE = 0.7      # modules given a (synthetic) Gemini analysis to train on
+
+# Phrases students use about each score, from low (1) to high (5)
+PHRASES = {
+    "workload": [
+        ["super chill workload", "barely any work", "very light workload"],
+        ["manageable workload", "workload was light"],
+        ["workload is okay", "average amount of work"],
+        ["quite a lot of work", "weekly assignments pile up", "heavy workload"],
+        ["insane workload", "so many deliverables", "workload is crazy", "no life this sem"],
+    ],
+    "difficulty": [
+        ["very easy module", "content is trivial", "easy A"],
+        ["not too hard", "fairly easy", "concepts are simple"],
+        ["moderately difficult", "some topics are tricky"],
+        ["quite hard", "exams were tough", "difficult concepts"],
+        ["extremely difficult", "brutal exams", "very hard to score", "steep learning curve"],
+    ],
+    "usefulness": [
+        ["useless content", "waste of time", "nothing useful"],
+        ["not very useful", "rarely applicable"],
+        ["somewhat useful", "some useful bits"],
+        ["useful for internships", "practical skills", "quite useful"],
+        ["extremely useful", "must take module", "very relevant to industry", "learnt so much"],
+    ],
+    "enjoyability": [
+        ["hated it", "boring lectures", "dreaded every lesson"],
+        ["not very fun", "dry content"],
+        ["it was alright", "okay module"],
+        ["enjoyed the tutorials", "fun projects", "engaging prof"],
+        ["loved this module", "super fun", "best module so far", "amazing prof"],
+    ],
+}
+FILLER = [
+    "Took this in year 2.", "The prof uploads lecture recordings.", "Tutorials are compulsory.",
+    "Bell curve depends on the cohort.", "Finals were open book.", "Attend the recitations.",
+    "TA was helpful.", "Grading was fair.", "Read the notes before class.", "Lots of group work.",
+]
+
+
+def make_review(latent, rng: random.Random) -> str:
+    """A review mentioning 2-4 of the scores, as this student perceived them."""
+    sentences = rng.sample(FILLER, 2)
+    for field in rng.sample(SCORE_FIELDS, rng.randint(2, 4)):
+        perceived = min(max(latent[field] + rng.gauss(0, 0.8), 1), 5)
+        sentences.append(rng.choice(PHRASES[field][int(round(perceived)) - 1]).capitalize() + ".")
+    rng.shuffle(sentences)
+    return " ".join(sentences)
+
+
+def seed(db, modules: int, rng: random.Random):
+    """Scratch modules with reviews; ANALYSED_SHARE of them get Gemini-style scores. Returns {module_id: latent scores}."""
+    latents = [{field: rng.uniform(1, 5) for field in SCORE_FIELDS} for _ in range(modules)]
+    rows = []
+    for i, latent in enumerate(latents):
+        data = None
+        if rng.random() < ANALYSED_SHARE:
+            data = {field: min(max(round((latent[field] + rng.gauss(0, 0.25)) * 2) / 2, 1), 5) for field in SCORE_FIELDS}
+            data.update({"average": average_score(data), "summary": "Synthetic.", "advice": {}, "top_comment": None})
+        rows.append({"code": f"{BENCH_PREFIX}{i:05d}", "name": "Local scorer benchmark", "sentiment_data": data})
+    ids = [row.id for row in db.execute(insert(Module).returning(Module.id, sort_by_parameter_order=True), rows)]
+
+    start = datetime(2025, 6, 1)
+    scraped_at = now_sgt()
+    comments = []
+    for module_id, latent in zip(ids, latents):
+        for j in range(max(1, int(rng.expovariate(1 / 10)))):
+            comments.append({
+                "module_id": module_id,
+                "external_id": f"{module_id}-{j}",
+                "text": make_review(latent, rng),
+                "posted_date": start - timedelta(days=rng.randint(0, 2500)),
+                "upvotes": int(rng.expovariate(1 / 3)),
+                "scraped_at": scraped_at,
+            })
+    copy_comment_rows(db, comments, upsert=False)
+    db.commit()
+    return dict(zip(ids, latents)), len(comments)
+
+
+def run_benchmark(modules: int = MODULES):
+    """
+    Seed a synthetic catalogue, then time fill_provisional_sentiment() (train on the
+    analysed modules, score the rest) and compare its scores with the ones the reviews
+    were written from. Needs DATABASE_URL pointing at a PostgreSQL database with the current schema.
+    """
+    db = SessionLocal()
+    rng = random.Random(0)
+    try:
+        latents, comment_count = seed(db, modules, rng)
+        logger.info(f"Seeded {modules} modules with {comment_count} reviews")
+
+        started = time.perf_counter()
+        filled = fill_provisional_sentiment(db)
+        elapsed = time.perf_counter() - started
+
+        provisional = {
+            module.id: module.sentiment_data
+            for module in db.query(Module).filter(Module.code.like(f"{BENCH_PREFIX}%"))
+            if (module.sentiment_data or {}).get("provisional")
+        }
+        truth = np.array([[latents[i][f] for f in SCORE_FIELDS] for i in provisional])
+        predicted = np.array([[data[f] for f in SCORE_FIELDS] for data in provisional.values()])
+        baseline = np.full_like(truth, 3.0)
+    finally:
+        ids = [i for (i,) in db.query(Module.id).filter(Module.code.like(f"{BENCH_PREFIX}%"))]
+        db.query(Comment).filter(Comment.module_id.in_(ids)).delete(synchronize_session=False)
+        db.query(Module).filter(Module.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+    print("\n" + "="*60)
+    print("LOCAL SCORER BENCHMARK")
+    print("="*60)
+    print(f"{modules} modules, {comment_count} reviews; provisional scores for {filled} in {elapsed:.1f}s")
+    print(f"{'score':14} {'MAE':>6} {'within 0.5':>11} {'MAE if 3.0':>11}")
+    for k, field in enumerate(SCORE_FIELDS):
+        error = np.abs(predicted[:, k] - truth[:, k])
+        print(f"{field:14} {error.mean():6.2f} {(error <= 0.5).mean():11.0%} {np.abs(baseline[:, k] - truth[:, k]).mean():11.2f}")
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else MODULES)
@@ -0,0 +1,78 @@
+import sys
+import time
+from pathlib import Path
+from app.parsers import BeautifulSoupParser, LxmlParser
+
+# Saved pages: a rendered NUSMods module page and a fully paginated Disqus embed
+# (tests/test_parsers.py asserts the same equivalence)
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "html"
+FIXTURES = {
+    "nusmods": FIXTURE_DIR / "nusmods_module_page.html",
+    "disqus": FIXTURE_DIR / "disqus_thread.html",
+}
+# The method each fixture exercises; an empty result there means the check proved nothing
+TARGETS = {"nusmods": "extract_disqus_url", "disqus": "parse_comments"}
+REPEATS = 20
+
+
+def check_equivalence(reference, candidate) -> bool:
+    """Candidate parser must produce exactly the reference output on every fixture, and find something."""
+    ok = True
+    for name, path in FIXTURES.items():
+        html = path.read_text(encoding="utf-8")
+        
+        expected, actual = reference.parse_comments(html), candidate.parse_comments(html)
+        if expected != actual:
+            ok = False
+            mismatch = next((i for i, (e, a) in enumerate(zip(expected, actual)) if e != a), min(len(expected), len(actual)))
+            print(f"❌ {name}: parse_comments differs at index {mismatch} ({len(expected)} vs {len(actual)} comments)")
+        else:
+            print(f"✅ {name}: parse_comments identical ({len(expected)} comments)")
+        
+        expected_url, actual_url = reference.extract_disqus_url(html), candidate.extract_disqus_url(html)
+        found = expected if TARGETS[name] == "parse_comments" else expected_url
+        if not found:
+            ok = False
+            print(f"❌ {name}: {TARGETS[name]} found nothing, so the comparison is vacuous")
+        if expected_url != actual_url:
+            ok = False
+            print(f"❌ {name}: extract_disqus_url differs ({expected_url!r} vs {actual_url!r})")
+        else:
+            print(f"✅ {name}: extract_disqus_url identical ({expected_url!r})")
+    return ok
+
+
+def time_parser(parser, html: str, method: str) -> float:
+    """Average milliseconds per call."""
+    fn = getattr(parser, method)
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(html)
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+def run_benchmark(reference, candidate):
+    print(f"\n{'fixture':10} {'method':20} {reference.name:>10} {candidate.name:>10} {'speedup':>8}")
+    for name, path in FIXTURES.items():
+        html = path.read_text(encoding="utf-8")
+        for method in ("parse_comments", "extract_disqus_url"):
+            ref_ms = time_parser(reference, html, method)
+            cand_ms = time_parser(candidate, html, method)
+            print(f"{name:10} {method:20} {ref_ms:8.2f}ms {cand_ms:8.2f}ms {ref_ms / cand_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    reference, candidate = BeautifulSoupParser(), LxmlParser()
+    
+    print("="*60)
+    print("PARSER EQUIVALENCE")
+    print("="*60)
+    equivalent = check_equivalence(reference, candidate)
+    
+    print("\n" + "="*60)
+    print("PARSE TIME PER PAGE")
+    print("="*60)
+    run_benchmark(reference, candidate)
+    print("="*60 + "\n")
+    
+    sys.exit(0 if equivalent else 1)
@@ -0,0 +1,133 @@
+"""
+Checks app/work_queue.py with a simulated workload (no browser or Gemini calls):
+throughput as worker processes are added, and reclaiming the leases of a killed worker.
+
+    python bench_work_queue.py                      # 300 modules, 1/2/4 workers, then a crash test
+    BENCH_MODULE_SECONDS=0.2 python bench_work_queue.py --modules 600 --workers 1,2,4,8
+
+Uses synthetic ZW-prefixed codes in module_work only, removed afterwards.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import time
+
+# Short leases so the crash test doesn't wait five minutes; set before app.work_queue is imported
+os.environ.setdefault("WORK_LEASE_SECONDS", "3")
+os.environ.setdefault("WORK_HEARTBEAT_SECONDS", "1")
+os.environ.setdefault("WORK_POLL_SECONDS", "0.5")
+
+from sqlalchemy import func
+from app.database import SessionLocal
+from app.models import ModuleWork
+from app.work_queue import enqueue_modules, queue_stats, start_workers
+
+MODULE_SECONDS = float(os.getenv("BENCH_MODULE_SECONDS", "0.5"))
+
+
+async def simulated(module_codes, concurrency, progress=None, limiter=None):
+    """Stands in for run_modules: each module takes MODULE_SECONDS of (non-CPU) waiting."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(code):
+        async with semaphore:
+            progress(code, "fetch")
+            await asyncio.sleep(MODULE_SECONDS)
+            progress(code, "success")
+
+    await asyncio.gather(*(one(code) for code in module_codes))
+    return {}
+
+
+def reset(count: int):
+    db = SessionLocal()
+    try:
+        db.query(ModuleWork).filter(ModuleWork.code.like("ZW%")).delete(synchronize_session=False)
+        db.commit()
+        enqueue_modules(db, [f"ZW{i:05d}" for i in range(count)])
+    finally:
+        db.close()
+
+
+def stats():
+    db = SessionLocal()
+    try:
+        return queue_stats(db)
+    finally:
+        db.close()
+
+
+def processing_seconds() -> float:
+    """First to last completion, so process start-up (imports) isn't counted."""
+    db = SessionLocal()
+    try:
+        first, last = db.query(func.min(ModuleWork.finished_at), func.max(ModuleWork.finished_at)).filter(
+            ModuleWork.code.like("ZW%")).one()
+        return (last - first).total_seconds()
+    finally:
+        db.close()
+
+
+def holds_leases(worker_suffix: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(ModuleWork).filter(ModuleWork.status == "leased",
+                                           ModuleWork.lease_owner.like(f"%{worker_suffix}")).count() > 0
+    finally:
+        db.close()
+
+
+def duplicates() -> int:
+    """Modules claimed more than once (0 unless a worker died holding leases)."""
+    db = SessionLocal()
+    try:
+        return db.query(ModuleWork).filter(ModuleWork.code.like("ZW%"), ModuleWork.attempts > 1).count()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", type=int, default=300)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+    options = {"concurrency": args.concurrency, "batch_size": args.batch_size, "drain": True, "process": simulated}
+
+    print(f"{args.modules} modules, {MODULE_SECONDS}s each, concurrency {args.concurrency} per worker")
+    print(f"{'workers':>8} {'seconds':>8} {'modules/s':>10} {'speedup':>8} {'claimed twice':>14}")
+    baseline = None
+    for count in [int(n) for n in args.workers.split(",")]:
+        reset(args.modules)
+        for worker in start_workers(count, **options):
+            worker.join()
+        elapsed = processing_seconds()
+        s = stats()
+        assert s["done"] >= args.modules and s["pending"] == 0 and s["leased"] == 0, s
+        rate = args.modules / elapsed
+        baseline = baseline or rate
+        print(f"{count:>8} {elapsed:>8.1f} {rate:>10.1f} {rate / baseline:>7.2f}x {duplicates():>14}")
+
+    # Crash test: SIGKILL one of two workers mid-run; its leases expire and the other worker takes them
+    reset(args.modules)
+    workers = start_workers(2, **options)
+    while not holds_leases("/0"):
+        time.sleep(0.1)
+    time.sleep(1)
+    os.kill(workers[0].pid, signal.SIGKILL)
+    for worker in workers:
+        worker.join()
+    s = stats()
+    print(f"\ncrash test: worker 0 killed mid-batch; queue afterwards {s}, modules reclaimed: {duplicates()}")
+    assert s["pending"] == 0 and s["leased"] == 0 and s["done"] >= args.modules and duplicates() > 0, s
+
+    db = SessionLocal()
+    db.query(ModuleWork).filter(ModuleWork.code.like("ZW%")).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Local stand-in for NUSMods + Disqus, for exercising the scraper offline.
+
+Serves:
+    /courses/<CODE>                        NUSMods-like page with a div#disqus_thread iframe
+    /embed/<CODE>                          Disqus-like embed (comment count, #disqus-threadData, li.post, "Load more")
+    /api/3.0/threads/listPostsThreaded     JSON batches fetched by "Load more" (cursor pagination)
+
+Usage (from backend/):
+    python fixtures/disqus_server.py --port 8765
+    NUSMODS_BASE_URL=http://localhost:8765 python -c "from app.scraper import scrape_module; print(scrape_module('CS1101S').count)"
+
+Set DISQUS_SCRAPE_MODE=dom to exercise the DOM fallback against the same pages.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from datetime import datetime, timedelta
+from html import escape
+import argparse
+import json
+import random
+import zlib
+
+PAGE_SIZE = 50  # Disqus returns 50 posts per batch
+DEFAULT_POST_COUNT = 30
+
+# Synthetic threads; any other code gets DEFAULT_POST_COUNT posts, "NOTFOUND" returns a 404
+THREADS = {
+    "CS1101S": 320,
+    "CS2030S": 75,
+    "GEA1000": 0,
+}
+
+PHRASES = [
+    "Workload was heavy but manageable if you keep up with the weekly tasks.",
+    "The midterm was tough, do the past year papers.",
+    "Really enjoyable module, the prof explains concepts clearly.",
+    "Bell curve is steep so aim to do well in the finals.",
+    "Tutorials are very useful, attend them even though they are not graded.",
+    "Assignments take a lot of time, start early.",
+    "Not very useful for my major but the content is interesting.",
+    "Recitations helped a lot with understanding the lecture material.",
+]
+
+
+def make_posts(code: str, count: int) -> list:
+    """Deterministic synthetic posts in Disqus API format, newest first."""
+    rng = random.Random(code)
+    start = datetime(2024, 12, 1, 12, 0)
+    posts = []
+    for i in range(count):
+        created = start - timedelta(days=i * 3, minutes=rng.randint(0, 600))
+        posts.append({
+            "id": str(zlib.crc32(code.encode()) % 1_000_000 * 1000 + i),
+            "raw_message": f"[{code} #{i + 1}] " + " ".join(rng.sample(PHRASES, 3)),
+            "createdAt": created.strftime("%Y-%m-%dT%H:%M:%S"),
+            "author": {"name": f"student{rng.randint(1, 999)}"},
+            "likes": rng.randint(0, 40),
+            "dislikes": rng.randint(0, 5),
+            "parent": None,
+            "isDeleted": False,
+            "isSpam": False,
+        })
+    return posts
+
+
+def posts_page(code: str, cursor: int) -> dict:
+    posts = make_posts(code, THREADS.get(code, DEFAULT_POST_COUNT))
+    batch = posts[cursor:cursor + PAGE_SIZE]
+    next_cursor = cursor + PAGE_SIZE
+    return {
+        "code": 0,
+        "cursor": {"hasNext": next_cursor < len(posts), "next": str(next_cursor)},
+        "response": batch,
+    }
+
+
+def render_post(post: dict) -> str:
+    created = datetime.fromisoformat(post["createdAt"])
+    title = created.strftime("%A, %B %d, %Y %I:%M %p")
+    return (
+        f'<li class="post" id="post-{post["id"]}">'
+        f'<span class="author"><a>{escape(post["author"]["name"])}</a></span>'
+        f'<a class="time-ago" title="{title}">some time ago</a>'
+        f'<div class="post-message"><p>{escape(post["raw_message"])}</p></div>'
+        f'<div class="post-votes"><span class="vote-up">Up</span><span class="count">{post["likes"]}</span></div>'
+        f'</li>'
+    )
+
+
+def render_embed_page(code: str) -> str:
+    """Disqus-like embed page. Also used to generate saved parser fixtures."""
+    total = THREADS.get(code, DEFAULT_POST_COUNT)
+    first = posts_page(code, 0)
+    thread_data = {"response": {"thread": {"identifier": code}, "posts": first["response"]}, "cursor": first["cursor"]}
+    items = "".join(render_post(p) for p in first["response"])
+    more_style = "" if first["cursor"]["hasNext"] else ' style="display:none"'
+    return f"""<!doctype html><html><head><title>Disqus stand-in</title></head><body>
+<script type="text/json" id="disqus-threadData">{json.dumps(thread_data)}</script>
+<nav><span class="comment-count">{total} comments</span></nav>
+<ul id="post-list">{items}</ul>
+<a href="#" data-action="more-posts"{more_style}>Load more comments</a>
+<script>
+let cursor = {json.dumps(first["cursor"]["next"])};
+const more = document.querySelector('a[data-action="more-posts"]');
+more.addEventListener("click", async (e) => {{
+  e.preventDefault();
+  const res = await fetch(`/api/3.0/threads/listPostsThreaded?thread={code}&cursor=${{cursor}}`);
+  const data = await res.json();
+  document.getElementById("post-list").insertAdjacentHTML("beforeend", data.html);
+  cursor = data.cursor.next;
+  if (!data.cursor.hasNext) more.style.display = "none";
+}});
+</script>
+</body></html>"""
+
+
+def render_module_page(code: str, base_url: str) -> str:
+    return f"""<!doctype html><html><head><title>{code} | NUSMods stand-in</title></head><body>
+<h1>{code}</h1>
+<div id="disqus_thread"><iframe src="{base_url}/embed/{code}"></iframe></div>
+</body></html>"""
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, status: int, body: str, content_type: str = "text/html; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        base_url = f"http://{self.headers.get('Host')}"
+
+        if len(parts) == 2 and parts[0] == "courses":
+            if parts[1] == "NOTFOUND":
+                return self._send(404, "<h1>Not found</h1>")
+            return self._send(200, render_module_page(parts[1], base_url))
+
+        if len(parts) == 2 and parts[0] == "embed":
+            return self._send(200, render_embed_page(parts[1]))
+
+        if url.path.startswith("/api/3.0/threads/listPosts"):
+            query = parse_qs(url.query)
+            code = query.get("thread", [""])[0]
+            cursor = int(query.get("cursor", ["0"])[0] or 0)
+            payload = posts_page(code, cursor)
+            # Real Disqus renders posts client-side; the stand-in ships ready-made HTML alongside the JSON
+            payload["html"] = "".join(render_post(p) for p in payload["response"])
+            return self._send(200, json.dumps(payload), "application/json")
+
+        self._send(404, "<h1>Not found</h1>")
+
+    def log_message(self, format, *args):
+        pass  # Keep scraper logs readable
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local NUSMods/Disqus stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"Serving NUSMods/Disqus stand-in on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
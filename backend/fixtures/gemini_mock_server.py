@@ -0,0 +1,212 @@
+"""
+Local stand-in for the Gemini API (generateContent), for exercising app/llm.py offline.
+
+Enforces a per-minute request and token quota like the real API (429 RESOURCE_EXHAUSTED
+with a RetryInfo delay when exceeded), injects random 503s, and answers after a delay
+with JSON shaped like the sentiment prompts expect. Can also answer with the ways model
+output goes wrong: a score written as a word, or output cut off at max_output_tokens.
+
+Serves:
+    POST /v1beta/models/<model>:generateContent
+    POST /v1beta/models/<model>:streamGenerateContent?alt=sse   same, as server-sent events
+    GET  /__stats                         request counts by status, peak in-flight requests,
+                                          streams the client closed early
+
+Usage (from backend/):
+    python fixtures/gemini_mock_server.py --port 8767 --rpm 300 --tpm 1000000 --latency 1.5 --error-rate 0.02 \
+        --invalid-rate 0.1 --truncate-rate 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8767 GEMINI_RPM=300 GEMINI_TPM=1000000 python refresh_sentiment.py
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import Counter, deque
+from urllib.parse import urlparse
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_CHARS = 60  # roughly what Gemini sends per event
+FILLER = ("Students found the tutorials useful for consolidating the lecture content, though several felt "
+          "the pace picked up sharply after recess week. ")
+
+
+class Quota:
+    """Sliding one-minute window of requests and tokens."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = deque()  # (time, tokens)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.in_flight = 0
+
+    def admit(self, tokens: int) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            while self.window and self.window[0][0] <= now - 60:
+                self.window.popleft()
+            used = sum(t for _, t in self.window)
+            if len(self.window) >= self.rpm or used + tokens > self.tpm:
+                return False
+            self.window.append((now, tokens))
+            return True
+
+
+def _sentiment_json(prompt: str) -> dict:
+    if "Summarise this batch" in prompt:
+        numbers = re.findall(r"^Comment (\d+) \(", prompt, re.MULTILINE)
+        return {"workload": 4, "difficulty": 3.5, "usefulness": 4, "enjoyability": 3.5,
+                "themes": FILLER * 3, "score_notes": "Mock notes.",
+                "advice": {"general": "Start early."}, "top_comment": int(numbers[0]) if numbers else None}
+    # About the size of a real answer (~700 tokens)
+    return {
+        "workload": 4, "difficulty": 3.5, "usefulness": 4, "enjoyability": 3.5,
+        "summary": FILLER * 5,
+        "reasoning": FILLER * 3,
+        "advice": {part: FILLER * 2 for part in ("general", "midterm", "final", "assignments", "tutorial")},
+        "top_comment": {"text": FILLER * 4, "upvotes": 1, "date": "2024-01-01", "author": None},
+    }
+
+
+def _response_text(prompt: str, invalid_rate: float, truncate_rate: float):
+    """The model's output text and finish reason, possibly one of the broken kinds."""
+    data = _sentiment_json(prompt)
+    roll = random.random()
+    if roll < invalid_rate:
+        data["difficulty"] = "fairly hard"  # a score as a word: valid JSON, wrong schema
+    text = json.dumps(data, indent=2)
+    if invalid_rate <= roll < invalid_rate + truncate_rate:
+        return text[:random.randint(len(text) // 3, len(text) - 10)], "MAX_TOKENS"
+    return text, "STOP"
+
+
+class Handler(BaseHTTPRequestHandler):
+    quota: Quota = None
+    latency: float = 1.0
+    error_rate: float = 0.0
+    invalid_rate: float = 0.0
+    truncate_rate: float = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.quota.stats[str(status)] += 1
+
+    def _error(self, code: int, status: str, message: str, retry_delay: str = None):
+        error = {"code": code, "message": message, "status": status}
+        if retry_delay:
+            error["details"] = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay}]
+        self._send(code, {"error": error})
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/__stats":
+            return self._send(200, dict(self.quota.stats))
+        self._error(404, "NOT_FOUND", "not found")
+
+    def _candidate(self, text: str, finish_reason: str = None) -> dict:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finish_reason:
+            candidate["finishReason"] = finish_reason
+        return candidate
+
+    def _stream(self, text: str, finish_reason: str, usage: dict):
+        """Send `text` as SSE events spread over the latency, like a model generating it."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        total = self.latency * random.uniform(0.5, 1.5)
+        time.sleep(total * 0.2)  # time to first token
+        try:
+            for i, chunk in enumerate(chunks):
+                last = i == len(chunks) - 1
+                event = {"candidates": [self._candidate(chunk, finish_reason if last else None)], "modelVersion": "mock"}
+                if last:
+                    event["usageMetadata"] = usage
+                self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+                if not last:
+                    time.sleep(total * 0.8 / len(chunks))
+        except (BrokenPipeError, ConnectionResetError):
+            with self.quota.lock:
+                self.quota.stats["streams_closed_early"] += 1
+                self.quota.stats["chunks_not_generated"] += len(chunks) - i - 1
+            return
+        with self.quota.lock:
+            self.quota.stats["200"] += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = urlparse(self.path).path
+        streaming = path.endswith(":streamGenerateContent")
+        if not streaming and not path.endswith(":generateContent"):
+            return self._error(404, "NOT_FOUND", "not found")
+
+        prompt = "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN + 1
+        if not self.quota.admit(prompt_tokens):
+            return self._error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).", "2s")
+        if random.random() < self.error_rate:
+            return self._error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+
+        text, finish_reason = _response_text(prompt, self.invalid_rate, self.truncate_rate)
+        output_tokens = len(text) // CHARS_PER_TOKEN + 1
+        usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                 "totalTokenCount": prompt_tokens + output_tokens}
+        with self.quota.lock:
+            self.quota.in_flight += 1
+            self.quota.stats["peak_in_flight"] = max(self.quota.stats["peak_in_flight"], self.quota.in_flight)
+        try:
+            if streaming:
+                return self._stream(text, finish_reason, usage)
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        finally:
+            with self.quota.lock:
+                self.quota.in_flight -= 1
+
+        self._send(200, {"candidates": [self._candidate(text, finish_reason)], "usageMetadata": usage, "modelVersion": "mock"})
+
+    def log_message(self, format, *args):
+        pass  # Quiet; see /__stats
+
+
+def serve(port: int, rpm: int, tpm: int, latency: float, error_rate: float,
+          invalid_rate: float = 0.0, truncate_rate: float = 0.0) -> ThreadingHTTPServer:
+    Handler.quota = Quota(rpm, tpm)
+    Handler.latency = latency
+    Handler.error_rate = error_rate
+    Handler.invalid_rate = invalid_rate
+    Handler.truncate_rate = truncate_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini API stand-in")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--rpm", type=int, default=300, help="requests per minute before 429s")
+    parser.add_argument("--tpm", type=int, default=1_000_000, help="prompt tokens per minute before 429s")
+    parser.add_argument("--latency", type=float, default=1.0, help="mean seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="share of answers with a score as a word")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="share of answers cut off at max_output_tokens")
+    args = parser.parse_args()
+    serve(args.port, args.rpm, args.tpm, args.latency, args.error_rate, args.invalid_rate, args.truncate_rate)
+    print(f"Gemini API stand-in on http://127.0.0.1:{args.port} ({args.rpm} RPM, {args.tpm} TPM)")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
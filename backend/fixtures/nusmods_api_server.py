@@ -0,0 +1,169 @@
+"""
+Local stand-in for the NUSMods API (v2), for exercising app/metadata.py offline.
+
+Serves:
+    /v2/<year>/moduleInfo.json          every module, with ETag / Last-Modified and 304 support
+    /v2/<year>/moduleList.json          code, title and semesters only
+    /v2/<year>/modules/<CODE>.json      one module ("NOTFOUND" and unknown codes return 404)
+    /__stats                            request counts per path and status, for checking conditional requests
+    /__touch?code=<CODE>                (POST) change a module's title, as if NUSMods had updated it
+
+Usage (from backend/):
+    python fixtures/nusmods_api_server.py --port 8766 --modules 6000
+    NUSMODS_API_URL=http://localhost:8766/v2/2024-2025 python -c \
+        "from app.database import SessionLocal; from app.metadata import ingest_metadata; print(ingest_metadata(SessionLocal(), ['CS1010']))"
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlparse, parse_qs
+from collections import Counter
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+
+# Codes the pipeline uses, plus synthetic ones to reach --modules
+KNOWN_MODULES = {
+    "GEA1000": "Quantitative Reasoning with Data",
+    "CS1010": "Programming Methodology",
+    "CS1101S": "Programming Methodology",
+    "CS2030S": "Programming Methodology II",
+    "CS2040S": "Data Structures and Algorithms",
+    "CS2100": "Computer Organisation",
+    "MA1521": "Calculus for Computing",
+    "MA1522": "Linear Algebra for Computing",
+    "ST2334": "Probability and Statistics",
+    "IS1108": "Digital Ethics and Data Privacy",
+    "IS2218": "Digital Platforms for Business",
+    "CS1231S": "Discrete Structures",
+    "CS2106": "Introduction to Operating Systems",
+    "CS2103": "Software Engineering",
+}
+PREFIXES = ["ACC", "BT", "CS", "DSA", "EC", "EE", "GEC", "HSI", "IS", "MA", "ME", "PL", "ST"]
+WORDS = ["Introduction", "Advanced", "Topics", "Data", "Systems", "Design", "Analysis", "Theory",
+         "Computing", "Economics", "Society", "Engineering", "Methods", "Applied", "Modelling"]
+
+
+class Catalogue:
+    """Deterministic synthetic module data; the dumps are rebuilt when a module changes."""
+
+    def __init__(self, size: int):
+        rng = random.Random(size)
+        self.modules = {}
+        for code, title in KNOWN_MODULES.items():
+            self.modules[code] = self._module(code, title, rng)
+        while len(self.modules) < size:
+            code = f"{rng.choice(PREFIXES)}{rng.randint(1000, 6999)}{rng.choice(['', '', 'R', 'X'])}"
+            self.modules.setdefault(code, self._module(code, " ".join(rng.sample(WORDS, 3)), rng))
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self._rebuild()
+
+    @staticmethod
+    def _module(code: str, title: str, rng: random.Random) -> dict:
+        return {
+            "moduleCode": code,
+            "title": title,
+            "description": f"{title}. " + " ".join(rng.sample(WORDS, 8)).lower() + ".",
+            "moduleCredit": str(rng.choice([2, 4, 4, 4, 8])),
+            "department": "Computer Science",
+            "semesterData": [{"semester": s} for s in sorted(rng.sample([1, 2, 3, 4], rng.randint(1, 2)))],
+        }
+
+    def _rebuild(self):
+        modules = sorted(self.modules.values(), key=lambda m: m["moduleCode"])
+        self.info = json.dumps(modules).encode("utf-8")
+        self.list = json.dumps([
+            {"moduleCode": m["moduleCode"], "title": m["title"], "semesters": [s["semester"] for s in m["semesterData"]]}
+            for m in modules
+        ]).encode("utf-8")
+        self.etag = f'"{hashlib.sha1(self.info).hexdigest()[:16]}"'
+        self.last_modified = time.time()
+
+    def touch(self, code: str) -> bool:
+        with self.lock:
+            if code not in self.modules:
+                return False
+            self.modules[code]["title"] += " (Updated)"
+            self._rebuild()
+            return True
+
+
+class Handler(BaseHTTPRequestHandler):
+    catalogue: Catalogue = None
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.catalogue.stats[f"{urlparse(self.path).path} {status}"] += 1
+
+    def _send_dump(self, body: bytes):
+        catalogue = self.catalogue
+        validators = {"ETag": catalogue.etag, "Last-Modified": formatdate(catalogue.last_modified, usegmt=True)}
+        if_none_match = self.headers.get("If-None-Match")
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_none_match is not None:
+            not_modified = catalogue.etag in [tag.strip() for tag in if_none_match.split(",")]
+        elif if_modified_since:
+            not_modified = int(catalogue.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        else:
+            not_modified = False
+        if not_modified:
+            return self._send(304, headers=validators)
+        self._send(200, body, validators)
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if parts == ["__stats"]:
+            return self._send(200, json.dumps(self.catalogue.stats).encode("utf-8"))
+        if len(parts) == 3 and parts[0] == "v2" and parts[2] == "moduleInfo.json":
+            with self.catalogue.lock:
+                return self._send_dump(self.catalogue.info)
+        if len(parts) == 3 and parts[0] == "v2" and parts[2] == "moduleList.json":
+            with self.catalogue.lock:
+                return self._send_dump(self.catalogue.list)
+        if len(parts) == 4 and parts[0] == "v2" and parts[2] == "modules" and parts[3].endswith(".json"):
+            module = self.catalogue.modules.get(parts[3][:-len(".json")])
+            if module is None:
+                return self._send(404, b'{"error": "not found"}')
+            return self._send(200, json.dumps(module).encode("utf-8"))
+        self._send(404, b'{"error": "not found"}')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/__touch":
+            code = parse_qs(url.query).get("code", [""])[0]
+            return self._send(200 if self.catalogue.touch(code) else 404, b"{}")
+        self._send(404, b'{"error": "not found"}')
+
+    def log_message(self, format, *args):
+        pass  # Quiet; see /__stats
+
+
+def serve(port: int, size: int) -> ThreadingHTTPServer:
+    Handler.catalogue = Catalogue(size)
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local NUSMods API stand-in")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--modules", type=int, default=200, help="catalogue size")
+    args = parser.parse_args()
+    Handler.catalogue = Catalogue(args.modules)
+    print(f"NUSMods API stand-in on http://127.0.0.1:{args.port}/v2/2024-2025 ({args.modules} modules)")
+    ThreadingHTTPServer(("127.0.0.1", args.port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Load test for the module read endpoints, comparing the sync (threadpool) and async (asyncpg) handlers.
+
+    python load_test_reads.py                          # 200 clients, 20s per mode, both modes
+    python load_test_reads.py --clients 400 --duration 30
+    python load_test_reads.py --url http://localhost:8000 --modes current   # an already running server
+
+For each mode a uvicorn server is started with ASYNC_DB_READS set accordingly and the
+response cache disabled, so every request reaches the database.
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+BASE_PORT = 8765
+
+
+async def _client(http: httpx.AsyncClient, codes: List[str], deadline: float, latencies: List[float], errors: Dict[str, int]):
+    while time.monotonic() < deadline:
+        roll = random.random()
+        code = random.choice(codes)
+        if roll < 0.6:
+            path, params = f"/api/modules/{code}", None
+        elif roll < 0.95:
+            path, params = "/api/search", {"q": code[:random.randint(1, len(code))]}
+        else:
+            path, params = "/api/modules", None
+
+        started = time.perf_counter()
+        try:
+            response = await http.get(path, params=params)
+            if response.status_code >= 500:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                continue
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_load(base_url: str, clients: int, duration: float) -> Dict:
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        codes = [m["code"] for m in (await http.get("/api/modules")).json()] or ["CS1010"]
+
+        latencies: List[float] = []
+        errors: Dict[str, int] = {}
+        started = time.monotonic()
+        await asyncio.gather(*(
+            _client(http, codes, started + duration, latencies, errors) for _ in range(clients)
+        ))
+        elapsed = time.monotonic() - started
+        pool = (await http.get("/api/db-pool-stats")).json()
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 1) if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "pool": pool,
+    }
+
+
+def start_server(mode: str, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "ASYNC_DB_READS": "true" if mode == "async" else "false",
+        "RESPONSE_CACHE_MAX_ENTRIES": "0",
+        "RESPONSE_CACHE_SHARED": "none",
+        "SEARCH_BACKEND": "database",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Server for {mode} mode didn't start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--modes", default="sync,async", help="comma separated: sync, async, current")
+    parser.add_argument("--url", help="target an already running server (mode 'current')")
+    args = parser.parse_args()
+
+    results = {}
+    for offset, mode in enumerate(args.modes.split(",")):
+        if mode == "current":
+            results[mode] = asyncio.run(run_load(args.url, args.clients, args.duration))
+            continue
+
+        port = BASE_PORT + offset
+        server = start_server(mode, port)
+        try:
+            results[mode] = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.clients, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"\n{args.clients} concurrent clients, {args.duration:.0f}s per mode")
+    print(f"{'mode':8} {'req/s':>8} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}  errors")
+    for mode, r in results.items():
+        print(f"{mode:8} {r['throughput_rps']:>8} {r['mean_ms']:>7}ms {r['p50_ms']:>7}ms "
+              f"{r['p95_ms']:>7}ms {r['p99_ms']:>7}ms  {r['errors'] or '-'}")
+    for mode, r in results.items():
+        print(f"{mode} pool: {r['pool']}")
+
+
+if __name__ == "__main__":
+    main()
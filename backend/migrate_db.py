@@ -0,0 +1,58 @@
+from sqlalchemy import text
+from app.database import engine, Base
+from app.models import Module, Comment
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Idempotent schema changes for databases created before the column/table existed.
+# Unlike init_db.py, this keeps all existing data.
+MIGRATIONS = [
+    "ALTER TABLE modules ADD COLUMN IF NOT EXISTS disqus_url VARCHAR(1000)",
+    "ALTER TABLE modules ADD COLUMN IF NOT EXISTS disqus_url_validated_at TIMESTAMP",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS external_id VARCHAR(64)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_comments_module_external_id ON comments (module_id, external_id)",
+    "ALTER TABLE pipeline_runs ADD COLUMN IF NOT EXISTS params JSON",
+    "ALTER TABLE pipeline_runs ADD COLUMN IF NOT EXISTS scope_key VARCHAR(64) NOT NULL DEFAULT ''",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_pipeline_runs_active_scope ON pipeline_runs (kind, scope_key) "
+    "WHERE status IN ('queued', 'running')",
+    "ALTER TABLE modules ADD COLUMN IF NOT EXISTS full_analysis_at TIMESTAMP",
+    "ALTER TABLE modules ADD COLUMN IF NOT EXISTS analyzed_comment_count INTEGER",
+    "ALTER TABLE modules ADD COLUMN IF NOT EXISTS full_analysis_comment_count INTEGER",
+]
+
+# Search indexes (see app/db_search.py). Optional: pg_trgm may need extra privileges,
+# so a failure here is logged and the API keeps using the unindexed queries.
+SEARCH_INDEX_MIGRATIONS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_modules_code_trgm ON modules USING gin (code gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_modules_name_trgm ON modules USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_text_fts ON comments USING gin (to_tsvector('english'::regconfig, text))",
+]
+
+def migrate_database():
+    """
+    Bring an existing database up to date with app/models.py.
+    Creates missing tables, then applies MIGRATIONS in order.
+    """
+    logger.info("Creating missing tables...")
+    Base.metadata.create_all(bind=engine)
+    
+    with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            logger.info(f"Applying: {statement}")
+            conn.execute(text(statement))
+    
+    for statement in SEARCH_INDEX_MIGRATIONS:
+        try:
+            with engine.begin() as conn:
+                logger.info(f"Applying: {statement}")
+                conn.execute(text(statement))
+        except Exception as e:
+            logger.warning(f"⚠️  Skipped search index migration: {e}")
+    
+    logger.info("✅ Database migrated successfully!")
+
+if __name__ == "__main__":
+    migrate_database()
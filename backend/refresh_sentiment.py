@@ -1,6 +1,8 @@
 from app.database import SessionLocal
 from app.models import Module
-from app.sentiment import analyze_all_modules
+from app.sentiment import analyze_all_modules, train_local_scorer
+from app.sentiment_cache import cache_stats
+from app.llm import dispatcher
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +13,7 @@ def clear_sentiment_data():
     Clear sentiment_data from all modules.
     Keeps modules and comments intact.
     For re-running sentiment analysis without re-scraping.
+    Unchanged modules are restored from the sentiment cache without calling Gemini.
     """
     db = SessionLocal()
     
@@ -36,11 +39,21 @@ def run_sentiment_analysis():
     logger.info(f"✅ Success: {results['success']}")
     logger.info(f"⚠️  Insufficient data (≤3 reviews): {results['insufficient_data']}")
     logger.info(f"❌ Failed: {results['failed']}")
+    stats = cache_stats()
+    logger.info(f"💾 Cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_ratio']:.0%} hit ratio)")
+    llm = dispatcher.stats()
+    logger.info(f"🤖 Gemini: {llm['succeeded']} calls ({llm['retries']} retries, {llm['rate_limited']} rate limited), "
+                f"{llm['prompt_tokens']} prompt / {llm['output_tokens']} output tokens, "
+                f"{llm['throttled_seconds']}s waiting on the {llm['rpm']} RPM / {llm['tpm']} TPM budget")
     logger.info(f"{'='*60}\n")
 
 if __name__ == "__main__":
     confirm = input("Clear and regenerate all sentiment data? (yes/no): ")
     if confirm.lower() == 'yes':
+        # Learn from the current analyses before clearing them, so modules show provisional scores meanwhile
+        db = SessionLocal()
+        train_local_scorer(db)
+        db.close()
         clear_sentiment_data()
         run_sentiment_analysis()
     else:
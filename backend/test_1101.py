@@ -1,9 +1,10 @@
 import sys
 from app.database import SessionLocal
 from app.models import Module, Comment
-from app.pipeline import fetch_module_metadata, upsert_module, replace_module_comments, update_module_comment_count
+from app.pipeline import fetch_module_metadata, upsert_module, sync_module_comments, update_module_comment_count
 from app.scraper import scrape_module_reviews
 from app.sentiment import analyze_module_sentiment
+from app.browser import close_browser_pool
 import logging
 
 logging.basicConfig(
@@ -44,7 +45,7 @@ def test_single_module(module_code: str = MOD):
     
     # Step 3: Re-scrape comments from Disqus
     logger.info(f"\n🕷️  Re-scraping comments from Disqus...")
-    comments, error = scrape_module_reviews(module_code)
+    comments, error = scrape_module_reviews(module_code, disqus_url=module.disqus_url)
     
     if error:
         logger.error(f"❌ Scraping failed: {error}")
@@ -61,7 +62,7 @@ def test_single_module(module_code: str = MOD):
     
     # Step 4: Insert new comments into database
     logger.info(f"\n💾 Storing comments in database...")
-    replace_module_comments(db, module.id, comments)
+    sync_module_comments(db, module.id, comments)
     update_module_comment_count(db, module.id, len(comments))
     logger.info(f"✅ Stored {len(comments)} comments")
     
@@ -107,6 +108,7 @@ def test_single_module(module_code: str = MOD):
         logger.error(f"{'='*60}\n")
     
     db.close()
+    close_browser_pool()
 
 if __name__ == "__main__":
     # Default to CS1101S, but allow command line argument
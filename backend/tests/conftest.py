@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.fixture
+def db():
+    """A PostgreSQL session whose writes are rolled back after the test. Skips without a database."""
+    try:
+        from sqlalchemy.orm import Session
+        from app.database import engine
+        connection = engine.connect()
+    except Exception as e:  # app.database can't build an engine without DATABASE_URL
+        pytest.skip(f"needs a PostgreSQL DATABASE_URL: {e}")
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
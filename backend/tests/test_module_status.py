@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event, insert
+
+try:
+    from app.models import Comment, Module
+    from app.module_status import classify_modules
+except Exception as e:  # app.database can't build an engine without DATABASE_URL
+    pytest.skip(f"needs a PostgreSQL DATABASE_URL: {e}", allow_module_level=True)
+
+PREFIX = "TESTMS"
+
+
+@contextmanager
+def count_queries(connection):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+
+def add_modules(db, start: int, count: int):
+    """Modules with 0-2 comments each, alternating with and without sentiment data."""
+    for i in range(start, start + count):
+        module = Module(code=f"{PREFIX}{i:04d}", name="Query count test", last_comment_count=i % 3,
+                        sentiment_data={"summary": "ok"} if i % 2 else None)
+        db.add(module)
+        db.flush()
+        if i % 3:
+            db.execute(insert(Comment), [{"module_id": module.id, "text": "review", "external_id": f"{i}-{j}"}
+                                         for j in range(i % 3)])
+    db.flush()
+
+
+def test_constant_query_count(db):
+    add_modules(db, 0, 1)
+    with count_queries(db.connection()) as one_module:
+        classify_modules(db)
+
+    add_modules(db, 1, 40)
+    with count_queries(db.connection()) as many_modules:
+        status = classify_modules(db)
+
+    assert len(one_module) == len(many_modules) == 1
+
+    buckets = {info["code"]: bucket for bucket, infos in status.items() for info in infos}
+    assert buckets[f"{PREFIX}0000"] == "needs_update"      # no comments, no sentiment
+    assert buckets[f"{PREFIX}0001"] == "up_to_date"        # 1 comment, counted, analysed
+    assert buckets[f"{PREFIX}0002"] == "needs_sentiment"   # 2 comments, no sentiment
+    assert buckets[f"{PREFIX}0003"] == "up_to_date"        # no comments, analysed
+
+
+def test_provisional_scores_need_sentiment(db):
+    db.add(Module(code=f"{PREFIX}9999", name="Query count test", last_comment_count=1,
+                  sentiment_data={"summary": "local", "provisional": True}))
+    db.flush()
+    module_id = db.query(Module.id).filter(Module.code == f"{PREFIX}9999").scalar()
+    db.execute(insert(Comment), [{"module_id": module_id, "text": "review", "external_id": "p-0"}])
+
+    needs_sentiment = {info["code"] for info in classify_modules(db)["needs_sentiment"]}
+    assert f"{PREFIX}9999" in needs_sentiment
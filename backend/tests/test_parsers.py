@@ -0,0 +1,44 @@
+from pathlib import Path
+import pytest
+from app.parsers import BeautifulSoupParser, LxmlParser, lxml
+
+# A rendered NUSMods course page (div#disqus_thread > iframe) and a fully paginated Disqus embed
+FIXTURES = Path(__file__).parent.parent / "fixtures" / "html"
+MODULE_PAGE = FIXTURES / "nusmods_module_page.html"
+DISQUS_THREAD = FIXTURES / "disqus_thread.html"
+
+pytestmark = pytest.mark.skipif(lxml is None, reason="lxml not installed")
+
+
+def test_disqus_url_matches_reference():
+    html = MODULE_PAGE.read_text(encoding="utf-8")
+    expected = BeautifulSoupParser().extract_disqus_url(html)
+
+    assert expected is not None and expected.startswith("https://disqus.com/embed/comments/?base=default&f=nusmods&t_i=CS1101S")
+    assert LxmlParser().extract_disqus_url(html) == expected
+
+
+def test_comments_match_reference():
+    html = DISQUS_THREAD.read_text(encoding="utf-8")
+    expected = BeautifulSoupParser().parse_comments(html)
+
+    assert len(expected) == 324
+    assert LxmlParser().parse_comments(html) == expected
+
+
+def test_comment_fields():
+    comments = LxmlParser().parse_comments(DISQUS_THREAD.read_text(encoding="utf-8"))
+    first, reply, guest, no_votes = comments[:4]
+
+    assert first["post_id"] == "1" and first["author"] == "Alice & Bob" and first["upvotes"] == 12
+    assert first["text"] == "First line\xa0with entity <tag>Secondboldlineafter break"
+    assert first["posted_date"].isoformat() == "2024-03-04T09:15:00"
+    assert reply["post_id"] == "2" and reply["text"] == "Nested reply"
+    assert guest["author"] == "Anonymous" and guest["posted_date"] is None
+    assert no_votes["upvotes"] == 0 and no_votes["text"] == "Padded   text"
+
+
+def test_pages_without_targets():
+    for parser in (BeautifulSoupParser(), LxmlParser()):
+        assert parser.extract_disqus_url(DISQUS_THREAD.read_text(encoding="utf-8")) is None
+        assert parser.parse_comments(MODULE_PAGE.read_text(encoding="utf-8")) == []
@@ -0,0 +1,45 @@
+import json
+import pytest
+from sqlalchemy import text
+
+try:
+    from app.database import engine
+    from app.db_search import (
+        TRIGRAM_INDEXES, FULLTEXT_INDEX, module_search_query, review_search_query, snippet_query, search_indexes,
+    )
+except Exception as e:  # app.database can't build an engine without DATABASE_URL
+    pytest.skip(f"needs a PostgreSQL DATABASE_URL: {e}", allow_module_level=True)
+
+CHECKS = [
+    # (description, statement, index kind, indexes that must appear in the plan)
+    ("module search 'prog'", module_search_query("prog", 10), "trigram", TRIGRAM_INDEXES),
+    ("module search 'CS20'", module_search_query("CS20", 10), "trigram", TRIGRAM_INDEXES),
+    ("review search 'bell curve'", review_search_query("bell curve", 10), "fulltext", (FULLTEXT_INDEX,)),
+    ("review snippets 'bell curve'", snippet_query("bell curve", [1, 2, 3]), "fulltext", (FULLTEXT_INDEX,)),
+]
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def explain(db, statement) -> dict:
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    return db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+
+
+@pytest.mark.parametrize("description, statement, kind, expected", CHECKS, ids=[check[0] for check in CHECKS])
+def test_query_can_use_index(db, description, statement, kind, expected):
+    """
+    The search queries can use the indexes from migrate_db.py. On small tables Postgres
+    rightly prefers a seq scan, so seq scans are disabled to check each index is *usable*.
+    """
+    if not search_indexes(db)[kind]:
+        pytest.skip(f"{kind} indexes missing (pg_trgm unavailable or migrate_db.py not run)")
+
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = explain(db, statement)
+    used = {node["Index Name"] for node in _plan_nodes(plan) if "Index Name" in node}
+    assert set(expected) <= used, f"{description}: {sorted(set(expected) - used)} not used\n{json.dumps(plan, indent=2)}"